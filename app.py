@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import sqlite3
 import os
+import sys
 import time
 from datetime import datetime, date, time as dt_time, timedelta
 import altair as alt
@@ -10,6 +11,23 @@ import json
 import urllib.parse
 import secrets
 import hashlib
+import calendar
+import copy
+import threading
+import queue
+import atexit
+import functools
+import tempfile
+import gzip
+import shutil
+import logging
+from collections import OrderedDict
+from logging.handlers import RotatingFileHandler
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+from contextlib import contextmanager
 
 # Timezone GMT+7 (WIB)
 WIB = pytz.timezone('Asia/Jakarta')
@@ -51,8 +69,521 @@ def format_datetime(dt_obj):
         return dt_obj.strftime('%d-%m-%Y %H:%M:%S')
     return str(dt_obj)
 
+def to_iso_date(value):
+    """Ubah date/datetime atau string tanggal (dd-mm-yyyy, yyyy-mm-dd, ...) ke yyyy-mm-dd"""
+    if value is None or value == '':
+        return None
+    if not hasattr(value, 'strftime'):
+        value = parse_date(value)
+        if value is None:
+            return None
+    return value.strftime('%Y-%m-%d')
+
 DB_NAME = "car_wash.db"
 
+# --- Connection Pool ---
+# Semua helper mengambil koneksi lewat `with db_connection() as conn:` (commit/rollback + kembali ke pool).
+# Koneksi yang selesai dipakai dikembalikan ke pool idle (LIFO, ukuran dibatasi),
+# sehingga rerun Streamlit memakai ulang koneksi yang sama tanpa connect ulang.
+DB_POOL_SIZE = 8
+DB_BUSY_TIMEOUT_MS = 5000
+DB_CACHE_SIZE_KB = 8000
+
+
+def _close_pool(pool):
+    """Tutup semua koneksi idle di sebuah pool"""
+    while True:
+        try:
+            pool.get_nowait().force_close()
+        except queue.Empty:
+            break
+
+
+@st.cache_resource(show_spinner=False)
+def get_shared_state():
+    """State bersama satu proses (pool koneksi, cache setting, cache query) yang bertahan antar rerun"""
+    # Streamlit menjalankan ulang app.py di namespace baru setiap rerun, jadi variabel
+    # modul biasa ikut ter-reset. Objek ini dibuat sekali per proses dan dipakai semua sesi.
+    state = {
+        'db_pool': queue.LifoQueue(maxsize=DB_POOL_SIZE),
+        'settings_lock': threading.Lock(),
+        'settings': {'key': None, 'values': {}, 'generation': 0},
+        'query_lock': threading.Lock(),
+        'query_cache': OrderedDict(),
+        'table_versions': {},
+        'query_stats': {'hits': 0, 'misses': 0},
+        'schema_lock': threading.Lock(),
+        'schema_ready': set(),
+        'profile_local': threading.local(),
+    }
+    atexit.register(_close_pool, state['db_pool'])
+    return state
+
+
+_shared_state = get_shared_state()
+_db_pool = _shared_state['db_pool']
+_schema_lock = _shared_state['schema_lock']
+_schema_ready = _shared_state['schema_ready']
+
+
+class PooledConnection(sqlite3.Connection):
+    """Koneksi SQLite yang kembali ke pool saat close(), bukan benar-benar ditutup"""
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or ProfiledCursor)
+
+    # Connection.execute bawaan tidak lewat cursor(); dibelokkan agar ikut tercatat di profil
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        release_connection(self)
+
+    def force_close(self):
+        sqlite3.Connection.close(self)
+
+
+def _open_connection(db_name=None):
+    """Buka koneksi baru (default ke DB_NAME) dengan pragma yang sudah di-tuning"""
+    db_name = db_name or DB_NAME
+    conn = sqlite3.connect(db_name, factory=PooledConnection, check_same_thread=False,
+                           timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    # Hanya berlaku untuk file database baru (harus sebelum journal_mode=WAL menulis header);
+    # database lama tetap apa adanya sampai enable_incremental_vacuum() dijalankan
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.set_trace_callback(_trace_statement)
+    conn._pool_db = db_name
+    return conn
+
+
+def get_connection():
+    """Ambil koneksi idle dari pool, atau buka koneksi baru jika pool kosong"""
+    while True:
+        try:
+            conn = _db_pool.get_nowait()
+        except queue.Empty:
+            return _open_connection()
+        if conn._pool_db == DB_NAME:
+            return conn
+        conn.force_close()
+
+
+def release_connection(conn):
+    """Kembalikan koneksi ke pool; transaksi yang belum di-commit akan di-rollback"""
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        conn.force_close()
+        return
+    if conn._pool_db != DB_NAME:
+        conn.force_close()
+        return
+    try:
+        _db_pool.put_nowait(conn)
+    except queue.Full:
+        conn.force_close()
+
+
+@contextmanager
+def db_connection():
+    """Context manager koneksi: commit jika sukses, rollback jika error, lalu kembali ke pool"""
+    conn = get_connection()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def close_all_connections():
+    """Tutup semua koneksi idle di pool (juga dipanggil otomatis saat proses berhenti)"""
+    _close_pool(_db_pool)
+
+
+# --- Query Profiling ---
+# main() membuka satu profil per rerun di thread script. Selama profil aktif, ProfiledCursor
+# mencatat teks query (berparameter), durasi execute + fetch dan jumlah baris, sedangkan
+# trace callback menghitung semua statement SQLite (termasuk yang dijalankan trigger).
+# Query dari thread lain (audit writer) tidak masuk profil rerun.
+PROFILE_SLOW_QUERY_MS = 100
+PROFILE_HISTORY_SIZE = 10
+PROFILE_LOG_DIR = "logs"
+PROFILE_LOG_FILE = "profile.jsonl"
+PROFILE_LOG_MAX_BYTES = 1024 * 1024
+PROFILE_LOG_BACKUPS = 5
+# Frame yang dilewati saat mencari fungsi pemanggil query (lapisan cursor & cache)
+PROFILE_INTERNAL_FRAMES = {'_run', 'execute', 'executemany', 'wrapper'}
+
+# N+1 query: statement berparameter yang sama dijalankan lebih dari N_PLUS_ONE_THRESHOLD kali
+# dalam satu rerun (biasanya helper query yang dipanggil di dalam loop per baris).
+# Selalu ditandai di panel profiling & log; mode debug lewat environment variable:
+#   CAR_WASH_N_PLUS_ONE=warn  -> peringatan di halaman
+#   CAR_WASH_N_PLUS_ONE=raise -> NPlusOneQueryError (rerun gagal, untuk development & test)
+N_PLUS_ONE_MODE = os.environ.get("CAR_WASH_N_PLUS_ONE", "").lower()
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("CAR_WASH_N_PLUS_ONE_THRESHOLD", "5"))
+
+_profile_local = _shared_state['profile_local']
+
+
+def _current_profile():
+    """Profil rerun yang sedang aktif di thread ini (None jika tidak ada)"""
+    return getattr(_profile_local, 'profile', None)
+
+
+def _query_caller():
+    """Fungsi di app.py yang menjalankan query dan pemanggilnya, mis. 'helper ← halaman:baris'"""
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None and len(frames) < 2:
+        code = frame.f_code
+        if code.co_filename == __file__ and code.co_name not in PROFILE_INTERNAL_FRAMES:
+            frames.append(code.co_name if not frames else f"{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return " ← ".join(frames) or "-"
+
+
+class NPlusOneQueryError(RuntimeError):
+    """Statement yang sama dijalankan berulang kali dalam satu rerun (pola N+1)"""
+
+
+def _trace_statement(statement):
+    """Trace callback SQLite: hitung statement yang dieksekusi selama profil aktif"""
+    profile = getattr(_profile_local, 'profile', None)
+    if profile is not None:
+        profile['statements'] += 1
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor yang mencatat query, durasi dan jumlah baris ke profil rerun aktif"""
+
+    _profile_entry = None
+
+    def _run(self, method, sql, parameters):
+        profile = _current_profile()
+        if profile is None:
+            self._profile_entry = None
+            return method(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return method(sql, parameters)
+        finally:
+            entry = {'sql': sql, 'ms': (time.perf_counter() - started) * 1000,
+                     'rows': max(self.rowcount, 0), 'section': profile['section'],
+                     'caller': _query_caller()}
+            profile['queries'].append(entry)
+            self._profile_entry = entry
+
+    def _fetch(self, method, *args):
+        entry = self._profile_entry
+        if entry is None:
+            return method(*args)
+        started = time.perf_counter()
+        result = method(*args)
+        entry['ms'] += (time.perf_counter() - started) * 1000
+        if isinstance(result, list):
+            entry['rows'] += len(result)
+        elif result is not None:
+            entry['rows'] += 1
+        return result
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+
+def start_profile():
+    """Mulai profil baru untuk rerun yang berjalan di thread ini"""
+    _profile_local.profile = {
+        'started': time.perf_counter(),
+        'started_at': datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S"),
+        'section': 'main',
+        'sections': {},
+        'queries': [],
+        'statements': 0,
+    }
+
+
+@contextmanager
+def profile_section(name):
+    """Timer satu bagian rerun (mis. fungsi halaman); query di dalamnya ditandai dengan nama bagian"""
+    profile = _current_profile()
+    if profile is None:
+        yield
+        return
+    previous = profile['section']
+    profile['section'] = name
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        profile['sections'][name] = profile['sections'].get(name, 0) + elapsed
+        profile['section'] = previous
+
+
+def get_profile_slow_query_ms():
+    """Batas query lambat (ms) dari Setting Toko, default PROFILE_SLOW_QUERY_MS"""
+    try:
+        value = get_setting('profiling_slow_query_ms')
+    except sqlite3.Error:
+        value = None
+    return float(value) if value not in (None, '') else PROFILE_SLOW_QUERY_MS
+
+
+def summarize_queries(queries):
+    """Kelompokkan query per teks SQL: jumlah, total & maks durasi, baris, pemanggil; urut dari total terlama"""
+    groups = {}
+    for entry in queries:
+        sql = " ".join(entry['sql'].split())
+        group = groups.setdefault(sql, {'sql': sql, 'count': 0, 'ms': 0.0, 'max_ms': 0.0,
+                                        'rows': 0, 'section': entry['section'], 'callers': []})
+        group['count'] += 1
+        group['ms'] += entry['ms']
+        group['max_ms'] = max(group['max_ms'], entry['ms'])
+        group['rows'] += entry['rows']
+        if entry['caller'] not in group['callers']:
+            group['callers'].append(entry['caller'])
+    return sorted(groups.values(), key=lambda g: g['ms'], reverse=True)
+
+
+def find_n_plus_one(query_groups, threshold=N_PLUS_ONE_THRESHOLD):
+    """Kelompok query (hasil summarize_queries) yang dijalankan lebih dari `threshold` kali"""
+    return [{'sql': group['sql'], 'count': group['count'], 'ms': round(group['ms'], 1),
+             'callers': group['callers']}
+            for group in query_groups if group['count'] > threshold]
+
+
+def format_n_plus_one(violations):
+    """Pesan ringkas untuk daftar N+1 query"""
+    return "; ".join(f"{v['count']}x {v['sql'][:80]} (dari {', '.join(v['callers'])})" for v in violations)
+
+
+def finish_profile():
+    """Tutup profil rerun aktif: simpan ringkasan ke riwayat sesi dan log JSONL, return ringkasan"""
+    profile = _current_profile()
+    if profile is None:
+        return None
+    _profile_local.profile = None
+
+    queries = profile['queries']
+    query_groups = summarize_queries(queries)
+    slow_ms = get_profile_slow_query_ms()
+    history = st.session_state.get('profile_history', [])
+    summary = {
+        'rerun': history[-1]['rerun'] + 1 if history else 1,
+        'ts': profile['started_at'],
+        'user': st.session_state.get('login_user', '-'),
+        'role': st.session_state.get('login_role', '-'),
+        'page': st.session_state.get('menu', '-'),
+        'total_ms': round((time.perf_counter() - profile['started']) * 1000, 1),
+        'sections': {name: round(ms, 1) for name, ms in profile['sections'].items()},
+        'queries': len(queries),
+        'query_ms': round(sum(entry['ms'] for entry in queries), 1),
+        'rows': sum(entry['rows'] for entry in queries),
+        'statements': profile['statements'],
+        'slow_query_ms': slow_ms,
+        'slow_queries': [
+            {'sql': " ".join(entry['sql'].split()), 'ms': round(entry['ms'], 1),
+             'rows': entry['rows'], 'section': entry['section'], 'caller': entry['caller']}
+            for entry in queries if entry['ms'] >= slow_ms
+        ],
+        'n_plus_one': find_n_plus_one(query_groups),
+    }
+    write_profile_log(summary)
+    summary['query_groups'] = query_groups
+    st.session_state['profile_history'] = (history + [summary])[-PROFILE_HISTORY_SIZE:]
+    return summary
+
+
+def get_profile_log_path():
+    """Path log profiling di folder logs/ di samping file database aktif"""
+    return os.path.join(os.path.dirname(os.path.abspath(DB_NAME)), PROFILE_LOG_DIR, PROFILE_LOG_FILE)
+
+
+@st.cache_resource(show_spinner=False)
+def get_profile_logger(path):
+    """Logger JSONL dengan rotasi per ukuran file, dibuat sekali per proses"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=PROFILE_LOG_MAX_BYTES,
+                                  backupCount=PROFILE_LOG_BACKUPS, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger = logging.getLogger(f"car_wash.profile.{path}")
+    for old_handler in logger.handlers[:]:
+        logger.removeHandler(old_handler)
+        old_handler.close()
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def write_profile_log(summary):
+    """Tulis satu baris JSON per rerun ke log profiling (gagal tulis tidak mengganggu aplikasi)"""
+    try:
+        get_profile_logger(get_profile_log_path()).info(json.dumps(summary, ensure_ascii=False))
+    except OSError:
+        pass
+
+
+def render_profile_panel(summary):
+    """Panel profiling di sidebar (khusus Admin): waktu per bagian dan query SQL rerun ini"""
+    with st.sidebar.expander("🔬 Profiling Rerun", expanded=False):
+        st.caption(f"⏱️ {summary['total_ms']:,.0f} ms · 🗄️ {summary['queries']} query "
+                   f"({summary['query_ms']:,.0f} ms, {summary['rows']:,} baris) · "
+                   f"{summary['statements']} statement SQLite")
+        if summary['sections']:
+            st.dataframe(pd.DataFrame(
+                [{'Bagian': name, 'Waktu (ms)': ms} for name, ms in summary['sections'].items()]
+            ), hide_index=True, use_container_width=True)
+
+        if summary['slow_queries']:
+            st.warning(f"🐢 {len(summary['slow_queries'])} query ≥ {summary['slow_query_ms']:g} ms")
+        for violation in summary['n_plus_one']:
+            st.error(f"🔁 N+1: {violation['count']}x dari {', '.join(violation['callers'])}")
+        if summary['query_groups']:
+            st.dataframe(pd.DataFrame([{
+                'Query': group['sql'],
+                'Jumlah': group['count'],
+                'Total (ms)': round(group['ms'], 1),
+                'Maks (ms)': round(group['max_ms'], 1),
+                'Baris': group['rows'],
+                'Pemanggil': ", ".join(group['callers']),
+            } for group in summary['query_groups']]), hide_index=True, use_container_width=True)
+
+        history = st.session_state.get('profile_history', [])
+        if len(history) > 1:
+            st.caption("Rerun terakhir")
+            st.dataframe(pd.DataFrame([{
+                'Waktu': item['ts'][-8:],
+                'Halaman': item['page'],
+                'Total (ms)': item['total_ms'],
+                'Query': item['queries'],
+            } for item in reversed(history)]), hide_index=True, use_container_width=True)
+
+        slow_ms = st.number_input("Batas query lambat (ms)", min_value=1.0, step=10.0,
+                                  value=float(summary['slow_query_ms']), key="profile_slow_query_ms")
+        if slow_ms != summary['slow_query_ms'] and st.button("💾 Simpan Batas", key="save_profile_slow_query_ms"):
+            success, msg = update_setting('profiling_slow_query_ms', slow_ms)
+            if success:
+                add_audit("profiling_update", f"Batas query lambat: {slow_ms:g} ms")
+            (st.success if success else st.error)(msg)
+        st.caption(f"Log: `{get_profile_log_path()}`")
+
+
+# --- Query Result Cache ---
+# Hasil fungsi baca disimpan per (fungsi, argumen) beserta versi tulis tabel yang dibacanya.
+# Helper tulis memanggil invalidate_tables() setelah commit; entri dengan versi lama
+# otomatis dianggap kadaluarsa, jadi rerun tanpa perubahan data tidak menyentuh SQLite.
+QUERY_CACHE_MAX_ENTRIES = 256
+# Batas umur entri untuk perubahan dari luar aplikasi (mis. script lain menulis ke database)
+QUERY_CACHE_TTL_SECONDS = 300
+
+# Tabel turunan yang ikut berubah lewat trigger saat tabel sumber ditulis
+TABLE_DEPENDENTS = {
+    'wash_transactions': ['daily_revenue', 'customer_stats'],
+    # sale_items selalu ditulis bersama coffee_sales (transaksi yang sama)
+    'coffee_sales': ['daily_revenue', 'sale_items'],
+    # Keranjang coffee kasir ikut ditulis ke sale_items (kasir_transaction_id)
+    'kasir_transactions': ['daily_revenue', 'customer_stats', 'sale_items'],
+}
+
+_query_cache = _shared_state['query_cache']
+_query_lock = _shared_state['query_lock']
+_table_versions = _shared_state['table_versions']
+_query_stats = _shared_state['query_stats']
+
+
+def invalidate_tables(*tables):
+    """Naikkan versi tulis tabel sehingga hasil query yang membacanya kadaluarsa"""
+    with _query_lock:
+        for table in tables:
+            for name in [table] + TABLE_DEPENDENTS.get(table, []):
+                _table_versions[name] = _table_versions.get(name, 0) + 1
+
+
+def invalidate_all_tables():
+    """Kosongkan seluruh cache query (reset, populate, restore database)"""
+    with _query_lock:
+        _query_cache.clear()
+        _table_versions['*'] = _table_versions.get('*', 0) + 1
+
+
+def get_query_cache_stats():
+    """Statistik cache query: jumlah entri, hit, dan miss"""
+    with _query_lock:
+        return {'entries': len(_query_cache), **_query_stats}
+
+
+def _clone_result(result):
+    """Salin hasil cache agar caller yang memodifikasi tidak mengubah isi cache"""
+    if isinstance(result, pd.DataFrame):
+        return result.copy()
+    if isinstance(result, list):
+        return [dict(row) if isinstance(row, dict) else row for row in result]
+    if isinstance(result, (dict, set)):
+        return copy.deepcopy(result)
+    if isinstance(result, tuple):
+        # Mis. (DataFrame, cursor) dari helper paging
+        return tuple(_clone_result(item) for item in result)
+    return result
+
+
+def cached_query(*tables):
+    """Decorator: cache hasil fungsi baca, kadaluarsa saat salah satu tabel ditulis"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__name__, DB_NAME, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+
+            now = time.monotonic()
+            with _query_lock:
+                versions = tuple(_table_versions.get(t, 0) for t in ('*',) + tables)
+                entry = _query_cache.get(key)
+                if entry and entry[0] == versions and now - entry[1] < QUERY_CACHE_TTL_SECONDS:
+                    _query_cache.move_to_end(key)
+                    _query_stats['hits'] += 1
+                    return _clone_result(entry[2])
+                _query_stats['misses'] += 1
+
+            # Versi dicatat sebelum query: jika ada tulis selama query berjalan,
+            # entri ini langsung kadaluarsa pada pembacaan berikutnya
+            result = func(*args, **kwargs)
+            with _query_lock:
+                _query_cache[key] = (versions, now, result)
+                _query_cache.move_to_end(key)
+                while len(_query_cache) > QUERY_CACHE_MAX_ENTRIES:
+                    _query_cache.popitem(last=False)
+            return _clone_result(result)
+        return wrapper
+    return decorator
+
 # Paket Cucian (akan diload dari database)
 PAKET_CUCIAN = {
     "Cuci Reguler": 50000,
@@ -96,8 +627,8 @@ DEFAULT_CHECKLIST_SELESAI = [
 ]
 
 # --- Database Setup ---
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
+def _migrate_base_schema(conn):
+    """Migrasi 1: tabel inti, kolom tambahan versi lama, dan data default"""
     c = conn.cursor()
     
     # Tabel customers - database pelanggan
@@ -249,45 +780,38 @@ def init_db():
     except sqlite3.OperationalError:
         # Column doesn't exist, add it
         c.execute("ALTER TABLE kasir_transactions ADD COLUMN secret_code TEXT")
-        conn.commit()
     
     # Migration: Add vehicle info columns to customers table if they don't exist
     try:
         c.execute("SELECT jenis_kendaraan FROM customers LIMIT 1")
     except sqlite3.OperationalError:
         c.execute("ALTER TABLE customers ADD COLUMN jenis_kendaraan TEXT")
-        conn.commit()
     
     try:
         c.execute("SELECT merk_kendaraan FROM customers LIMIT 1")
     except sqlite3.OperationalError:
         c.execute("ALTER TABLE customers ADD COLUMN merk_kendaraan TEXT")
-        conn.commit()
     
     try:
         c.execute("SELECT ukuran_mobil FROM customers LIMIT 1")
     except sqlite3.OperationalError:
         c.execute("ALTER TABLE customers ADD COLUMN ukuran_mobil TEXT")
-        conn.commit()
     
     # Migration: Add vehicle info columns to wash_transactions table if they don't exist
     try:
         c.execute("SELECT jenis_kendaraan FROM wash_transactions LIMIT 1")
     except sqlite3.OperationalError:
         c.execute("ALTER TABLE wash_transactions ADD COLUMN jenis_kendaraan TEXT")
-        conn.commit()
     
     try:
         c.execute("SELECT merk_kendaraan FROM wash_transactions LIMIT 1")
     except sqlite3.OperationalError:
         c.execute("ALTER TABLE wash_transactions ADD COLUMN merk_kendaraan TEXT")
-        conn.commit()
     
     try:
         c.execute("SELECT ukuran_mobil FROM wash_transactions LIMIT 1")
     except sqlite3.OperationalError:
         c.execute("ALTER TABLE wash_transactions ADD COLUMN ukuran_mobil TEXT")
-        conn.commit()
     
     # Tabel customer_reviews - untuk menyimpan review dari customer
     # Check if table exists and has wrong structure, recreate if needed
@@ -300,7 +824,6 @@ def init_db():
             # Old structure detected, need to recreate table
             # First, backup existing data
             c.execute("ALTER TABLE customer_reviews RENAME TO customer_reviews_old")
-            conn.commit()
     
     c.execute('''
         CREATE TABLE IF NOT EXISTS customer_reviews (
@@ -330,7 +853,6 @@ def init_db():
                 FROM customer_reviews_old
             """)
             c.execute("DROP TABLE customer_reviews_old")
-            conn.commit()
         except:
             pass
     
@@ -340,7 +862,6 @@ def init_db():
     except sqlite3.OperationalError:
         # Column doesn't exist, add it
         c.execute("ALTER TABLE customer_reviews ADD COLUMN reward_points INTEGER DEFAULT 10")
-        conn.commit()
     
     # Tabel customer_points - untuk menyimpan akumulasi poin customer
     c.execute('''
@@ -493,9 +1014,863 @@ def init_db():
             FOREIGN KEY (payroll_id) REFERENCES payroll(id)
         )
     ''')
-    
+
+
+# --- Index Management ---
+# Index sekunder untuk query yang sering dipanggil (diverifikasi oleh check_query_plans.py).
+# customer_points(nopol) sudah dilayani oleh index UNIQUE(nopol, no_telp).
+DB_INDEXES = {
+    'idx_wash_transactions_status': ('wash_transactions', 'status'),
+    'idx_wash_transactions_nopol': ('wash_transactions', 'nopol'),
+    'idx_wash_transactions_nopol_tanggal': ('wash_transactions', 'nopol, tanggal_iso'),
+    'idx_kasir_transactions_wash_trans_id': ('kasir_transactions', 'wash_trans_id'),
+    'idx_kasir_transactions_secret_code': ('kasir_transactions', 'secret_code'),
+    'idx_kasir_transactions_nopol_tanggal': ('kasir_transactions', 'nopol, tanggal_iso'),
+    'idx_customer_reviews_secret_code': ('customer_reviews', 'secret_code'),
+    'idx_customer_points_no_telp': ('customer_points', 'no_telp'),
+    'idx_customer_points_total': ('customer_points', 'total_points, id'),
+    'idx_attendance_employee_tanggal': ('attendance', 'employee_id, tanggal_iso'),
+    'idx_kas_bon_employee_status': ('kas_bon', 'employee_id, status'),
+    'idx_pembayaran_kas_bon_kas_bon_id': ('pembayaran_kas_bon', 'kas_bon_id'),
+    'idx_payroll_employee_id': ('payroll', 'employee_id'),
+    'idx_audit_trail_user_timestamp': ('audit_trail', 'user, timestamp_iso'),
+}
+
+def ensure_indexes(conn, names=None):
+    """Buat index dari DB_INDEXES (semua, atau hanya `names`) yang belum ada, lalu perbarui statistik query planner"""
+    c = conn.cursor()
+    for index_name in names or DB_INDEXES:
+        table, columns = DB_INDEXES[index_name]
+        c.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table}({columns})")
+    c.execute("PRAGMA optimize")
+
+def migrate_base_indexes(conn):
+    """Migrasi 3: index sekunder awal (index yang ditambahkan kemudian dibuat oleh migrasinya sendiri)"""
+    ensure_indexes(conn, [
+        'idx_wash_transactions_status', 'idx_wash_transactions_nopol', 'idx_kasir_transactions_wash_trans_id',
+        'idx_kasir_transactions_secret_code', 'idx_customer_reviews_secret_code', 'idx_customer_points_no_telp',
+        'idx_attendance_employee_tanggal', 'idx_kas_bon_employee_status', 'idx_pembayaran_kas_bon_kas_bon_id',
+        'idx_payroll_employee_id',
+    ])
+
+
+# --- Daily Revenue Rollup ---
+# Tabel daily_revenue menyimpan agregat per (tanggal_iso, line) untuk wash/coffee/kasir.
+# Di-update oleh trigger di dalam transaksi yang sama dengan INSERT/UPDATE/DELETE
+# (save_transaction, save_kasir_transaction, save_coffee_sale, delete/update helpers).
+# Format: table -> (line, kolom total, kolom total cuci, kolom total coffee); '0' = tidak ada
+DAILY_REVENUE_SOURCES = {
+    'wash_transactions': ('wash', 'harga', 'harga', '0'),
+    'coffee_sales': ('coffee', 'total', '0', 'total'),
+    'kasir_transactions': ('kasir', 'total_bayar', 'harga_cuci', 'harga_coffee'),
+}
+
+def _rollup_value_sql(column, alias=None):
+    """Ekspresi nilai kolom untuk rollup (NULL dianggap 0)"""
+    if column == '0':
+        return '0'
+    return f"COALESCE({alias}.{column}, 0)" if alias else f"COALESCE({column}, 0)"
+
+def _rollup_upsert_sql(table, alias, sign):
+    """SQL UPSERT satu baris (NEW/OLD) ke daily_revenue dengan tanda +1 / -1"""
+    line, total_col, cuci_col, coffee_col = DAILY_REVENUE_SOURCES[table]
+    tanggal_iso = iso_date_sql(f"{alias}.tanggal")
+    coffee_value = _rollup_value_sql(coffee_col, alias)
+    return f"""
+        INSERT INTO daily_revenue (tanggal_iso, line, jumlah_transaksi, total, total_cuci, total_coffee, jumlah_dengan_coffee)
+        SELECT {tanggal_iso}, '{line}', {sign}, {sign} * {_rollup_value_sql(total_col, alias)},
+               {sign} * {_rollup_value_sql(cuci_col, alias)}, {sign} * {coffee_value},
+               {sign} * ({coffee_value} > 0)
+        WHERE {tanggal_iso} IS NOT NULL
+        ON CONFLICT(tanggal_iso, line) DO UPDATE SET
+            jumlah_transaksi = jumlah_transaksi + excluded.jumlah_transaksi,
+            total = total + excluded.total,
+            total_cuci = total_cuci + excluded.total_cuci,
+            total_coffee = total_coffee + excluded.total_coffee,
+            jumlah_dengan_coffee = jumlah_dengan_coffee + excluded.jumlah_dengan_coffee;
+    """
+
+def migrate_daily_revenue(conn):
+    """Buat tabel daily_revenue + trigger sinkronisasi; isi dari data lama jika tabel baru dibuat"""
+    c = conn.cursor()
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='daily_revenue'")
+    is_new = c.fetchone() is None
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS daily_revenue (
+            tanggal_iso TEXT NOT NULL,
+            line TEXT NOT NULL,
+            jumlah_transaksi INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            total_cuci INTEGER NOT NULL DEFAULT 0,
+            total_coffee INTEGER NOT NULL DEFAULT 0,
+            jumlah_dengan_coffee INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tanggal_iso, line)
+        )
+    ''')
+
+    cleanup_sql = "DELETE FROM daily_revenue WHERE jumlah_transaksi <= 0;"
+    for table, (line, total_col, cuci_col, coffee_col) in DAILY_REVENUE_SOURCES.items():
+        watched = ', '.join(['tanggal'] + sorted({col for col in (total_col, cuci_col, coffee_col) if col != '0'}))
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                {_rollup_upsert_sql(table, 'NEW', 1)}
+            END
+        """)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                {_rollup_upsert_sql(table, 'OLD', -1)}
+                {cleanup_sql}
+            END
+        """)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_update
+            AFTER UPDATE OF {watched} ON {table}
+            BEGIN
+                {_rollup_upsert_sql(table, 'OLD', -1)}
+                {_rollup_upsert_sql(table, 'NEW', 1)}
+                {cleanup_sql}
+            END
+        """)
+
+    if is_new:
+        _rebuild_daily_revenue(conn)
+
+def _rollup_select_sql(table, source=None):
+    """INSERT ... SELECT agregat per tanggal dari `source` (default: tabel itu sendiri) ke daily_revenue"""
+    line, total_col, cuci_col, coffee_col = DAILY_REVENUE_SOURCES[table]
+    coffee_value = _rollup_value_sql(coffee_col)
+    return f"""
+        INSERT INTO daily_revenue (tanggal_iso, line, jumlah_transaksi, total, total_cuci, total_coffee, jumlah_dengan_coffee)
+        SELECT tanggal_iso, '{line}', COUNT(*), SUM({_rollup_value_sql(total_col)}),
+               SUM({_rollup_value_sql(cuci_col)}), SUM({coffee_value}), SUM({coffee_value} > 0)
+        FROM {source or table}
+        WHERE tanggal_iso IS NOT NULL
+        GROUP BY tanggal_iso
+    """
+
+def _rebuild_daily_revenue(conn):
+    """Hitung ulang seluruh isi daily_revenue dari tabel transaksi (termasuk arsip jika di-ATTACH)"""
+    c = conn.cursor()
+    archived = {row[1] for row in c.execute("PRAGMA database_list")}
+    archived_tables = set()
+    if 'archive' in archived:
+        c.execute("SELECT name FROM archive.sqlite_master WHERE type = 'table'")
+        archived_tables = {row[0] for row in c.fetchall()}
+    c.execute("DELETE FROM daily_revenue")
+    for table, (line, total_col, cuci_col, coffee_col) in DAILY_REVENUE_SOURCES.items():
+        source = None
+        if table in archived_tables:
+            cols = ', '.join(['tanggal_iso'] + sorted({col for col in (total_col, cuci_col, coffee_col) if col != '0'}))
+            source = f"(SELECT {cols} FROM main.{table} UNION ALL SELECT {cols} FROM archive.{table})"
+        c.execute(_rollup_select_sql(table, source))
+
+def rebuild_daily_revenue():
+    """Rebuild rollup pendapatan harian dari data transaksi (untuk perbaikan data)"""
+    with db_connection() as conn:
+        try:
+            with attach_archive(conn):
+                _rebuild_daily_revenue(conn)
+                # Commit sebelum DETACH (attach_archive membatalkan transaksi yang masih terbuka)
+                conn.commit()
+            invalidate_tables('daily_revenue')
+            c = conn.cursor()
+            c.execute("SELECT COUNT(*) FROM daily_revenue")
+            count = c.fetchone()[0]
+            return True, f"Rollup pendapatan harian berhasil di-rebuild ({count} baris)"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
+
+
+# --- ISO Date Columns ---
+# Kolom tanggal asli disimpan sebagai dd-mm-yyyy sehingga BETWEEN/ORDER BY tidak valid.
+# Setiap tabel punya kolom pendamping ISO yang di-index dan diisi otomatis oleh trigger.
+# Format: table -> (kolom asli, kolom ISO, kolom urutan kedua untuk index)
+ISO_DATE_COLUMNS = {
+    'wash_transactions': ('tanggal', 'tanggal_iso', 'waktu_masuk'),
+    'kasir_transactions': ('tanggal', 'tanggal_iso', 'waktu'),
+    'coffee_sales': ('tanggal', 'tanggal_iso', 'waktu'),
+    'attendance': ('tanggal', 'tanggal_iso', 'jam_masuk'),
+    'audit_trail': ('timestamp', 'timestamp_iso', None),
+}
+
+def iso_date_sql(column):
+    """Ekspresi SQL yang mengubah dd-mm-yyyy[ HH:MM:SS] menjadi yyyy-mm-dd[ HH:MM:SS]"""
+    return (
+        f"(CASE WHEN {column} GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]*' "
+        f"THEN substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || substr({column}, 1, 2) || substr({column}, 11) "
+        f"WHEN {column} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*' THEN {column} END)"
+    )
+
+def migrate_iso_dates(conn):
+    """Tambah kolom ISO + index + trigger sinkronisasi, lalu backfill data lama"""
+    c = conn.cursor()
+    for table, (src_col, iso_col, order_col) in ISO_DATE_COLUMNS.items():
+        try:
+            c.execute(f"SELECT {iso_col} FROM {table} LIMIT 1")
+        except sqlite3.OperationalError:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {iso_col} TEXT")
+
+        index_cols = f"{iso_col}, {order_col}" if order_col else iso_col
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{iso_col} ON {table}({index_cols})")
+
+        # Trigger menjaga kolom ISO tetap sinkron untuk semua jalur INSERT/UPDATE
+        new_expr = iso_date_sql(f"NEW.{src_col}")
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{iso_col}_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                UPDATE {table} SET {iso_col} = {new_expr} WHERE id = NEW.id;
+            END
+        """)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{iso_col}_update
+            AFTER UPDATE OF {src_col} ON {table}
+            BEGIN
+                UPDATE {table} SET {iso_col} = {new_expr} WHERE id = NEW.id;
+            END
+        """)
+
+        # Backfill data lama (ikut transaksi migrasi)
+        expr = iso_date_sql(src_col)
+        c.execute(f"UPDATE {table} SET {iso_col} = {expr} WHERE {iso_col} IS NULL AND {expr} IS NOT NULL")
+
+
+# --- Full-Text Search ---
+# Index FTS5 dengan tokenizer trigram (pencarian substring seperti LIKE '%...%', tidak
+# peka huruf besar/kecil). Isi index disinkronkan oleh trigger dari tabel sumbernya.
+FTS_INDEXES = {
+    'customers': ('customers_fts', ['nopol', 'nama_customer', 'no_telp']),
+    'kasir_transactions': ('kasir_transactions_fts', ['nopol', 'nama_customer', 'no_telp']),
+    'customer_reviews': ('customer_reviews_fts', ['nama_customer', 'nopol', 'review_text']),
+    'audit_trail': ('audit_trail_fts', ['action', 'detail']),
+}
+# Trigram butuh minimal 3 karakter; query lebih pendek memakai LIKE
+FTS_MIN_QUERY_LENGTH = 3
+SEARCH_LIMIT = 50
+
+def fts_trigram_available(conn):
+    """Cek apakah SQLite mendukung FTS5 + tokenizer trigram (tabel uji di savepoint, selalu dibatalkan)"""
+    conn.execute("SAVEPOINT fts_probe")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(probe, tokenize='trigram')")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.execute("ROLLBACK TO fts_probe")
+        conn.execute("RELEASE fts_probe")
+
+def migrate_fts_search(conn, tables=None):
+    """Buat tabel FTS5 + trigger sinkronisasi (semua di FTS_INDEXES, atau hanya `tables`), lalu isi index"""
+    if not fts_trigram_available(conn):
+        # SQLite tanpa FTS5/trigram: tidak ada tabel FTS, search_records() otomatis memakai LIKE
+        return
+    c = conn.cursor()
+    # Semua tabel FTS dibuat atau tidak sama sekali (transaksi luar di-commit oleh pemanggil)
+    c.execute("SAVEPOINT fts_build")
+    try:
+        for table in tables or FTS_INDEXES:
+            _create_fts_index(c, table)
+    except sqlite3.Error:
+        c.execute("ROLLBACK TO fts_build")
+        c.execute("RELEASE fts_build")
+        raise
+    c.execute("RELEASE fts_build")
+
+def _create_fts_index(c, table):
+    """Tabel FTS5 + trigger sinkronisasi untuk satu tabel sumber, lalu isi index dari data yang ada"""
+    fts_table, columns = FTS_INDEXES[table]
+    cols = ", ".join(columns)
+    c.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table}
+        USING fts5({cols}, content='{table}', content_rowid='id', tokenize='trigram')
+    """)
+    new_values = ", ".join(f"new.{col}" for col in columns)
+    old_values = ", ".join(f"old.{col}" for col in columns)
+    insert_sql = f"INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_values});"
+    delete_sql = f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_values});"
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_insert AFTER INSERT ON {table}
+        BEGIN {insert_sql} END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_delete AFTER DELETE ON {table}
+        BEGIN {delete_sql} END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_update AFTER UPDATE OF {cols} ON {table}
+        BEGIN {delete_sql} {insert_sql} END
+    """)
+    c.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+def migrate_base_fts_search(conn):
+    """Migrasi 5: index FTS untuk customers, transaksi kasir, dan review"""
+    migrate_fts_search(conn, ['customers', 'kasir_transactions', 'customer_reviews'])
+
+def migrate_audit_search(conn):
+    """Migrasi 6: index (user, timestamp_iso) dan index FTS audit trail saja"""
+    ensure_indexes(conn, ['idx_audit_trail_user_timestamp'])
+    migrate_fts_search(conn, ['audit_trail'])
+
+@cached_query('schema_version')
+def get_fts_tables():
+    """Nama tabel FTS yang tersedia di database"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%\\_fts' ESCAPE '\\'")
+        tables = {row[0] for row in c.fetchall()}
+    return tables
+
+def use_fts(table, query):
+    """True jika pencarian `query` di `table` bisa memakai index FTS"""
+    return (table in FTS_INDEXES and len(query.strip()) >= FTS_MIN_QUERY_LENGTH
+            and FTS_INDEXES[table][0] in get_fts_tables())
+
+def fts_match_query(query, columns=None):
+    """Ubah teks pencarian user menjadi ekspresi MATCH FTS5 (frasa, opsional dibatasi kolom)"""
+    phrase = '"' + query.strip().replace('"', '""') + '"'
+    if columns:
+        return "{" + " ".join(columns) + "}: " + phrase
+    return phrase
+
+def fts_match_source(table, query, columns=None):
+    """Sumber FROM (hasil FTS CROSS JOIN tabel) untuk query lain, atau None jika FTS tidak bisa dipakai"""
+    if not use_fts(table, query):
+        return None
+    fts_table = FTS_INDEXES[table][0]
+    # CROSS JOIN memaksa SQLite mulai dari hasil FTS lalu lookup baris lewat primary key
+    source = (f"(SELECT rowid AS match_id FROM {fts_table} WHERE {fts_table} MATCH ?) fts_match "
+              f"CROSS JOIN {table} ON {table}.id = fts_match.match_id")
+    return source, [fts_match_query(query, columns)]
+
+def search_records(table, query, columns=None, limit=SEARCH_LIMIT):
+    """Cari baris tabel (customers / kasir_transactions / customer_reviews), terurut relevansi, maks `limit` baris"""
+    fts_table, fts_columns = FTS_INDEXES[table]
+    columns = columns or fts_columns
+    with db_connection() as conn:
+        if use_fts(table, query):
+            df = pd.read_sql(f"""
+                SELECT t.* FROM {fts_table} f
+                JOIN {table} t ON t.id = f.rowid
+                WHERE {fts_table} MATCH ?
+                ORDER BY f.rank
+                LIMIT ?
+            """, conn, params=(fts_match_query(query, columns), limit))
+        else:
+            # Query pendek atau FTS tidak tersedia
+            like_clause = " OR ".join(f"{col} LIKE ?" for col in columns)
+            df = pd.read_sql(f"""
+                SELECT * FROM {table}
+                WHERE {like_clause}
+                ORDER BY id DESC
+                LIMIT ?
+            """, conn, params=(*[f"%{query.strip()}%"] * len(columns), limit))
+    return df
+
+
+# --- Sale Items ---
+# Isi keranjang coffee/snack disimpan satu baris per menu di sale_items, terhubung ke
+# coffee_sales (sale_id: penjualan standalone maupun salinan coffee dari transaksi kasir) dan
+# ke kasir_transactions (kasir_transaction_id), ditulis di transaksi yang sama. Kolom JSON
+# items/coffee_items tetap disimpan sebagai snapshot struk; laporan item (terlaris, menu mix)
+# dan teks item di riwayat/laporan memakai sale_items, bukan parse JSON per baris.
+SALE_ITEMS_BACKFILL_BATCH = 1000
+
+def parse_sale_items(items):
+    """Ubah keranjang (JSON atau list dict) menjadi list (nama item, qty, harga satuan)"""
+    if isinstance(items, str):
+        try:
+            items = json.loads(items) if items.strip() else []
+        except ValueError:
+            return []
+    rows = []
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        # Format kasir: name/price, format lama coffee_sales: nama/harga
+        name = item.get('name', item.get('nama'))
+        try:
+            qty = int(item.get('qty', item.get('jumlah', 0)) or 0)
+            price = item.get('price', item.get('harga'))
+            if price is None:
+                price = (item.get('subtotal') or 0) / qty if qty else 0
+            price = int(price)
+        except (TypeError, ValueError):
+            continue
+        if name and qty > 0:
+            rows.append((str(name), qty, price))
+    return rows
+
+def insert_sale_items(c, sale_id, items, kasir_transaction_id=None):
+    """Tulis baris sale_items untuk satu penjualan coffee (pakai cursor transaksi pemanggil)"""
+    rows = parse_sale_items(items)
+    if rows:
+        c.executemany("""
+            INSERT INTO sale_items (sale_id, kasir_transaction_id, item_name, qty, unit_price) VALUES (?, ?, ?, ?, ?)
+        """, [(sale_id, kasir_transaction_id, name, qty, price) for name, qty, price in rows])
+    return len(rows)
+
+def sale_items_text_sql(id_column="coffee_sales.id", link_column="sale_id"):
+    """Subquery teks item satu penjualan, mis. '2x Latte, 1x Roti Bakar'"""
+    return f"""(SELECT group_concat(qty || 'x ' || item_name, ', ')
+               FROM (SELECT qty, item_name FROM sale_items WHERE {link_column} = {id_column} ORDER BY id))"""
+
+def kasir_items_text_sql(id_column="kasir_transactions.id"):
+    """Subquery teks item coffee/snack satu transaksi kasir"""
+    return sale_items_text_sql(id_column, "kasir_transaction_id")
+
+def migrate_sale_items(conn):
+    """Buat tabel sale_items + index, lalu backfill dari JSON coffee_sales.items per batch"""
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sale_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sale_id INTEGER NOT NULL,
+            item_name TEXT NOT NULL,
+            qty INTEGER NOT NULL,
+            unit_price INTEGER NOT NULL,
+            FOREIGN KEY (sale_id) REFERENCES coffee_sales(id)
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_sale_id ON sale_items(sale_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_item_name ON sale_items(item_name)")
+
+    last_id = 0
+    while True:
+        c.execute("""
+            SELECT id, items FROM coffee_sales
+            WHERE id > ? AND NOT EXISTS (SELECT 1 FROM sale_items WHERE sale_id = coffee_sales.id)
+            ORDER BY id LIMIT ?
+        """, (last_id, SALE_ITEMS_BACKFILL_BATCH))
+        batch = c.fetchall()
+        if not batch:
+            break
+        c.executemany("INSERT INTO sale_items (sale_id, item_name, qty, unit_price) VALUES (?, ?, ?, ?)",
+                      [(sale_id, name, qty, price)
+                       for sale_id, items in batch for name, qty, price in parse_sale_items(items)])
+        last_id = batch[-1][0]
+
+SALE_ITEMS_TABLE_SQL = """
+    CREATE TABLE sale_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sale_id INTEGER,
+        kasir_transaction_id INTEGER,
+        item_name TEXT NOT NULL,
+        qty INTEGER NOT NULL,
+        unit_price INTEGER NOT NULL,
+        FOREIGN KEY (sale_id) REFERENCES coffee_sales(id),
+        FOREIGN KEY (kasir_transaction_id) REFERENCES kasir_transactions(id)
+    )
+"""
+
+def migrate_sale_items_kasir_link(conn):
+    """Hubungkan sale_items ke kasir_transactions: kolom kasir_transaction_id, link salinan coffee_sales,
+    lalu backfill keranjang kasir yang belum punya baris item"""
+    c = conn.cursor()
+    # sale_id jadi nullable (keranjang kasir tanpa salinan coffee_sales); SQLite tidak bisa
+    # mengubah constraint kolom, jadi tabel dibuat ulang
+    _rebuild_table(conn, 'sale_items', SALE_ITEMS_TABLE_SQL)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_sale_id ON sale_items(sale_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_item_name ON sale_items(item_name)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_kasir ON sale_items(kasir_transaction_id)")
+
+    # Salinan coffee dari kasir: tanggal, jam, isi keranjang dan nominal sama dengan transaksi kasirnya
+    c.execute("""
+        UPDATE sale_items SET kasir_transaction_id = (
+            SELECT MIN(k.id) FROM coffee_sales cs
+            JOIN kasir_transactions k ON k.tanggal_iso = cs.tanggal_iso AND k.waktu = cs.waktu
+                 AND k.coffee_items = cs.items AND k.harga_coffee = cs.total
+            WHERE cs.id = sale_items.sale_id
+        )
+        WHERE sale_id IS NOT NULL
+    """)
+
+    last_id = 0
+    while True:
+        c.execute("""
+            SELECT id, coffee_items FROM kasir_transactions
+            WHERE id > ? AND harga_coffee > 0 AND coffee_items IS NOT NULL AND coffee_items != ''
+              AND NOT EXISTS (SELECT 1 FROM sale_items WHERE kasir_transaction_id = kasir_transactions.id)
+            ORDER BY id LIMIT ?
+        """, (last_id, SALE_ITEMS_BACKFILL_BATCH))
+        batch = c.fetchall()
+        if not batch:
+            break
+        c.executemany("""
+            INSERT INTO sale_items (sale_id, kasir_transaction_id, item_name, qty, unit_price) VALUES (NULL, ?, ?, ?, ?)
+        """, [(kasir_id, name, qty, price)
+              for kasir_id, items in batch for name, qty, price in parse_sale_items(items)])
+        last_id = batch[-1][0]
+
+@cached_query('sale_items', 'coffee_sales')
+def get_sale_item_summary(start_date, end_date):
+    """Item coffee/snack terjual per menu dalam rentang tanggal (GROUP BY di SQL), urut dari pendapatan terbesar"""
+    with db_connection() as conn:
+        df = pd.read_sql("""
+            SELECT si.item_name AS "Item",
+                   SUM(si.qty) AS "Qty Terjual",
+                   SUM(si.qty * si.unit_price) AS "Total Pendapatan",
+                   COUNT(DISTINCT si.sale_id) AS "Jumlah Transaksi"
+            FROM coffee_sales cs
+            JOIN sale_items si ON si.sale_id = cs.id
+            WHERE cs.tanggal_iso BETWEEN ? AND ?
+            GROUP BY si.item_name
+            ORDER BY "Total Pendapatan" DESC, "Item"
+        """, conn, params=(to_iso_date(start_date), to_iso_date(end_date)))
+    return df
+
+
+# --- Customer Stats ---
+# Tabel customer_stats menyimpan statistik per nopol (kunjungan, kunjungan pertama/terakhir,
+# total belanja cuci & coffee) sehingga daftar customer bisa diurutkan/difilter per nilai
+# tanpa menggabungkan seluruh riwayat transaksi. Di-update oleh trigger di transaksi yang sama
+# dengan save_transaction, save_kasir_transaction dan helper update/delete.
+# Format: table -> (kunjungan, belanja cuci, belanja coffee, kolom yang memengaruhi statistik);
+# {t} diganti alias baris (NEW/OLD). Kasir yang membayar cuci tidak dihitung kunjungan lagi.
+CUSTOMER_STATS_SOURCES = {
+    'wash_transactions': ('1', 'COALESCE({t}harga, 0)', '0', 'nopol, tanggal, harga'),
+    'kasir_transactions': ('({t}wash_trans_id IS NULL)', '0', 'COALESCE({t}harga_coffee, 0)',
+                           'nopol, tanggal, wash_trans_id, harga_coffee'),
+}
+CUSTOMER_STATS_COLUMNS = ['nopol', 'visits', 'first_visit', 'last_visit', 'total_wash', 'total_coffee']
+# Urutan daftar customer per statistik (ekspresi harus sama persis dengan index di migrasi)
+CUSTOMER_STATS_SORTS = {
+    'last_visit': "s.last_visit",
+    'total_spend': "(s.total_wash + s.total_coffee)",
+    'visits': "s.visits",
+    'avg_ticket': "((s.total_wash + s.total_coffee) / s.visits)",
+}
+
+def _customer_stats_values(table, alias=None):
+    """Ekspresi (kunjungan, belanja cuci, belanja coffee) satu baris tabel sumber"""
+    prefix = f"{alias}." if alias else ""
+    return tuple(expr.format(t=prefix) for expr in CUSTOMER_STATS_SOURCES[table][:3])
+
+def _customer_stats_add_sql(table, alias):
+    """SQL UPSERT satu baris NEW ke customer_stats"""
+    visit, wash, coffee = _customer_stats_values(table, alias)
+    tanggal_iso = iso_date_sql(f"{alias}.tanggal")
+    return f"""
+        INSERT INTO customer_stats (nopol, visits, first_visit, last_visit, total_wash, total_coffee)
+        SELECT {alias}.nopol, {visit}, {tanggal_iso}, {tanggal_iso}, {wash}, {coffee}
+        WHERE COALESCE({alias}.nopol, '') != '' AND {tanggal_iso} IS NOT NULL
+        ON CONFLICT(nopol) DO UPDATE SET
+            visits = visits + excluded.visits,
+            first_visit = MIN(first_visit, excluded.first_visit),
+            last_visit = MAX(last_visit, excluded.last_visit),
+            total_wash = total_wash + excluded.total_wash,
+            total_coffee = total_coffee + excluded.total_coffee;
+    """
+
+def _customer_stats_remove_sql(table, alias):
+    """SQL mengurangi satu baris OLD dari customer_stats; tanggal pertama/terakhir dihitung ulang dari index nopol"""
+    visit, wash, coffee = _customer_stats_values(table, alias)
+    tanggal_iso = iso_date_sql(f"{alias}.tanggal")
+    visit_dates = " UNION ALL ".join(
+        f"SELECT {{agg}}(tanggal_iso) AS d FROM {source} WHERE nopol = {alias}.nopol"
+        for source in CUSTOMER_STATS_SOURCES
+    )
+    return f"""
+        UPDATE customer_stats SET
+            visits = visits - {visit},
+            total_wash = total_wash - {wash},
+            total_coffee = total_coffee - {coffee}
+        WHERE nopol = {alias}.nopol AND {tanggal_iso} IS NOT NULL;
+        UPDATE customer_stats SET
+            first_visit = COALESCE((SELECT MIN(d) FROM ({visit_dates.format(agg='MIN')})), first_visit),
+            last_visit = COALESCE((SELECT MAX(d) FROM ({visit_dates.format(agg='MAX')})), last_visit)
+        WHERE nopol = {alias}.nopol AND {tanggal_iso} IN (first_visit, last_visit);
+        DELETE FROM customer_stats WHERE nopol = {alias}.nopol AND visits <= 0;
+    """
+
+def migrate_customer_stats(conn):
+    """Buat tabel customer_stats + index + trigger sinkronisasi, lalu isi dari riwayat transaksi"""
+    ensure_indexes(conn, ['idx_wash_transactions_nopol_tanggal', 'idx_kasir_transactions_nopol_tanggal'])
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS customer_stats (
+            nopol TEXT PRIMARY KEY,
+            visits INTEGER NOT NULL DEFAULT 0,
+            first_visit TEXT NOT NULL,
+            last_visit TEXT NOT NULL,
+            total_wash INTEGER NOT NULL DEFAULT 0,
+            total_coffee INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for key, expr in CUSTOMER_STATS_SORTS.items():
+        index_expr = expr.replace("s.", "")
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_customer_stats_{key} ON customer_stats({index_expr}, nopol)")
+
+    for table, (_, _, _, watched) in CUSTOMER_STATS_SOURCES.items():
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_customer_stats_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                {_customer_stats_add_sql(table, 'NEW')}
+            END
+        """)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_customer_stats_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                {_customer_stats_remove_sql(table, 'OLD')}
+            END
+        """)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_customer_stats_update
+            AFTER UPDATE OF {watched} ON {table}
+            BEGIN
+                {_customer_stats_remove_sql(table, 'OLD')}
+                {_customer_stats_add_sql(table, 'NEW')}
+            END
+        """)
+    _rebuild_customer_stats(conn)
+
+def _rebuild_customer_stats(conn):
+    """Hitung ulang seluruh isi customer_stats dari tabel transaksi (termasuk arsip jika di-ATTACH)"""
+    c = conn.cursor()
+    archived_tables = set()
+    if 'archive' in {row[1] for row in c.execute("PRAGMA database_list")}:
+        c.execute("SELECT name FROM archive.sqlite_master WHERE type = 'table'")
+        archived_tables = {row[0] for row in c.fetchall()}
+
+    rows = []
+    for table in CUSTOMER_STATS_SOURCES:
+        visit, wash, coffee = _customer_stats_values(table)
+        select = f"SELECT nopol, tanggal_iso, {visit} AS visit, {wash} AS wash, {coffee} AS coffee FROM"
+        rows.append(f"{select} main.{table}")
+        if table in archived_tables:
+            rows.append(f"{select} archive.{table}")
+    c.execute("DELETE FROM customer_stats")
+    c.execute(f"""
+        INSERT INTO customer_stats (nopol, visits, first_visit, last_visit, total_wash, total_coffee)
+        SELECT nopol, SUM(visit), MIN(tanggal_iso), MAX(tanggal_iso), SUM(wash), SUM(coffee)
+        FROM ({' UNION ALL '.join(rows)})
+        WHERE COALESCE(nopol, '') != '' AND tanggal_iso IS NOT NULL
+        GROUP BY nopol
+        HAVING SUM(visit) > 0
+    """)
+
+def rebuild_customer_stats():
+    """Rebuild statistik customer dari seluruh riwayat transaksi (untuk perbaikan data)"""
+    with db_connection() as conn:
+        try:
+            with attach_archive(conn):
+                _rebuild_customer_stats(conn)
+                # Commit sebelum DETACH (attach_archive membatalkan transaksi yang masih terbuka)
+                conn.commit()
+            invalidate_tables('customer_stats')
+            c = conn.cursor()
+            c.execute("SELECT COUNT(*) FROM customer_stats")
+            count = c.fetchone()[0]
+            return True, f"Statistik customer berhasil di-rebuild ({count} customer)"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
+
+
+# --- Reward Points Ledger ---
+# Setiap perubahan poin dicatat sebagai event di points_ledger (earn/redeem/adjust, append-only)
+# dan saldo customer_points di-update dengan UPSERT / UPDATE bersyarat di transaksi yang sama,
+# jadi tidak ada baca-lalu-tulis yang bisa balapan. Customer dicari lewat customer_key
+# (nopol ternormalisasi, atau no. telepon jika tanpa nopol) yang punya index UNIQUE.
+POINTS_EVENT_TYPES = ('earn', 'redeem', 'adjust')
+REVIEW_REWARD_POINTS = 10
+
+def normalize_phone(no_telp):
+    """No. telepon hanya angka dengan awalan 0 (+62xxx / 62xxx / 8xxx -> 08xxx), '' jika kosong"""
+    digits = ''.join(ch for ch in str(no_telp or '') if ch.isdigit())
+    if digits.startswith('62'):
+        digits = '0' + digits[2:]
+    elif digits.startswith('8'):
+        digits = '0' + digits
+    return digits
+
+def points_customer_key(nopol=None, no_telp=None):
+    """Identitas customer untuk poin: nopol tanpa spasi (huruf besar), atau 'TELP:<no>' jika tanpa nopol"""
+    nopol = ''.join(str(nopol or '').split()).upper()
+    if nopol:
+        return nopol
+    phone = normalize_phone(no_telp)
+    return f"TELP:{phone}" if phone else None
+
+def migrate_points_ledger(conn):
+    """Tambah customer_key (gabung baris duplikat) ke customer_points, buat points_ledger + saldo awal"""
+    c = conn.cursor()
+    try:
+        c.execute("SELECT customer_key FROM customer_points LIMIT 1")
+    except sqlite3.OperationalError:
+        c.execute("ALTER TABLE customer_points ADD COLUMN customer_key TEXT")
+
+    # Baris lama dengan identitas sama (mis. nopol sama, no. telp beda) digabung ke baris pertama
+    c.execute("SELECT id, nopol, no_telp, total_points FROM customer_points ORDER BY id")
+    merged = {}
+    for row_id, nopol, no_telp, total_points in c.fetchall():
+        key = points_customer_key(nopol, no_telp)
+        if key is None:
+            continue
+        if key in merged:
+            merged[key][1] += total_points or 0
+            c.execute("DELETE FROM customer_points WHERE id = ?", (row_id,))
+        else:
+            merged[key] = [row_id, total_points or 0]
+    c.executemany("UPDATE customer_points SET customer_key = ?, total_points = ? WHERE id = ?",
+                  [(key, total, row_id) for key, (row_id, total) in merged.items()])
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_customer_points_customer_key ON customer_points(customer_key)")
+
+    c.execute(f'''
+        CREATE TABLE IF NOT EXISTS points_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_key TEXT NOT NULL,
+            nopol TEXT,
+            no_telp TEXT,
+            nama_customer TEXT,
+            event_type TEXT NOT NULL CHECK (event_type IN {POINTS_EVENT_TYPES}),
+            points INTEGER NOT NULL,
+            balance_after INTEGER NOT NULL,
+            source TEXT,
+            ref_id TEXT,
+            keterangan TEXT,
+            created_at TEXT NOT NULL,
+            created_by TEXT
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_points_ledger_customer_key ON points_ledger(customer_key, id)")
+    # Satu event per sumber (mis. satu reward per kode review), termasuk saat submit bersamaan
+    c.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_points_ledger_source_ref
+        ON points_ledger(source, ref_id) WHERE ref_id IS NOT NULL
+    """)
+    ensure_indexes(conn, ['idx_customer_points_total'])
+
+    # Saldo yang sudah ada dicatat sebagai event adjust agar jumlah ledger = saldo
+    now = datetime.now(WIB).strftime('%d-%m-%Y %H:%M:%S')
+    c.execute("""
+        INSERT INTO points_ledger (customer_key, nopol, no_telp, nama_customer, event_type, points, balance_after,
+                                   source, ref_id, keterangan, created_at, created_by)
+        SELECT customer_key, nopol, no_telp, nama_customer, 'adjust', total_points, total_points,
+               'migrasi', customer_key, 'Saldo awal sebelum ledger poin', ?, 'system'
+        FROM customer_points
+        WHERE customer_key IS NOT NULL AND total_points != 0
+    """, (now,))
+
+def _record_points(c, event_type, points, nopol='', no_telp='', nama_customer='', source=None, ref_id=None,
+                   keterangan='', created_by=''):
+    """Catat event poin + perbarui saldo customer_points memakai cursor transaksi pemanggil, return saldo baru"""
+    if event_type not in POINTS_EVENT_TYPES:
+        raise ValueError(f"Jenis event poin tidak dikenal: {event_type}")
+    key = points_customer_key(nopol, no_telp)
+    if key is None:
+        raise ValueError("Customer tanpa nopol / no. telepon tidak bisa menerima poin")
+    now = datetime.now(WIB).strftime('%d-%m-%Y %H:%M:%S')
+    if points < 0:
+        # Saldo tidak boleh minus; kondisi dicek di UPDATE yang sama (atomik)
+        c.execute("""
+            UPDATE customer_points SET total_points = total_points + ?, last_updated = ?
+            WHERE customer_key = ? AND total_points + ? >= 0
+        """, (points, now, key, points))
+        if c.rowcount == 0:
+            raise ValueError("Poin customer tidak mencukupi")
+    else:
+        c.execute("""
+            INSERT INTO customer_points (customer_key, nopol, no_telp, nama_customer, total_points, last_updated)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(customer_key) DO UPDATE SET
+                total_points = total_points + excluded.total_points,
+                nama_customer = COALESCE(NULLIF(excluded.nama_customer, ''), nama_customer),
+                last_updated = excluded.last_updated
+        """, (key, nopol or '', no_telp or '', nama_customer or '', points, now))
+    c.execute("SELECT total_points FROM customer_points WHERE customer_key = ?", (key,))
+    balance = c.fetchone()[0]
+    c.execute("""
+        INSERT INTO points_ledger (customer_key, nopol, no_telp, nama_customer, event_type, points, balance_after,
+                                   source, ref_id, keterangan, created_at, created_by)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (key, nopol or '', no_telp or '', nama_customer or '', event_type, points, balance,
+          source, ref_id, keterangan, now, created_by))
+    return balance
+
+
+# --- Schema Migrations ---
+# Migrasi dijalankan berurutan, masing-masing tepat sekali per database. Versi terakhir
+# disimpan di PRAGMA user_version dan riwayatnya di tabel schema_version. Migrasi baru
+# selalu ditambahkan di akhir list dengan versi berikutnya; migrasi lama jangan diubah.
+# Setiap migrasi + kenaikan user_version berjalan dalam satu transaksi (BEGIN IMMEDIATE di
+# run_migrations, termasuk DDL); fungsi migrasi dan helper-nya tidak boleh commit sendiri.
+SCHEMA_MIGRATIONS = [
+    (1, "Skema dasar: tabel, kolom tambahan, data default", _migrate_base_schema),
+    (2, "Kolom tanggal ISO + trigger sinkronisasi", migrate_iso_dates),
+    (3, "Index sekunder", migrate_base_indexes),
+    (4, "Rollup pendapatan harian", migrate_daily_revenue),
+    (5, "Index full-text search (FTS5)", migrate_base_fts_search),
+    (6, "Index user + FTS untuk audit trail", migrate_audit_search),
+    (7, "Tabel item penjualan coffee (sale_items) + backfill dari JSON", migrate_sale_items),
+    (8, "Statistik customer (customer_stats) + trigger sinkronisasi", migrate_customer_stats),
+    (9, "Ledger poin reward (points_ledger) + customer_key", migrate_points_ledger),
+    (10, "Link sale_items ke transaksi kasir + backfill item coffee kasir", migrate_sale_items_kasir_link),
+]
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Versi skema database (PRAGMA user_version)"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn):
+    """Jalankan semua migrasi yang belum diterapkan, return list versi yang dijalankan"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
     conn.commit()
-    conn.close()
+    current = get_schema_version(conn)
+    applied = []
+    for version, description, migrate in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        # BEGIN eksplisit: tanpa ini modul sqlite3 meng-autocommit DDL (CREATE/ALTER) satu per satu
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(conn) >= version:
+                # Proses lain sudah menjalankan migrasi ini sambil kita menunggu write lock
+                conn.rollback()
+                continue
+            migrate(conn)
+            conn.execute("INSERT OR REPLACE INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                         (version, description, datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S")))
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    if applied:
+        # Setelah commit: kalau sebelum commit, sesi lain bisa memuat ulang setting lama ke cache.
+        # Migrasi juga mengisi ulang data turunan (rollup, statistik, index FTS)
+        invalidate_settings_cache()
+        invalidate_all_tables()
+    return applied
+
+
+def init_db():
+    """Pastikan skema database versi terbaru (dicek sekali per proses per database)"""
+    with _schema_lock:
+        if DB_NAME in _schema_ready:
+            return
+        with db_connection() as conn:
+            if get_schema_version(conn) < SCHEMA_VERSION:
+                run_migrations(conn)
+        _schema_ready.add(DB_NAME)
 
 
 def generate_secret_code():
@@ -504,525 +1879,438 @@ def generate_secret_code():
 
 
 # --- Data Dummy Functions ---
+@cached_query('customers')
 def check_database_empty():
     """Check apakah database kosong (perlu di-populate)"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    # Check apakah ada customers
-    c.execute("SELECT COUNT(*) FROM customers")
-    customer_count = c.fetchone()[0]
+    with db_connection() as conn:
+        c = conn.cursor()
     
-    conn.close()
+        # Check apakah ada customers
+        c.execute("SELECT COUNT(*) FROM customers")
+        customer_count = c.fetchone()[0]
     return customer_count == 0
 
 
 def reset_database():
     """Reset seluruh database (hapus semua data transaksi)"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    # Audit yang masih di antrian ikut terhapus, bukan muncul setelah reset
+    flush_audit()
+    with db_connection() as conn:
+        c = conn.cursor()
     
-    try:
-        # Hapus semua data dari tabel-tabel transaksi
-        tables = [
-            'pembayaran_kas_bon',
-            'kas_bon',
-            'customer_reviews',
-            'customer_points',
-            'kasir_transactions',
-            'coffee_sales',
-            'wash_transactions',
-            'payroll',
-            'attendance',
-            'employees',
-            'customers',
-            'audit_trail'
-        ]
-        
-        for table in tables:
-            c.execute(f"DELETE FROM {table}")
+        try:
+            # Hapus semua data dari tabel-tabel transaksi
+            tables = [
+                'pembayaran_kas_bon',
+                'kas_bon',
+                'customer_reviews',
+                'points_ledger',
+                'customer_points',
+                'customer_stats',
+                'kasir_transactions',
+                'sale_items',
+                'coffee_sales',
+                'wash_transactions',
+                'payroll',
+                'attendance',
+                'employees',
+                'customers',
+                'audit_trail'
+            ]
+        
+            for table in tables:
+                c.execute(f"DELETE FROM {table}")
         
-        conn.commit()
-        return True, "Database berhasil di-reset!"
-    except Exception as e:
-        conn.rollback()
-        return False, f"Error reset database: {str(e)}"
+            conn.commit()
+            invalidate_all_tables()
+            return True, "Database berhasil di-reset!"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error reset database: {str(e)}"
+
+
+# --- Data Retention ---
+# Data lama dipindahkan ke database arsip (<nama db>_archive.db) dengan skema yang sama.
+# Baris dipindah per batch kecil (satu transaksi per batch) sehingga write lock hanya
+# ditahan sebentar, lalu ruang kosong dikembalikan lewat incremental VACUUM.
+# Format: table -> (kondisi "sudah lama & selesai" dengan cutoff yyyy-mm-dd,
+#                   baris terkait yang ikut diarsip: [(tabel, kolom link, kolom di tabel induk), ...])
+RETENTION_TABLES = {
+    'audit_trail': ("timestamp_iso < ?", []),
+    'customer_reviews': (f"{iso_date_sql('review_date')} < ?", []),
+    # Transaksi kasir yang sudah lunas beserta transaksi cuci yang dibayarnya dan item coffee-nya
+    # (cuci tanpa transaksi kasir masih dianggap belum dibayar, jadi tidak diarsip)
+    'kasir_transactions': ("tanggal_iso < ? AND status_bayar = 'Lunas'",
+                           [('wash_transactions', 'id', 'wash_trans_id'), ('sale_items', 'kasir_transaction_id', 'id')]),
+    'coffee_sales': ("tanggal_iso < ?", [('sale_items', 'sale_id', 'id')]),
+    'kas_bon': (f"{iso_date_sql('tanggal')} < ? AND status = 'Lunas'", [('pembayaran_kas_bon', 'kas_bon_id', 'id')]),
+}
+RETENTION_BATCH_SIZE = 500
+RETENTION_BATCH_PAUSE_SECONDS = 0.05
+RETENTION_VACUUM_PAGES = 1000
+
+def get_archive_db_name():
+    """Path database arsip untuk DB_NAME aktif"""
+    return f"{os.path.splitext(DB_NAME)[0]}_archive.db"
+
+@contextmanager
+def attach_archive(conn, create=False):
+    """ATTACH database arsip sebagai schema `archive`; yield False jika arsip belum ada"""
+    path = get_archive_db_name()
+    if not create and not os.path.exists(path):
+        yield False
+        return
+    conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    try:
+        yield True
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute("DETACH DATABASE archive")
 
+def _table_columns(conn, table, schema='main'):
+    """Daftar nama kolom sebuah tabel"""
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
 
-def populate_dummy_data():
-    """Populate database dengan data dummy yang lengkap"""
-    import random
-    
-    # Data untuk generate
-    NAMA_DEPAN = [
-        "Budi", "Siti", "Ahmad", "Dewi", "Rudi", "Ani", "Agus", "Sri", "Bambang", "Lina",
-        "Hendra", "Maya", "Andi", "Rina", "Doni", "Sari", "Eko", "Wati", "Fajar", "Indah",
-        "Joko", "Nur", "Teguh", "Putri", "Wahyu", "Ayu", "Yudi", "Lestari", "Rahmat", "Kartika"
-    ]
-    
-    NAMA_BELAKANG = [
-        "Santoso", "Wijaya", "Pratama", "Kusuma", "Putra", "Putri", "Setiawan", "Wibowo",
-        "Hidayat", "Nugroho", "Permana", "Saputra", "Kurniawan", "Suryanto", "Gunawan"
-    ]
-    
-    JENIS_KENDARAAN = ["Mobil", "Motor"]
-    MERK_MOBIL = ["Toyota", "Honda", "Suzuki", "Daihatsu", "Mitsubishi", "Nissan", "Mazda", "BMW"]
-    MERK_MOTOR = ["Honda", "Yamaha", "Suzuki", "Kawasaki", "Vespa"]
-    UKURAN_MOBIL = ["Kecil", "Sedang", "Besar", "Extra Besar"]
-    
-    METODE_BAYAR = ["Tunai", "Transfer", "QRIS", "Debit"]
-    
-    REVIEW_TEXTS = [
-        "Sangat puas dengan pelayanan, mobil bersih dan wangi!",
-        "Pelayanan cepat dan hasil memuaskan.",
-        "Harga terjangkau, hasil maksimal. Recommended!",
-        "Staff ramah dan profesional.",
-        "Tempat bersih, hasil cucian bagus.",
-        "Kualitas cucian sangat baik, akan kembali lagi."
-    ]
-    
-    def generate_nopol():
-        huruf = ['B', 'D', 'L', 'F', 'N', 'T', 'S', 'H', 'K', 'R']
-        angka = random.randint(1000, 9999)
-        huruf_akhir = random.choice('ABCDEFGHIJKLMNOPQRST')
-        huruf_akhir2 = random.choice('ABCDEFGHIJKLMNOPQRST')
-        return f"{random.choice(huruf)}{angka}{huruf_akhir}{huruf_akhir2}"
-    
-    def generate_phone():
-        return f"08{random.randint(1, 9)}{random.randint(10000000, 99999999)}"
-    
-    def generate_nama():
-        return f"{random.choice(NAMA_DEPAN)} {random.choice(NAMA_BELAKANG)}"
-    
-    conn = sqlite3.connect(DB_NAME)
+def _rebuild_table(conn, table, create_sql, schema='main'):
+    """Buat ulang tabel dengan definisi baru (constraint tidak bisa di-ALTER di SQLite), salin kolom yang sama"""
     c = conn.cursor()
-    
+    old_columns = _table_columns(conn, table, schema)
+    c.execute(f"CREATE TABLE {schema}.{table}_rebuild ({create_sql.split('(', 1)[1]}")
+    columns = ', '.join(col for col in _table_columns(conn, f"{table}_rebuild", schema) if col in old_columns)
+    c.execute(f"INSERT INTO {schema}.{table}_rebuild ({columns}) SELECT {columns} FROM {schema}.{table}")
+    # Index lama ikut terhapus; pemanggil membuat ulang index yang dibutuhkan
+    c.execute(f"DROP TABLE {schema}.{table}")
+    c.execute(f"ALTER TABLE {schema}.{table}_rebuild RENAME TO {table}")
+
+def _ensure_archive_table(conn, table):
+    """Buat tabel di arsip dengan skema yang sama, tambah kolom yang belum ada, return daftar kolom"""
+    c = conn.cursor()
+    c.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    create_sql = c.fetchone()[0]
+    c.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} ({create_sql.split('(', 1)[1]}")
+    # Kolom yang di main sudah boleh NULL (mis. sale_items.sale_id) harus ikut longgar di arsip
+    nullable = {row[1] for row in conn.execute(f"PRAGMA main.table_info({table})") if not row[3]}
+    if any(row[3] and row[1] in nullable for row in conn.execute(f"PRAGMA archive.table_info({table})")):
+        _rebuild_table(conn, table, create_sql, 'archive')
+    columns = _table_columns(conn, table)
+    archived = set(_table_columns(conn, table, 'archive'))
+    for column in columns:
+        if column not in archived:
+            c.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column}")
+    return columns
+
+def _retention_candidates(conn, table, cutoff):
+    """Id baris `table` yang sudah melewati masa simpan"""
+    condition = RETENTION_TABLES[table][0]
+    c = conn.cursor()
+    c.execute(f"SELECT id FROM {table} WHERE {condition} ORDER BY id", (cutoff,))
+    return [row[0] for row in c.fetchall()]
+
+def _retention_targets(table, batch_len):
+    """(tabel, klausa WHERE) yang dipindah untuk satu batch id induk: baris terkait dulu, lalu induknya"""
+    placeholders = ', '.join('?' * batch_len)
+    targets = []
+    for link_table, link_col, parent_col in RETENTION_TABLES[table][1]:
+        targets.append((link_table, f"{link_col} IN (SELECT {parent_col} FROM main.{table} WHERE id IN ({placeholders}))"))
+    targets.append((table, f"id IN ({placeholders})"))
+    return targets
+
+def _row_bytes_sql(columns):
+    """Ekspresi perkiraan ukuran satu baris (jumlah panjang semua kolom)"""
+    return " + ".join(f"COALESCE(length(CAST({col} AS BLOB)), 0)" for col in columns)
+
+def get_retention_report(days_to_keep):
+    """Dry run: jumlah baris & perkiraan byte yang akan dipindah ke arsip per tabel"""
+    cutoff = (datetime.now(WIB).date() - timedelta(days=days_to_keep)).isoformat()
+    with db_connection() as conn:
+        rows = []
+        for table in RETENTION_TABLES:
+            ids = _retention_candidates(conn, table, cutoff)
+            totals = {}
+            for start in range(0, len(ids), RETENTION_BATCH_SIZE):
+                chunk = ids[start:start + RETENTION_BATCH_SIZE]
+                for target, where in _retention_targets(table, len(chunk)):
+                    bytes_sql = _row_bytes_sql(_table_columns(conn, target))
+                    c = conn.execute(f"SELECT COUNT(*), COALESCE(SUM({bytes_sql}), 0) FROM main.{target} WHERE {where}", chunk)
+                    batch_count, batch_bytes = c.fetchone()
+                    count, total_bytes = totals.get(target, (0, 0))
+                    totals[target] = (count + batch_count, total_bytes + batch_bytes)
+            for target, _ in _retention_targets(table, 1):
+                count, total_bytes = totals.get(target, (0, 0))
+                rows.append({'tabel': target, 'baris': count, 'bytes': total_bytes})
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        free_bytes = conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size
+        return {'cutoff': cutoff, 'tables': rows, 'free_bytes': free_bytes}
+
+def _archive_batch(conn, table, columns_by_table, ids):
+    """Pindahkan satu batch baris (beserta baris terkait) ke arsip dalam satu transaksi, return jumlah per tabel"""
+    c = conn.cursor()
+    moved = {}
+    for target, where in _retention_targets(table, len(ids)):
+        cols = ', '.join(columns_by_table[target])
+        # INSERT biasa (bukan OR IGNORE): id yang sudah ada di arsip harus menggagalkan batch,
+        # kalau tidak baris itu ikut terhapus dari main tanpa tersimpan di arsip
+        c.execute(f"INSERT INTO archive.{target} ({cols}) SELECT {cols} FROM main.{target} WHERE {where}", ids)
+        if target in DAILY_REVENUE_SOURCES:
+            # Trigger DELETE mengurangi daily_revenue; tambahkan kembali supaya rollup
+            # tetap mencakup transaksi yang diarsip (total laporan lama tidak berubah)
+            c.execute(f"""
+                {_rollup_select_sql(target, f"(SELECT * FROM main.{target} WHERE {where})")}
+                ON CONFLICT(tanggal_iso, line) DO UPDATE SET
+                    jumlah_transaksi = jumlah_transaksi + excluded.jumlah_transaksi,
+                    total = total + excluded.total,
+                    total_cuci = total_cuci + excluded.total_cuci,
+                    total_coffee = total_coffee + excluded.total_coffee,
+                    jumlah_dengan_coffee = jumlah_dengan_coffee + excluded.jumlah_dengan_coffee
+            """, ids)
+        saved_stats = []
+        if target in CUSTOMER_STATS_SOURCES:
+            # Statistik customer juga mencakup riwayat yang diarsip: simpan lalu pulihkan setelah DELETE
+            stats_cols = ', '.join(CUSTOMER_STATS_COLUMNS)
+            c.execute(f"SELECT {stats_cols} FROM customer_stats WHERE nopol IN (SELECT nopol FROM main.{target} WHERE {where})", ids)
+            saved_stats = c.fetchall()
+        c.execute(f"DELETE FROM main.{target} WHERE {where}", ids)
+        moved[target] = c.rowcount
+        if saved_stats:
+            c.executemany(f"INSERT OR REPLACE INTO customer_stats ({stats_cols}) VALUES ({', '.join('?' * len(CUSTOMER_STATS_COLUMNS))})",
+                          saved_stats)
+    conn.commit()
+    return moved
+
+def archive_old_data(days_to_keep, batch_size=RETENTION_BATCH_SIZE, progress=None):
+    """Pindahkan data lama (lebih dari `days_to_keep` hari) ke database arsip per batch"""
+    flush_audit()
+    cutoff = (datetime.now(WIB).date() - timedelta(days=days_to_keep)).isoformat()
+    moved = {}
+    with db_connection() as conn:
+        try:
+            with attach_archive(conn, create=True):
+                for table in RETENTION_TABLES:
+                    columns_by_table = {table: _ensure_archive_table(conn, table)}
+                    for linked in RETENTION_TABLES[table][1]:
+                        columns_by_table[linked[0]] = _ensure_archive_table(conn, linked[0])
+                    conn.commit()
+
+                    ids = _retention_candidates(conn, table, cutoff)
+                    for start in range(0, len(ids), batch_size):
+                        batch_moved = _archive_batch(conn, table, columns_by_table, ids[start:start + batch_size])
+                        for target, count in batch_moved.items():
+                            moved[target] = moved.get(target, 0) + count
+                        if progress:
+                            progress(table, min(start + batch_size, len(ids)), len(ids))
+                        # Beri kesempatan penulis lain mengambil write lock di antara batch
+                        time.sleep(RETENTION_BATCH_PAUSE_SECONDS)
+            total = sum(moved.values())
+            detail = ", ".join(f"{table}: {count}" for table, count in moved.items() if count)
+            return True, f"{total} baris sebelum {cutoff} dipindah ke arsip" + (f" ({detail})" if detail else "")
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            return False, (f"Arsip dibatalkan: ID data sudah ada di database arsip ({str(e)}). "
+                           f"Batch ini tidak dihapus; pindahkan/ganti file arsip dulu sebelum mengarsip lagi")
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error arsip data: {str(e)}"
+        finally:
+            invalidate_all_tables()
+
+def is_incremental_vacuum_enabled():
+    """Cek apakah database memakai auto_vacuum=INCREMENTAL"""
+    with db_connection() as conn:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+def enable_incremental_vacuum():
+    """Aktifkan auto_vacuum=INCREMENTAL untuk database lama (VACUUM penuh, database terkunci selama proses)"""
+    flush_audit()
+    with db_connection() as conn:
+        try:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            return True, "Incremental vacuum aktif"
+        except sqlite3.Error as e:
+            conn.rollback()
+            return False, f"Error VACUUM: {str(e)}"
+
+def incremental_vacuum(max_steps=None):
+    """Kembalikan halaman kosong ke sistem file bertahap (PRAGMA incremental_vacuum), return byte yang dibebaskan"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        if c.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Database lama tanpa auto_vacuum: halaman kosong dipakai ulang oleh insert berikutnya.
+            # VACUUM penuh hanya lewat enable_incremental_vacuum() (aksi maintenance terpisah)
+            return 0
+        page_size = c.execute("PRAGMA page_size").fetchone()[0]
+        before = c.execute("PRAGMA page_count").fetchone()[0]
+        steps = 0
+        while c.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+            c.execute(f"PRAGMA incremental_vacuum({RETENTION_VACUUM_PAGES})").fetchall()
+            steps += 1
+            if max_steps and steps >= max_steps:
+                break
+        c.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        after = c.execute("PRAGMA page_count").fetchone()[0]
+        return max(before - after, 0) * page_size
+
+def format_bytes(num_bytes):
+    """Format ukuran byte ke KB/MB yang mudah dibaca"""
+    for unit in ('B', 'KB', 'MB'):
+        if num_bytes < 1024:
+            return f"{num_bytes:,.0f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:,.1f} GB"
+
+
+# --- Backup ---
+# Backup memakai SQLite online backup API: halaman database disalin bertahap
+# (BACKUP_PAGES_PER_STEP per langkah) dari snapshot yang konsisten, termasuk isi file -wal.
+# Di antara langkah, lock dilepas sehingga transaksi lain tetap bisa berjalan.
+BACKUP_DIR = "backups"
+BACKUP_KEEP = 7
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP_SECONDS = 0.005
+BACKUP_PREFIX = "car_wash_backup_"
+# st.download_button selalu memuat isi file ke memori (juga untuk data callable) sebelum dikirim.
+# Backup di atas batas ini tidak ditawarkan lewat browser; ambil langsung dari folder backup di server.
+BACKUP_DOWNLOAD_MAX_BYTES = 200 * 1024 * 1024
+
+def get_backup_dir():
+    """Folder backup di samping file database aktif"""
+    return os.path.join(os.path.dirname(os.path.abspath(DB_NAME)), BACKUP_DIR)
+
+def list_backups():
+    """Daftar file backup (terbaru di depan): list dict name, path, size, created"""
+    backup_dir = get_backup_dir()
+    if not os.path.isdir(backup_dir):
+        return []
+    backups = []
+    for name in os.listdir(backup_dir):
+        if name.startswith(BACKUP_PREFIX) and (name.endswith('.db') or name.endswith('.db.gz')):
+            path = os.path.join(backup_dir, name)
+            stat = os.stat(path)
+            backups.append({'name': name, 'path': path, 'size': stat.st_size,
+                            'created': datetime.fromtimestamp(stat.st_mtime, WIB)})
+    # Nama file memuat timestamp sehingga urutan nama = urutan waktu
+    return sorted(backups, key=lambda b: b['name'], reverse=True)
+
+def rotate_backups(keep=BACKUP_KEEP):
+    """Hapus backup lama sehingga hanya `keep` backup terbaru yang disimpan, return jumlah yang dihapus"""
+    removed = 0
+    for backup in list_backups()[keep:]:
+        os.remove(backup['path'])
+        removed += 1
+    return removed
+
+def create_backup(compress=True, keep=BACKUP_KEEP, progress=None):
+    """Backup database dengan SQLite backup API (opsional gzip), lalu rotasi backup lama"""
+    flush_audit()
+    backup_dir = get_backup_dir()
+    os.makedirs(backup_dir, exist_ok=True)
+    backup_time = datetime.now(WIB).strftime("%Y%m%d_%H%M%S")
+    backup_path = os.path.join(backup_dir, f"{BACKUP_PREFIX}{backup_time}.db")
+    # Tulis ke file sementara dulu agar backup setengah jadi tidak pernah masuk daftar/rotasi
+    temp_path = backup_path + ".tmp"
+
+    def on_step(status, remaining, total):
+        if progress and total:
+            progress((total - remaining) / total)
+
     try:
-        now = datetime.now(WIB)
-        
-        # 1. Populate Customers (30 pelanggan)
-        customers = []
-        for i in range(30):
-            nopol = generate_nopol()
-            nama = generate_nama()
-            no_telp = generate_phone()
-            jenis_kendaraan = random.choice(JENIS_KENDARAAN)
-            
-            if jenis_kendaraan == "Mobil":
-                merk = random.choice(MERK_MOBIL)
-                ukuran = random.choice(UKURAN_MOBIL)
-            else:
-                merk = random.choice(MERK_MOTOR)
-                ukuran = "Kecil"
-            
-            days_ago = random.randint(1, 180)
-            created_at = now - timedelta(days=days_ago)
-            
-            try:
-                c.execute("""
-                    INSERT INTO customers (nopol, nama_customer, no_telp, jenis_kendaraan, merk_kendaraan, ukuran_mobil, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (nopol, nama, no_telp, jenis_kendaraan, merk, ukuran, format_datetime(created_at)))
-                
-                customers.append({
-                    'nopol': nopol, 'nama': nama, 'no_telp': no_telp,
-                    'jenis_kendaraan': jenis_kendaraan, 'merk': merk, 'ukuran': ukuran
-                })
-            except:
-                pass
-        
-        # 2. Populate Employees (6 karyawan)
-        roles = ["Washer", "QC Inspector", "Kasir", "Supervisor"]
-        gaji_ranges = {
-            "Washer": (3000000, 4000000),
-            "QC Inspector": (3500000, 4500000),
-            "Kasir": (3500000, 4500000),
-            "Supervisor": (5000000, 6000000)
-        }
-        shifts = ["Pagi", "Malam"]
-        shift_times = {"Pagi": ("08:00", "17:00"), "Malam": ("17:00", "08:00")}
-        
-        employees = []
-        for i in range(6):
-            nama = generate_nama()
-            role = random.choice(roles)
-            gaji_min, gaji_max = gaji_ranges[role]
-            gaji = random.randint(gaji_min // 100000, gaji_max // 100000) * 100000
-            shift = random.choice(shifts)
-            jam_masuk, jam_pulang = shift_times[shift]
-            
-            c.execute("""
-                INSERT INTO employees (nama, role_karyawan, gaji_tetap, shift, jam_masuk_default, 
-                                       jam_pulang_default, status, no_telp, created_at, created_by)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (nama, role, gaji, shift, jam_masuk, jam_pulang, "Aktif", generate_phone(), 
-                  format_datetime(now - timedelta(days=random.randint(30, 365))), "admin"))
-            
-            employees.append({'id': c.lastrowid, 'nama': nama, 'role': role, 'gaji': gaji, 'shift': shift})
-        
-        # 3. Populate Attendance (30 hari terakhir)
-        for employee in employees:
-            for day in range(30):
-                tanggal = now - timedelta(days=day)
-                rand = random.random()
-                
-                if rand < 0.90:  # 90% hadir
-                    jam_masuk = f"{random.randint(7, 9):02d}:{random.randint(0, 59):02d}"
-                    jam_pulang = f"{random.randint(16, 18):02d}:{random.randint(0, 59):02d}"
-                    status = "Hadir"
-                elif rand < 0.95:  # 5% izin
-                    jam_masuk = jam_pulang = ""
-                    status = "Izin"
-                else:  # 5% alpha
-                    jam_masuk = jam_pulang = ""
-                    status = "Alpha"
-                
-                c.execute("""
-                    INSERT INTO attendance (employee_id, tanggal, jam_masuk, jam_pulang, shift, status, catatan, created_by)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (employee['id'], format_date(tanggal), jam_masuk, jam_pulang, employee['shift'], status, "", "system"))
-        
-        # 4. Populate Wash Transactions (100 transaksi)
-        c.execute("SELECT setting_value FROM settings WHERE setting_key = 'ukuran_multiplier'")
-        result = c.fetchone()
-        ukuran_multiplier = json.loads(result[0]) if result else {"Kecil": 1.0, "Sedang": 1.2, "Besar": 1.5, "Extra Besar": 2.0}
-        
-        transactions = []
-        for i in range(100):
-            customer = random.choice(customers)
-            days_ago = random.randint(0, 60)
-            tanggal = now - timedelta(days=days_ago)
-            
-            jam_masuk = f"{random.randint(8, 20):02d}:{random.randint(0, 59):02d}"
-            waktu_selesai = f"{random.randint(10, 21):02d}:{random.randint(0, 59):02d}"
-            
-            paket = random.choice(list(PAKET_CUCIAN.keys()))
-            harga_base = PAKET_CUCIAN[paket]
-            multiplier = ukuran_multiplier.get(customer['ukuran'], 1.0)
-            harga = int(harga_base * multiplier)
-            
-            status = "Selesai" if days_ago > 0 or random.random() > 0.05 else "Dalam Proses"
-            
-            c.execute("""
-                INSERT INTO wash_transactions (nopol, nama_customer, tanggal, waktu_masuk, waktu_selesai,
-                                              paket_cuci, harga, jenis_kendaraan, merk_kendaraan, ukuran_mobil,
-                                              checklist_datang, checklist_selesai, qc_barang, catatan, status, created_by)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (customer['nopol'], customer['nama'], format_date(tanggal), jam_masuk, waktu_selesai,
-                  paket, harga, customer['jenis_kendaraan'], customer['merk'], customer['ukuran'],
-                  json.dumps(DEFAULT_CHECKLIST_DATANG), json.dumps(DEFAULT_CHECKLIST_SELESAI),
-                  "OK", "", status, "admin"))
-            
-            if status == "Selesai":
-                transactions.append({
-                    'id': c.lastrowid, 'nopol': customer['nopol'], 'nama': customer['nama'],
-                    'no_telp': customer['no_telp'], 'tanggal': tanggal, 'paket': paket, 'harga': harga
-                })
-        
-        # 5. Populate Kasir Transactions & Reviews
-        for trans in transactions:
-            # Generate coffee items (30% chance)
-            has_coffee = random.random() < 0.3
-            coffee_items = []
-            harga_coffee = 0
-            
-            if has_coffee:
-                for _ in range(random.randint(1, 2)):
-                    item_name = random.choice(list(DEFAULT_COFFEE_MENU.keys()))
-                    price = DEFAULT_COFFEE_MENU[item_name]
-                    qty = random.randint(1, 2)
-                    coffee_items.append({'nama': item_name, 'harga': price, 'qty': qty, 'subtotal': price * qty})
-                    harga_coffee += price * qty
-            
-            total_bayar = trans['harga'] + harga_coffee
-            secret_code = generate_secret_code()
-            
-            c.execute("""
-                INSERT INTO kasir_transactions (nopol, nama_customer, no_telp, tanggal, waktu,
-                                               wash_trans_id, paket_cuci, harga_cuci, coffee_items, harga_coffee, 
-                                               total_bayar, status_bayar, metode_bayar, secret_code, created_by, catatan)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (trans['nopol'], trans['nama'], trans['no_telp'], format_date(trans['tanggal']), "12:00",
-                  trans['id'], trans['paket'], trans['harga'], json.dumps(coffee_items) if coffee_items else None,
-                  harga_coffee, total_bayar, "Lunas", random.choice(METODE_BAYAR), secret_code, "kasir", ""))
-            
-            kasir_id = c.lastrowid
-            
-            # Add review (50% chance)
-            if random.random() < 0.5:
-                rating = random.choices([3, 4, 5], weights=[10, 40, 50])[0]
-                reward_points = rating * 10
-                review_date = trans['tanggal'] + timedelta(days=random.randint(0, 2))
-                
-                c.execute("""
-                    INSERT INTO customer_reviews (secret_code, trans_id, trans_type, nopol, no_telp,
-                                                 nama_customer, rating, review_text, review_date, review_time, reward_points)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (secret_code, kasir_id, "kasir", trans['nopol'], trans['no_telp'], trans['nama'],
-                      rating, random.choice(REVIEW_TEXTS), format_date(review_date), "14:00", reward_points))
-                
-                # Update customer points
-                c.execute("""
-                    INSERT INTO customer_points (nopol, no_telp, nama_customer, total_points, last_updated)
-                    VALUES (?, ?, ?, ?, ?)
-                    ON CONFLICT(nopol, no_telp) DO UPDATE SET 
-                        total_points = total_points + ?,
-                        last_updated = ?
-                """, (trans['nopol'], trans['no_telp'], trans['nama'], reward_points, format_datetime(now),
-                      reward_points, format_datetime(now)))
-        
-        # 6. Populate Coffee Sales (50 transaksi standalone)
-        for i in range(50):
-            days_ago = random.randint(0, 60)
-            tanggal = now - timedelta(days=days_ago)
-            waktu = f"{random.randint(8, 20):02d}:{random.randint(0, 59):02d}"
-            
-            items = []
-            total = 0
-            for _ in range(random.randint(1, 3)):
-                item_name = random.choice(list(DEFAULT_COFFEE_MENU.keys()))
-                price = DEFAULT_COFFEE_MENU[item_name]
-                qty = random.randint(1, 2)
-                items.append({'nama': item_name, 'harga': price, 'qty': qty, 'subtotal': price * qty})
-                total += price * qty
-            
-            c.execute("""
-                INSERT INTO coffee_sales (items, total, tanggal, waktu, nama_customer, no_telp, created_by)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (json.dumps(items), total, format_date(tanggal), waktu, None, None, "kasir"))
-        
-        # 7. Populate Payroll (3 bulan terakhir dengan data lengkap)
-        # Load shift settings untuk persentase
-        c.execute("SELECT shift_name, persentase_gaji FROM shift_settings")
-        shift_percentages = dict(c.fetchall())
-        
-        payroll_records = []
-        for month_offset in range(3):
-            # Tentukan periode (mingguan, 4 minggu per bulan = 12 payroll per karyawan)
-            for week in range(4):
-                # Periode 7 hari
-                week_start = now - timedelta(days=(month_offset * 30 + week * 7))
-                week_end = week_start + timedelta(days=6)
-                
-                for employee in employees:
-                    # Hitung hari kerja dari attendance dalam periode ini
-                    # Simulasi: 5-6 hari kerja per minggu (weekend kadang masuk)
-                    hari_kerja = random.randint(5, 6)
-                    
-                    # Hitung gaji berdasarkan role
-                    if employee['role'] in ['Kasir', 'Supervisor']:
-                        # Gaji tetap per minggu
-                        total_gaji = employee['gaji']
-                    else:
-                        # Worker - simulasi berdasarkan pendapatan
-                        # Asumsi pendapatan per hari: 500k - 1.5jt
-                        daily_revenue = random.randint(500000, 1500000)
-                        shift_pct = shift_percentages.get(employee['shift'], 35.0) / 100
-                        total_gaji = int(daily_revenue * shift_pct * hari_kerja)
-                    
-                    # Bonus random (0-200k)
-                    bonus = random.randint(0, 4) * 50000
-                    
-                    # Potongan random (0-100k)
-                    potongan = random.randint(0, 2) * 50000
-                    
-                    gaji_bersih = total_gaji + bonus - potongan
-                    
-                    # Status: Lunas untuk minggu lalu, Pending untuk minggu ini
-                    if month_offset == 0 and week == 0:
-                        status = "Pending"
-                        tanggal_bayar = None
-                    else:
-                        status = "Lunas"
-                        # Tanggal bayar: 2 hari setelah periode berakhir
-                        tanggal_bayar = week_end + timedelta(days=2)
-                    
-                    c.execute("""
-                        INSERT INTO payroll (employee_id, periode_awal, periode_akhir, total_hari_kerja,
-                                            total_gaji, bonus, potongan, gaji_bersih, status, 
-                                            tanggal_bayar, catatan, created_at, created_by)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (employee['id'], format_date(week_start), format_date(week_end), 
-                          hari_kerja, total_gaji, bonus, potongan, gaji_bersih, status,
-                          format_date(tanggal_bayar) if tanggal_bayar else None,
-                          f"Periode {format_date(week_start)} - {format_date(week_end)}",
-                          format_datetime(now), "admin"))
-                    
-                    payroll_records.append({
-                        'employee_id': employee['id'],
-                        'payroll_id': c.lastrowid,
-                        'tanggal_bayar': tanggal_bayar
-                    })
-        
-        # 8. Populate Kas Bon (detail dengan multiple pembayaran)
-        kas_bon_records = []
-        keterangan_kasbon = [
-            "Keperluan mendesak keluarga",
-            "Biaya pengobatan",
-            "Keperluan sekolah anak",
-            "Renovasi rumah",
-            "Bayar hutang lain",
-            "Modal usaha sampingan",
-            "Keperluan hajatan"
-        ]
-        
-        for employee in employees:
-            # 50% chance karyawan punya kas bon
-            num_kasbon = random.choices([0, 1, 2], weights=[50, 40, 10])[0]
-            
-            for kb_idx in range(num_kasbon):
-                # Tanggal pinjam: 30-90 hari yang lalu
-                days_ago_kasbon = random.randint(30, 90)
-                tanggal_kasbon = now - timedelta(days=days_ago_kasbon)
-                
-                # Jumlah pinjaman: 200k - 1jt
-                jumlah_kasbon = random.randint(4, 20) * 50000
-                
-                keterangan = random.choice(keterangan_kasbon)
-                
-                c.execute("""
-                    INSERT INTO kas_bon (employee_id, tanggal, jumlah, keterangan, status, sisa_hutang, created_at, created_by)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (employee['id'], format_date(tanggal_kasbon), jumlah_kasbon, 
-                      keterangan, "Belum Lunas", jumlah_kasbon, format_datetime(tanggal_kasbon), "admin"))
-                
-                kas_bon_id = c.lastrowid
-                kas_bon_records.append({
-                    'id': kas_bon_id,
-                    'employee_id': employee['id'],
-                    'jumlah': jumlah_kasbon,
-                    'tanggal_kasbon': tanggal_kasbon,
-                    'sisa_hutang': jumlah_kasbon
-                })
-                
-                # Simulate pembayaran cicilan (2-5 cicilan)
-                num_cicilan = random.randint(2, 5)
-                sisa_hutang_current = jumlah_kasbon
-                
-                for cicilan_idx in range(num_cicilan):
-                    if sisa_hutang_current <= 0:
-                        break
-                    
-                    # Jumlah bayar: 20-50% dari sisa hutang
-                    if cicilan_idx == num_cicilan - 1:
-                        # Cicilan terakhir: bayar sisa
-                        jumlah_bayar = sisa_hutang_current
-                    else:
-                        max_bayar = int(sisa_hutang_current * 0.5)
-                        min_bayar = min(50000, sisa_hutang_current)
-                        jumlah_bayar = random.randint(min_bayar, max(min_bayar, max_bayar))
-                        jumlah_bayar = (jumlah_bayar // 10000) * 10000  # Round to 10k
-                    
-                    # Tanggal bayar: 1-2 minggu setelah kas bon / cicilan sebelumnya
-                    days_after = random.randint(7, 14) * (cicilan_idx + 1)
-                    tanggal_bayar_kasbon = tanggal_kasbon + timedelta(days=days_after)
-                    
-                    # Hanya tambahkan pembayaran jika belum melewati hari ini
-                    if tanggal_bayar_kasbon <= now.date():
-                        metode_bayar = random.choices(
-                            ["Potong Gaji", "Tunai", "Transfer"],
-                            weights=[70, 20, 10]
-                        )[0]
-                        
-                        # Link ke payroll jika metode potong gaji
-                        payroll_id_link = None
-                        if metode_bayar == "Potong Gaji":
-                            # Cari payroll yang tanggal bayarnya dekat dengan tanggal bayar kas bon
-                            matching_payroll = [
-                                pr for pr in payroll_records 
-                                if pr['employee_id'] == employee['id'] 
-                                and pr['tanggal_bayar'] 
-                                and abs((pr['tanggal_bayar'].date() if hasattr(pr['tanggal_bayar'], 'date') else pr['tanggal_bayar']) - tanggal_bayar_kasbon).days <= 3
-                            ]
-                            if matching_payroll:
-                                payroll_id_link = matching_payroll[0]['payroll_id']
-                        
-                        c.execute("""
-                            INSERT INTO pembayaran_kas_bon (kas_bon_id, payroll_id, tanggal_bayar, jumlah_bayar, metode, keterangan, created_at, created_by)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                        """, (kas_bon_id, payroll_id_link, format_date(tanggal_bayar_kasbon), jumlah_bayar, 
-                              metode_bayar, f"Cicilan ke-{cicilan_idx + 1}", format_datetime(tanggal_bayar_kasbon), "admin"))
-                        
-                        sisa_hutang_current -= jumlah_bayar
-                        
-                        # Update sisa hutang di kas_bon
-                        c.execute("""
-                            UPDATE kas_bon SET sisa_hutang = ? WHERE id = ?
-                        """, (sisa_hutang_current, kas_bon_id))
-                        
-                        # Update status jika lunas
-                        if sisa_hutang_current <= 0:
-                            c.execute("""
-                                UPDATE kas_bon SET status = 'Lunas' WHERE id = ?
-                            """, (kas_bon_id,))
-                            break
-        
-        # 9. Add Audit Trail
-        c.execute("""
-            INSERT INTO audit_trail (timestamp, user, action, detail)
-            VALUES (?, ?, ?, ?)
-        """, (format_datetime(now), "admin", "Populate Data", "Data dummy berhasil di-generate"))
-        
-        conn.commit()
-        
-        # Count all records
-        c.execute("SELECT COUNT(*) FROM kas_bon")
-        kasbon_count = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) FROM kas_bon WHERE status = 'Lunas'")
-        kasbon_lunas = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) FROM payroll")
-        payroll_count = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) FROM pembayaran_kas_bon")
-        pembayaran_count = c.fetchone()[0]
-        
-        return True, f"""✅ Data dummy berhasil dibuat!
-📊 Summary:
-- {len(customers)} pelanggan
-- {len(employees)} karyawan
-- {len(transactions)} transaksi cuci
-- {payroll_count} slip gaji ({len(employees)} karyawan x 12 periode)
-- {kasbon_count} kas bon ({kasbon_lunas} lunas, {kasbon_count - kasbon_lunas} belum lunas)
-- {pembayaran_count} pembayaran kas bon"""
-        
+        source = sqlite3.connect(DB_NAME, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+        target = sqlite3.connect(temp_path)
+        try:
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP, progress=on_step,
+                          sleep=BACKUP_STEP_SLEEP_SECONDS)
+        finally:
+            target.close()
+            source.close()
+
+        if compress:
+            with open(temp_path, 'rb') as f_in, gzip.open(temp_path + ".gz", 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.remove(temp_path)
+            temp_path += ".gz"
+            backup_path += ".gz"
+        os.replace(temp_path, backup_path)
+        rotate_backups(keep)
+        return True, backup_path
     except Exception as e:
-        conn.rollback()
-        return False, f"Error populate data: {str(e)}"
-    finally:
-        conn.close()
+        for path in (temp_path, temp_path + ".gz"):
+            if os.path.exists(path):
+                os.remove(path)
+        return False, f"Error backup database: {str(e)}"
+
+def read_backup_file(path):
+    """Baca isi file backup untuk download (dipanggil saat tombol download diklik, bukan setiap rerun)"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def rebuild_derived_data(conn):
+    """Bangun ulang data turunan setelah bulk load tanpa trigger: index FTS, rollup pendapatan, statistik customer & planner"""
+    migrate_fts_search(conn)
+    _rebuild_daily_revenue(conn)
+    _rebuild_customer_stats(conn)
+    conn.execute("PRAGMA optimize")
+
+
+def populate_dummy_data(scale=1.0, seed=None):
+    """Populate database dengan data dummy lengkap (generator di populate_dummy_data.py)"""
+    from populate_dummy_data import generate_dataset
+
+    with db_connection() as conn:
+        try:
+            counts = generate_dataset(conn, scale=scale, seed=seed, rebuild_derived=rebuild_derived_data)
+            invalidate_all_tables()
+
+            c = conn.cursor()
+            c.execute("SELECT COUNT(*) FROM kas_bon WHERE status = 'Lunas'")
+            kasbon_lunas = c.fetchone()[0]
+
+            return True, f"""✅ Data dummy berhasil dibuat!
+📊 Summary:
+- {counts['customers']} pelanggan
+- {counts['employees']} karyawan
+- {counts['wash_transactions']} transaksi cuci
+- {counts['kasir_transactions']} transaksi kasir, {counts['coffee_sales']} penjualan coffee
+- {counts['customer_reviews']} review pelanggan
+- {counts['payroll']} slip gaji
+- {counts['kas_bon']} kas bon ({kasbon_lunas} lunas, {counts['kas_bon'] - kasbon_lunas} belum lunas)
+- {counts['pembayaran_kas_bon']} pembayaran kas bon"""
+
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error populate data: {str(e)}"
 
 
 # --- Simpan & Load Customer ---
 def save_customer(nopol, nama, telp, jenis_kendaraan='', merk_kendaraan='', ukuran_mobil=''):
     """Simpan data customer baru"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    now_wib = datetime.now(WIB)
-    try:
-        c.execute("""
-            INSERT INTO customers (nopol, nama_customer, no_telp, jenis_kendaraan, merk_kendaraan, ukuran_mobil, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (nopol.upper(), nama, telp, jenis_kendaraan, merk_kendaraan, ukuran_mobil, now_wib.strftime("%d-%m-%Y %H:%M:%S")))
-        conn.commit()
-        return True, "Customer berhasil ditambahkan"
-    except sqlite3.IntegrityError:
-        return False, "Nopol sudah terdaftar"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
-
+    with db_connection() as conn:
+        c = conn.cursor()
+        now_wib = datetime.now(WIB)
+        try:
+            c.execute("""
+                INSERT INTO customers (nopol, nama_customer, no_telp, jenis_kendaraan, merk_kendaraan, ukuran_mobil, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (nopol.upper(), nama, telp, jenis_kendaraan, merk_kendaraan, ukuran_mobil, now_wib.strftime("%d-%m-%Y %H:%M:%S")))
+            conn.commit()
+            invalidate_tables('customers')
+            return True, "Customer berhasil ditambahkan"
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return False, "Nopol sudah terdaftar"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
+
+@cached_query('customers')
 def get_customer_by_nopol(nopol):
     """Ambil data customer berdasarkan nopol"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT * FROM customers WHERE nopol = ?", (nopol.upper(),))
-    result = c.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM customers WHERE nopol = ?", (nopol.upper(),))
+        result = c.fetchone()
     if result:
         return {
             'id': result[0],
@@ -1036,145 +2324,202 @@ def get_customer_by_nopol(nopol):
         }
     return None
 
+@cached_query('customers')
 def get_all_customers():
     """Ambil semua data customer"""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql("SELECT * FROM customers ORDER BY created_at DESC", conn)
-    conn.close()
+    with db_connection() as conn:
+        df = pd.read_sql("SELECT * FROM customers ORDER BY created_at DESC", conn)
     return df
 
+@cached_query('customers')
+def get_customer_count():
+    """Hitung jumlah customer terdaftar langsung di SQL"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM customers")
+        count = c.fetchone()[0]
+    return count
+
+# Jumlah nopol per query IN (...) agar tetap di bawah batas parameter SQLite
+CUSTOMER_STATS_CHUNK_SIZE = 500
+# Kolom statistik customer (alias s = customer_stats), termasuk total belanja & rata-rata per kunjungan
+CUSTOMER_STATS_SELECT = """s.visits, s.first_visit, s.last_visit, s.total_wash, s.total_coffee,
+    (s.total_wash + s.total_coffee) AS total_spend, ((s.total_wash + s.total_coffee) / s.visits) AS avg_ticket"""
+
+@cached_query('customer_stats')
+def get_customer_stats_map(nopols):
+    """Statistik banyak nopol sekaligus: dict nopol -> dict statistik (nopol tanpa kunjungan tidak ada)"""
+    nopols = list(nopols)
+    stats = {}
+    with db_connection() as conn:
+        c = conn.cursor()
+        for start in range(0, len(nopols), CUSTOMER_STATS_CHUNK_SIZE):
+            chunk = nopols[start:start + CUSTOMER_STATS_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            c.execute(f"SELECT s.nopol, {CUSTOMER_STATS_SELECT} FROM customer_stats s WHERE s.nopol IN ({placeholders})", chunk)
+            columns = [column[0] for column in c.description]
+            for row in c.fetchall():
+                item = dict(zip(columns, row))
+                stats[item['nopol']] = item
+    return stats
+
 # --- Simpan & Load Transaksi ---
 def save_transaction(data):
     """Simpan transaksi cuci mobil"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        c.execute("""
-            INSERT INTO wash_transactions 
-            (nopol, nama_customer, tanggal, waktu_masuk, waktu_selesai, paket_cuci, harga, 
-             jenis_kendaraan, merk_kendaraan, ukuran_mobil,
-             checklist_datang, checklist_selesai, qc_barang, catatan, status, created_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data['nopol'].upper(),
-            data['nama_customer'],
-            data['tanggal'],
-            data['waktu_masuk'],
-            data.get('waktu_selesai', ''),
-            data['paket_cuci'],
-            data['harga'],
-            data.get('jenis_kendaraan', ''),
-            data.get('merk_kendaraan', ''),
-            data.get('ukuran_mobil', ''),
-            data.get('checklist_datang', ''),
-            data.get('checklist_selesai', ''),
-            data.get('qc_barang', ''),
-            data.get('catatan', ''),
-            data.get('status', 'Dalam Proses'),
-            data.get('created_by', '')
-        ))
-        conn.commit()
-        return True, "Transaksi berhasil disimpan"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("""
+                INSERT INTO wash_transactions 
+                (nopol, nama_customer, tanggal, waktu_masuk, waktu_selesai, paket_cuci, harga, 
+                 jenis_kendaraan, merk_kendaraan, ukuran_mobil,
+                 checklist_datang, checklist_selesai, qc_barang, catatan, status, created_by)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                data['nopol'].upper(),
+                data['nama_customer'],
+                data['tanggal'],
+                data['waktu_masuk'],
+                data.get('waktu_selesai', ''),
+                data['paket_cuci'],
+                data['harga'],
+                data.get('jenis_kendaraan', ''),
+                data.get('merk_kendaraan', ''),
+                data.get('ukuran_mobil', ''),
+                data.get('checklist_datang', ''),
+                data.get('checklist_selesai', ''),
+                data.get('qc_barang', ''),
+                data.get('catatan', ''),
+                data.get('status', 'Dalam Proses'),
+                data.get('created_by', '')
+            ))
+            conn.commit()
+            invalidate_tables('wash_transactions')
+            return True, "Transaksi berhasil disimpan"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
 
 def update_transaction_finish(trans_id, waktu_selesai, checklist_selesai, qc_barang, catatan):
     """Update transaksi saat selesai cuci"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        # Pastikan trans_id adalah integer
-        trans_id = int(trans_id)
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            # Pastikan trans_id adalah integer
+            trans_id = int(trans_id)
         
-        # Cek status dulu dengan logging
-        c.execute("SELECT id, status, nopol FROM wash_transactions WHERE id = ?", (trans_id,))
-        result = c.fetchone()
+            # Cek status dulu dengan logging
+            c.execute("SELECT id, status, nopol FROM wash_transactions WHERE id = ?", (trans_id,))
+            result = c.fetchone()
         
-        if not result:
-            # Debug: cek semua ID yang ada
-            c.execute("SELECT id, nopol, status FROM wash_transactions")
-            all_trans = c.fetchall()
-            print(f"DEBUG: Mencari ID {trans_id} (tipe: {type(trans_id)})")
-            print(f"DEBUG: IDs yang ada di database: {[row[0] for row in all_trans]}")
-            return False, f"Transaksi ID {trans_id} tidak ditemukan di database"
+            if not result:
+                # Debug: cek semua ID yang ada
+                c.execute("SELECT id, nopol, status FROM wash_transactions")
+                all_trans = c.fetchall()
+                print(f"DEBUG: Mencari ID {trans_id} (tipe: {type(trans_id)})")
+                print(f"DEBUG: IDs yang ada di database: {[row[0] for row in all_trans]}")
+                return False, f"Transaksi ID {trans_id} tidak ditemukan di database"
         
-        current_status = result[1].strip()
-        print(f"DEBUG: Transaksi ditemukan - ID: {result[0]}, Status: '{current_status}', Nopol: {result[2]}")
+            current_status = result[1].strip()
+            print(f"DEBUG: Transaksi ditemukan - ID: {result[0]}, Status: '{current_status}', Nopol: {result[2]}")
         
-        if current_status != 'Dalam Proses':
-            return False, f"Transaksi berstatus '{current_status}', tidak bisa diselesaikan"
+            if current_status != 'Dalam Proses':
+                return False, f"Transaksi berstatus '{current_status}', tidak bisa diselesaikan"
         
-        # Update status menjadi 'Selesai'
-        c.execute("""
-            UPDATE wash_transactions 
-            SET waktu_selesai = ?, checklist_selesai = ?, qc_barang = ?, 
-                catatan = ?, status = 'Selesai'
-            WHERE id = ?
-        """, (waktu_selesai, checklist_selesai, qc_barang, catatan, trans_id))
+            # Update status menjadi 'Selesai'
+            c.execute("""
+                UPDATE wash_transactions 
+                SET waktu_selesai = ?, checklist_selesai = ?, qc_barang = ?, 
+                    catatan = ?, status = 'Selesai'
+                WHERE id = ?
+            """, (waktu_selesai, checklist_selesai, qc_barang, catatan, trans_id))
         
-        conn.commit()
-        print(f"DEBUG: Update berhasil untuk ID {trans_id}")
-        return True, "Transaksi berhasil diselesaikan"
+            conn.commit()
+            invalidate_tables('wash_transactions')
+            print(f"DEBUG: Update berhasil untuk ID {trans_id}")
+            return True, "Transaksi berhasil diselesaikan"
         
-    except Exception as e:
-        print(f"DEBUG ERROR: {str(e)}")
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
+        except Exception as e:
+            conn.rollback()
+            print(f"DEBUG ERROR: {str(e)}")
+            return False, f"Error: {str(e)}"
 
+@cached_query('wash_transactions')
 def get_all_transactions():
     """Ambil semua transaksi"""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql("SELECT * FROM wash_transactions ORDER BY tanggal DESC, waktu_masuk DESC", conn)
-    conn.close()
+    with db_connection() as conn:
+        df = pd.read_sql("SELECT * FROM wash_transactions ORDER BY tanggal_iso DESC, waktu_masuk DESC", conn)
     return df
 
-def get_transactions_by_date_range(start_date, end_date):
-    """Ambil transaksi dalam rentang tanggal"""
-    conn = sqlite3.connect(DB_NAME)
-    query = """
-        SELECT * FROM wash_transactions 
-        WHERE tanggal BETWEEN ? AND ?
-        ORDER BY tanggal DESC, waktu_masuk DESC
-    """
-    df = pd.read_sql(query, conn, params=(start_date, end_date))
-    conn.close()
+def load_by_date_range(table, start_date, end_date, columns=None, order_by=None):
+    """Load baris tabel transaksi dalam rentang tanggal (filter + proyeksi kolom dilakukan di SQL)"""
+    select_cols = ', '.join(columns) if columns else '*'
+    query = f"SELECT {select_cols} FROM {table} WHERE tanggal_iso BETWEEN ? AND ?"
+    if order_by:
+        query += f" ORDER BY {order_by}"
+    with db_connection() as conn:
+        df = pd.read_sql(query, conn, params=(to_iso_date(start_date), to_iso_date(end_date)))
     return df
 
+@cached_query('wash_transactions')
+def get_transactions_by_date_range(start_date, end_date, columns=None):
+    """Ambil transaksi dalam rentang tanggal"""
+    return load_by_date_range('wash_transactions', start_date, end_date, columns,
+                              order_by='tanggal_iso DESC, waktu_masuk DESC')
+
 # --- Settings Functions ---
-def get_setting(key):
-    """Ambil setting berdasarkan key"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT setting_value FROM settings WHERE setting_key = ?", (key,))
-    result = c.fetchone()
-    conn.close()
-    if result:
+# Cache semua setting di memory (sudah di-json.loads). Cache dimuat ulang sekali
+# setiap kali generation berubah (di-bump oleh update_setting) atau DB_NAME berganti.
+_settings_state = _shared_state['settings']
+_settings_lock = _shared_state['settings_lock']
+
+def invalidate_settings_cache():
+    """Tandai cache setting kadaluarsa; pembacaan berikutnya memuat ulang dari database"""
+    with _settings_lock:
+        _settings_state['generation'] += 1
+
+def _load_settings():
+    """Baca semua setting dari database dan parse JSON-nya sekali"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT setting_key, setting_value FROM settings")
+        rows = c.fetchall()
+    settings = {}
+    for key, value in rows:
         try:
-            return json.loads(result[0])
+            settings[key] = json.loads(value)
         except:
-            return result[0]
-    return None
+            settings[key] = value
+    return settings
+
+def get_setting(key):
+    """Ambil setting berdasarkan key"""
+    with _settings_lock:
+        cache_key = (DB_NAME, _settings_state['generation'])
+        if _settings_state['key'] != cache_key:
+            _settings_state['values'] = _load_settings()
+            _settings_state['key'] = cache_key
+        value = _settings_state['values'].get(key)
+    # Copy agar caller yang memodifikasi dict/list tidak mengubah isi cache
+    return copy.deepcopy(value)
 
 def update_setting(key, value):
     """Update setting"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    now = datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S")
-    try:
-        value_str = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
-        c.execute("""
-            INSERT OR REPLACE INTO settings (setting_key, setting_value, updated_at)
-            VALUES (?, ?, ?)
-        """, (key, value_str, now))
-        conn.commit()
-        return True, "Setting berhasil diupdate"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        now = datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S")
+        try:
+            value_str = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+            c.execute("""
+                INSERT OR REPLACE INTO settings (setting_key, setting_value, updated_at)
+                VALUES (?, ?, ?)
+            """, (key, value_str, now))
+            conn.commit()
+            invalidate_settings_cache()
+            return True, "Setting berhasil diupdate"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
 
 def get_paket_cucian():
     """Ambil daftar paket cucian dari database"""
@@ -1221,211 +2566,214 @@ def get_ukuran_multiplier():
 
 # ========== PAYROLL FUNCTIONS ==========
 
+@cached_query('employees')
 def get_all_employees():
     """Get all employees"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM employees ORDER BY id DESC")
-    employees = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM employees ORDER BY id DESC")
+        employees = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
     return employees
 
 def add_employee(nama, role_karyawan, gaji_tetap, shift, jam_masuk_default, jam_pulang_default, no_telp, created_by):
     """Add new employee"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    now = datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S")
-    c.execute("""
-        INSERT INTO employees (nama, role_karyawan, gaji_tetap, shift, jam_masuk_default, jam_pulang_default, status, no_telp, created_at, created_by)
-        VALUES (?, ?, ?, ?, ?, ?, 'Aktif', ?, ?, ?)
-    """, (nama, role_karyawan, gaji_tetap, shift, jam_masuk_default, jam_pulang_default, no_telp, now, created_by))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        now = datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S")
+        c.execute("""
+            INSERT INTO employees (nama, role_karyawan, gaji_tetap, shift, jam_masuk_default, jam_pulang_default, status, no_telp, created_at, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, 'Aktif', ?, ?, ?)
+        """, (nama, role_karyawan, gaji_tetap, shift, jam_masuk_default, jam_pulang_default, no_telp, now, created_by))
+        conn.commit()
+        invalidate_tables('employees')
 
 def update_employee(emp_id, nama, role_karyawan, gaji_tetap, shift, jam_masuk_default, jam_pulang_default, no_telp, status):
     """Update employee data"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    c.execute("""
-        UPDATE employees 
-        SET nama=?, role_karyawan=?, gaji_tetap=?, shift=?, jam_masuk_default=?, jam_pulang_default=?, no_telp=?, status=?
-        WHERE id=?
-    """, (nama, role_karyawan, gaji_tetap, shift, jam_masuk_default, jam_pulang_default, no_telp, status, emp_id))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            UPDATE employees 
+            SET nama=?, role_karyawan=?, gaji_tetap=?, shift=?, jam_masuk_default=?, jam_pulang_default=?, no_telp=?, status=?
+            WHERE id=?
+        """, (nama, role_karyawan, gaji_tetap, shift, jam_masuk_default, jam_pulang_default, no_telp, status, emp_id))
+        conn.commit()
+        invalidate_tables('employees')
 
 def delete_employee(emp_id):
     """Delete employee"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    c.execute("DELETE FROM employees WHERE id=?", (emp_id,))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM employees WHERE id=?", (emp_id,))
+        conn.commit()
+        invalidate_tables('employees')
 
 def update_customer(nopol, nama, telp, jenis_kendaraan='', merk_kendaraan='', ukuran_mobil=''):
     """Update customer data"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        c.execute("""
-            UPDATE customers 
-            SET nama_customer=?, no_telp=?, jenis_kendaraan=?, merk_kendaraan=?, ukuran_mobil=?
-            WHERE nopol=?
-        """, (nama, telp, jenis_kendaraan, merk_kendaraan, ukuran_mobil, nopol.upper()))
-        conn.commit()
-        return True, "Customer berhasil diupdate"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("""
+                UPDATE customers 
+                SET nama_customer=?, no_telp=?, jenis_kendaraan=?, merk_kendaraan=?, ukuran_mobil=?
+                WHERE nopol=?
+            """, (nama, telp, jenis_kendaraan, merk_kendaraan, ukuran_mobil, nopol.upper()))
+            conn.commit()
+            invalidate_tables('customers')
+            return True, "Customer berhasil diupdate"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
 
 def delete_customer(nopol):
     """Delete customer"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        # Check if customer has transactions
-        c.execute("SELECT COUNT(*) FROM wash_transactions WHERE nopol=?", (nopol.upper(),))
-        trans_count = c.fetchone()[0]
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            # Check if customer has transactions
+            c.execute("SELECT COUNT(*) FROM wash_transactions WHERE nopol=?", (nopol.upper(),))
+            trans_count = c.fetchone()[0]
         
-        if trans_count > 0:
-            return False, f"Tidak dapat menghapus customer. Ada {trans_count} transaksi terkait."
+            if trans_count > 0:
+                return False, f"Tidak dapat menghapus customer. Ada {trans_count} transaksi terkait."
         
-        c.execute("DELETE FROM customers WHERE nopol=?", (nopol.upper(),))
-        conn.commit()
-        return True, "Customer berhasil dihapus"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
+            c.execute("DELETE FROM customers WHERE nopol=?", (nopol.upper(),))
+            conn.commit()
+            invalidate_tables('customers')
+            return True, "Customer berhasil dihapus"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
 
 def delete_wash_transaction(trans_id):
     """Delete wash transaction"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        # Check if already in kasir
-        c.execute("SELECT COUNT(*) FROM kasir_transactions WHERE wash_trans_id=?", (trans_id,))
-        kasir_count = c.fetchone()[0]
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            # Check if already in kasir
+            c.execute("SELECT COUNT(*) FROM kasir_transactions WHERE wash_trans_id=?", (trans_id,))
+            kasir_count = c.fetchone()[0]
         
-        if kasir_count > 0:
-            return False, "Tidak dapat menghapus transaksi yang sudah masuk kasir."
+            if kasir_count > 0:
+                return False, "Tidak dapat menghapus transaksi yang sudah masuk kasir."
         
-        c.execute("DELETE FROM wash_transactions WHERE id=?", (trans_id,))
-        conn.commit()
-        return True, "Transaksi berhasil dihapus"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
+            c.execute("DELETE FROM wash_transactions WHERE id=?", (trans_id,))
+            conn.commit()
+            invalidate_tables('wash_transactions')
+            return True, "Transaksi berhasil dihapus"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
 
 def update_wash_transaction(trans_id, paket_cuci, harga, catatan):
     """Update wash transaction"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        c.execute("""
-            UPDATE wash_transactions 
-            SET paket_cuci=?, harga=?, catatan=?
-            WHERE id=?
-        """, (paket_cuci, harga, catatan, trans_id))
-        conn.commit()
-        return True, "Transaksi berhasil diupdate"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("""
+                UPDATE wash_transactions 
+                SET paket_cuci=?, harga=?, catatan=?
+                WHERE id=?
+            """, (paket_cuci, harga, catatan, trans_id))
+            conn.commit()
+            invalidate_tables('wash_transactions')
+            return True, "Transaksi berhasil diupdate"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
 
 def delete_kasir_transaction(trans_id):
     """Delete kasir transaction"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        c.execute("DELETE FROM kasir_transactions WHERE id=?", (trans_id,))
-        conn.commit()
-        return True, "Transaksi kasir berhasil dihapus"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("DELETE FROM kasir_transactions WHERE id=?", (trans_id,))
+            # Item keranjang yang tidak punya salinan di coffee_sales ikut dihapus
+            c.execute("DELETE FROM sale_items WHERE kasir_transaction_id=? AND sale_id IS NULL", (trans_id,))
+            conn.commit()
+            invalidate_tables('kasir_transactions')
+            return True, "Transaksi kasir berhasil dihapus"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
 
 def delete_attendance(attendance_id):
     """Delete attendance record"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    try:
-        c.execute("DELETE FROM attendance WHERE id=?", (attendance_id,))
-        conn.commit()
-        return True, "Presensi berhasil dihapus"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("DELETE FROM attendance WHERE id=?", (attendance_id,))
+            conn.commit()
+            invalidate_tables('attendance')
+            return True, "Presensi berhasil dihapus"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
 
+@cached_query('shift_settings')
 def get_shift_settings():
     """Get shift settings"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM shift_settings")
-    shifts = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM shift_settings")
+        shifts = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
     return shifts
 
 def update_shift_settings(shift_name, jam_mulai, jam_selesai, persentase):
     """Update shift settings"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    now = datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S")
-    c.execute("""
-        UPDATE shift_settings 
-        SET jam_mulai=?, jam_selesai=?, persentase_gaji=?, updated_at=?
-        WHERE shift_name=?
-    """, (jam_mulai, jam_selesai, persentase, now, shift_name))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        now = datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S")
+        c.execute("""
+            UPDATE shift_settings 
+            SET jam_mulai=?, jam_selesai=?, persentase_gaji=?, updated_at=?
+            WHERE shift_name=?
+        """, (jam_mulai, jam_selesai, persentase, now, shift_name))
+        conn.commit()
+        invalidate_tables('shift_settings')
 
 def add_attendance(employee_id, tanggal, jam_masuk, jam_pulang, shift, status, catatan, created_by):
     """Add attendance record"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO attendance (employee_id, tanggal, jam_masuk, jam_pulang, shift, status, catatan, created_by)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (employee_id, tanggal, jam_masuk, jam_pulang, shift, status, catatan, created_by))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO attendance (employee_id, tanggal, jam_masuk, jam_pulang, shift, status, catatan, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (employee_id, tanggal, jam_masuk, jam_pulang, shift, status, catatan, created_by))
+        conn.commit()
+        invalidate_tables('attendance')
 
+@cached_query('attendance', 'employees')
 def get_attendance_by_date_range(start_date, end_date):
     """Get attendance records by date range"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    c.execute("""
-        SELECT a.*, e.nama, e.role_karyawan
-        FROM attendance a
-        JOIN employees e ON a.employee_id = e.id
-        WHERE a.tanggal BETWEEN ? AND ?
-        ORDER BY a.tanggal DESC, a.jam_masuk DESC
-    """, (start_date, end_date))
-    attendance = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT a.*, e.nama, e.role_karyawan
+            FROM attendance a
+            JOIN employees e ON a.employee_id = e.id
+            WHERE a.tanggal_iso BETWEEN ? AND ?
+            ORDER BY a.tanggal_iso DESC, a.jam_masuk DESC
+        """, (to_iso_date(start_date), to_iso_date(end_date)))
+        attendance = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
     return attendance
 
+@cached_query('wash_transactions')
 def get_wash_revenue_by_time_range(start_datetime, end_datetime):
     """Get total WASH revenue between datetime range (excludes coffee shop)"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
+    with db_connection() as conn:
+        c = conn.cursor()
     
-    # Query untuk mendapatkan total pendapatan CUCI MOBIL saja (tanpa coffee)
-    # Hanya dari wash_transactions, bukan dari kasir_transactions coffee
-    c.execute("""
-        SELECT COALESCE(SUM(harga), 0) as total
-        FROM wash_transactions
-        WHERE datetime(substr(tanggal, 7, 4) || '-' || substr(tanggal, 4, 2) || '-' || substr(tanggal, 1, 2) || ' ' || waktu_masuk) 
-        BETWEEN ? AND ?
-    """, (start_datetime, end_datetime))
-    
-    result = c.fetchone()
-    conn.close()
+        # Query untuk mendapatkan total pendapatan CUCI MOBIL saja (tanpa coffee)
+        # Hanya dari wash_transactions, bukan dari kasir_transactions coffee
+        # Filter tanggal_iso dulu (index range scan), baru cek jam masuk
+        c.execute("""
+            SELECT COALESCE(SUM(harga), 0) as total
+            FROM wash_transactions
+            WHERE tanggal_iso BETWEEN ? AND ?
+            AND datetime(tanggal_iso || ' ' || waktu_masuk) BETWEEN ? AND ?
+        """, (start_datetime[:10], end_datetime[:10], start_datetime, end_datetime))
+    
+        result = c.fetchone()
     return result[0] if result else 0
 
 def calculate_worker_salary(employee_id, tanggal, jam_masuk, jam_pulang, shift):
@@ -1473,201 +2821,447 @@ def calculate_worker_salary(employee_id, tanggal, jam_masuk, jam_pulang, shift):
         st.error(f"Error calculating salary: {e}")
         return 0
 
+# --- Batch Payroll Engine ---
+# Status presensi yang dihitung sebagai hari kerja
+PAYROLL_WORKING_STATUS = ['Hadir', 'Terlambat', 'Pulang Awal']
+# Role dengan gaji tetap (tidak dihitung dari pendapatan cuci)
+PAYROLL_FIXED_SALARY_ROLES = ['Kasir', 'Supervisor']
+
+@cached_query('wash_transactions')
+def get_wash_revenue_timeline(start_date, end_date):
+    """Ambil waktu masuk & harga transaksi cuci dalam rentang tanggal, terurut berdasarkan waktu"""
+    with db_connection() as conn:
+        df = pd.read_sql_query("""
+            SELECT datetime(tanggal_iso || ' ' || waktu_masuk) AS waktu, harga
+            FROM wash_transactions
+            WHERE tanggal_iso BETWEEN ? AND ?
+        """, conn, params=(to_iso_date(start_date), to_iso_date(end_date)))
+    df['waktu'] = pd.to_datetime(df['waktu'], format="%Y-%m-%d %H:%M:%S", errors='coerce')
+    df['harga'] = pd.to_numeric(df['harga'], errors='coerce').fillna(0)
+    return df.dropna(subset=['waktu']).sort_values('waktu', kind='mergesort').reset_index(drop=True)
+
+def _parse_clock(series):
+    """Ubah kolom jam "HH:MM" menjadi timedelta, NaT jika format tidak valid"""
+    text = series.astype('string').str.strip()
+    valid = text.str.fullmatch(r"([01]?\d|2[0-3]):[0-5]\d").fillna(False).astype(bool)
+    return pd.to_timedelta(text.where(valid) + ":00", errors='coerce')
+
+def calculate_attendance_salaries(df_attendance, shifts=None, now=None):
+    """Hitung gaji worker untuk setiap baris presensi sekaligus (hasil sama dengan calculate_worker_salary)"""
+    salaries = pd.Series(0, index=df_attendance.index, dtype='int64')
+    if df_attendance.empty:
+        return salaries
+
+    if shifts is None:
+        shifts = get_shift_settings()
+    rates = df_attendance['shift'].map({s['shift_name']: s['persentase_gaji'] / 100 for s in shifts})
+    now = now or datetime.now(WIB)
+
+    # Jendela kerja per presensi: tanggal + jam masuk s/d tanggal + jam pulang
+    tanggal = pd.to_datetime(df_attendance['tanggal'], format="%d-%m-%Y", errors='coerce')
+    jam_masuk = _parse_clock(df_attendance['jam_masuk'])
+    jam_pulang = _parse_clock(df_attendance['jam_pulang'])
+    # Jika belum pulang, gunakan waktu sekarang
+    belum_pulang = df_attendance['jam_pulang'].isna() | (df_attendance['jam_pulang'] == '')
+    jam_pulang = jam_pulang.mask(belum_pulang, pd.Timedelta(hours=now.hour, minutes=now.minute, seconds=now.second))
+
+    start = tanggal + jam_masuk
+    end = tanggal + jam_pulang
+    # Shift malam yang melewati tengah malam selesai di hari berikutnya
+    lewat_hari = (df_attendance['shift'] == 'Malam') & (jam_pulang < jam_masuk)
+    end = end.mask(lewat_hari, end + pd.Timedelta(days=1))
+
+    valid = start.notna() & end.notna() & rates.notna()
+    if not valid.any():
+        return salaries
+
+    timeline = get_wash_revenue_timeline(start[valid].min().date(), end[valid].max().date())
+    if timeline.empty:
+        return salaries
+
+    # Prefix sum + binary search: pendapatan jendela [start, end] (inklusif, seperti BETWEEN)
+    cumulative = pd.concat([pd.Series([0.0]), timeline['harga'].cumsum()], ignore_index=True).to_numpy()
+    lo = timeline['waktu'].searchsorted(start[valid].to_numpy(), side='left')
+    hi = timeline['waktu'].searchsorted(end[valid].to_numpy(), side='right')
+    revenue = pd.Series(cumulative[hi] - cumulative[lo], index=start[valid].index).clip(lower=0)
+
+    salaries.loc[valid] = (revenue * rates[valid]).astype('int64')
+    return salaries
+
+def calculate_payroll_batch(periode_awal, periode_akhir, employee_ids=None):
+    """Hitung hari kerja & total gaji karyawan aktif untuk satu periode dalam satu pass"""
+    employees = [e for e in get_all_employees() if e['status'] == 'Aktif']
+    if employee_ids is not None:
+        employees = [e for e in employees if e['id'] in employee_ids]
+
+    columns = ['employee_id', 'nama', 'role_karyawan', 'shift', 'total_hari_kerja', 'total_gaji']
+    if not employees:
+        return pd.DataFrame(columns=columns)
+
+    df_emp = pd.DataFrame(employees).rename(columns={'id': 'employee_id'})
+    fixed = df_emp['role_karyawan'].isin(PAYROLL_FIXED_SALARY_ROLES)
+
+    df_att = pd.DataFrame(get_attendance_by_date_range(periode_awal, periode_akhir))
+    if df_att.empty:
+        df_att = pd.DataFrame(columns=['employee_id', 'tanggal', 'jam_masuk', 'jam_pulang', 'shift', 'status'])
+    df_att = df_att[df_att['employee_id'].isin(df_emp['employee_id']) & df_att['status'].isin(PAYROLL_WORKING_STATUS)]
+
+    # Gaji worker hanya dihitung untuk presensi karyawan non gaji tetap
+    df_worker = df_att[df_att['employee_id'].isin(df_emp.loc[~fixed, 'employee_id'])].copy()
+    df_worker['gaji'] = calculate_attendance_salaries(df_worker)
+
+    hari_kerja = df_att.groupby('employee_id').size()
+    gaji_worker = df_worker.groupby('employee_id')['gaji'].sum()
+
+    df_emp['total_hari_kerja'] = df_emp['employee_id'].map(hari_kerja).fillna(0).astype(int)
+    df_emp['total_gaji'] = df_emp['employee_id'].map(gaji_worker).fillna(0).astype(int)
+    df_emp.loc[fixed, 'total_gaji'] = df_emp.loc[fixed, 'gaji_tetap'].fillna(0).astype(int)
+    return df_emp[columns].reset_index(drop=True)
+
+def prepare_payroll_run(periode_awal, periode_akhir, potong_kas_bon=True):
+    """Siapkan preview payroll massal semua karyawan aktif: gaji kotor, potongan kas bon, gaji bersih"""
+    df = calculate_payroll_batch(periode_awal, periode_akhir)
+    if df.empty:
+        return df
+
+    hutang = get_total_hutang_all_employees()
+    existing = get_payroll_employee_ids(format_date(periode_awal), format_date(periode_akhir))
+
+    df['total_hutang'] = df['employee_id'].map(hutang).fillna(0).astype(int)
+    df['bonus'] = 0
+    df['potongan'] = 0
+    # Potongan kas bon tidak boleh melebihi gaji kotor
+    df['potongan_kas_bon'] = df[['total_hutang', 'total_gaji']].min(axis=1).clip(lower=0) if potong_kas_bon else 0
+    df['gaji_bersih'] = df['total_gaji'] + df['bonus'] - df['potongan'] - df['potongan_kas_bon']
+    df['sudah_ada'] = df['employee_id'].isin(existing)
+    return df
+
+def run_payroll_batch(rows, periode_awal, periode_akhir, created_by):
+    """Simpan payroll + pembayaran kas bon semua karyawan dalam satu transaksi"""
+    periode_awal = format_date(periode_awal)
+    periode_akhir = format_date(periode_akhir)
+    now = datetime.now(WIB)
+    created_at = now.strftime("%d-%m-%Y %H:%M:%S")
+    tanggal_bayar = now.strftime("%d-%m-%Y")
+    keterangan_kas_bon = f"Potong gaji periode {periode_awal} s/d {periode_akhir}"
+
+    try:
+        with db_connection() as conn:
+            c = conn.cursor()
+            employee_ids = [int(r['employee_id']) for r in rows]
+            placeholders = ",".join("?" * len(employee_ids))
+
+            # Cegah payroll ganda untuk periode yang sama
+            if employee_ids:
+                c.execute(f"""
+                    SELECT COUNT(*) FROM payroll
+                    WHERE periode_awal = ? AND periode_akhir = ? AND employee_id IN ({placeholders})
+                """, (periode_awal, periode_akhir, *employee_ids))
+                if c.fetchone()[0] > 0:
+                    return False, "Sebagian karyawan sudah memiliki payroll untuk periode ini"
+
+            # Kas bon belum lunas, dilunasi dari yang paling lama
+            outstanding = {}
+            if employee_ids:
+                c.execute(f"""
+                    SELECT id, employee_id, sisa_hutang FROM kas_bon
+                    WHERE status = 'Belum Lunas' AND employee_id IN ({placeholders})
+                    ORDER BY employee_id, id
+                """, employee_ids)
+                for kas_bon_id, employee_id, sisa_hutang in c.fetchall():
+                    outstanding.setdefault(employee_id, []).append([kas_bon_id, sisa_hutang])
+
+            pembayaran_rows = []
+            kas_bon_updates = []
+            total_bersih = 0
+            for r in rows:
+                employee_id = int(r['employee_id'])
+                total_gaji = int(r['total_gaji'])
+                bonus = int(r.get('bonus', 0) or 0)
+                potongan_kas_bon = int(r.get('potongan_kas_bon', 0) or 0)
+                potongan = int(r.get('potongan', 0) or 0) + potongan_kas_bon
+                gaji_bersih = total_gaji + bonus - potongan
+                catatan = r.get('catatan') or ''
+                if potongan_kas_bon > 0:
+                    catatan = f"{catatan} (Potong kas bon Rp {potongan_kas_bon:,.0f})".strip()
+
+                c.execute("""
+                    INSERT INTO payroll (employee_id, periode_awal, periode_akhir, total_hari_kerja, total_gaji, bonus, potongan, gaji_bersih, status, tanggal_bayar, catatan, created_at, created_by)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'Pending', NULL, ?, ?, ?)
+                """, (employee_id, periode_awal, periode_akhir, int(r['total_hari_kerja']), total_gaji,
+                      bonus, potongan, gaji_bersih, catatan, created_at, created_by))
+                payroll_id = c.lastrowid
+                total_bersih += gaji_bersih
+
+                sisa_potong = potongan_kas_bon
+                for kas_bon in outstanding.get(employee_id, []):
+                    if sisa_potong <= 0:
+                        break
+                    jumlah_bayar = min(sisa_potong, kas_bon[1])
+                    if jumlah_bayar <= 0:
+                        continue
+                    kas_bon[1] -= jumlah_bayar
+                    sisa_potong -= jumlah_bayar
+                    pembayaran_rows.append((kas_bon[0], payroll_id, tanggal_bayar, jumlah_bayar, 'Potong Gaji',
+                                            keterangan_kas_bon, created_at, created_by))
+                    kas_bon_updates.append((kas_bon[1], 'Lunas' if kas_bon[1] <= 0 else 'Belum Lunas', kas_bon[0]))
+                if sisa_potong > 0:
+                    raise ValueError(f"Potongan kas bon karyawan {employee_id} melebihi sisa hutang")
+
+            c.executemany("""
+                INSERT INTO pembayaran_kas_bon (kas_bon_id, payroll_id, tanggal_bayar, jumlah_bayar, metode, keterangan, created_at, created_by)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, pembayaran_rows)
+            c.executemany("UPDATE kas_bon SET sisa_hutang = ?, status = ? WHERE id = ?", kas_bon_updates)
+
+        invalidate_tables('payroll', 'pembayaran_kas_bon', 'kas_bon')
+        return True, f"{len(rows)} payroll berhasil disimpan (total Rp {total_bersih:,.0f}, {len(pembayaran_rows)} pembayaran kas bon)"
+    except Exception as e:
+        return False, f"Error: {str(e)}"
+
 def add_payroll(employee_id, periode_awal, periode_akhir, total_hari_kerja, total_gaji, bonus, potongan, gaji_bersih, status, tanggal_bayar, catatan, created_by):
     """Add payroll record"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    now = datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S")
-    c.execute("""
-        INSERT INTO payroll (employee_id, periode_awal, periode_akhir, total_hari_kerja, total_gaji, bonus, potongan, gaji_bersih, status, tanggal_bayar, catatan, created_at, created_by)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (employee_id, periode_awal, periode_akhir, total_hari_kerja, total_gaji, bonus, potongan, gaji_bersih, status, tanggal_bayar, catatan, now, created_by))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        now = datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S")
+        c.execute("""
+            INSERT INTO payroll (employee_id, periode_awal, periode_akhir, total_hari_kerja, total_gaji, bonus, potongan, gaji_bersih, status, tanggal_bayar, catatan, created_at, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (employee_id, periode_awal, periode_akhir, total_hari_kerja, total_gaji, bonus, potongan, gaji_bersih, status, tanggal_bayar, catatan, now, created_by))
+        conn.commit()
+        invalidate_tables('payroll')
 
+@cached_query('payroll', 'employees')
 def get_payroll_history(employee_id=None):
     """Get payroll history"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
+    with db_connection() as conn:
+        c = conn.cursor()
     
-    if employee_id:
-        c.execute("""
-            SELECT p.*, e.nama, e.role_karyawan
-            FROM payroll p
-            JOIN employees e ON p.employee_id = e.id
-            WHERE p.employee_id = ?
-            ORDER BY p.created_at DESC
-        """, (employee_id,))
-    else:
-        c.execute("""
-            SELECT p.*, e.nama, e.role_karyawan
-            FROM payroll p
-            JOIN employees e ON p.employee_id = e.id
-            ORDER BY p.created_at DESC
-        """)
+        if employee_id:
+            c.execute("""
+                SELECT p.*, e.nama, e.role_karyawan
+                FROM payroll p
+                JOIN employees e ON p.employee_id = e.id
+                WHERE p.employee_id = ?
+                ORDER BY p.created_at DESC
+            """, (employee_id,))
+        else:
+            c.execute("""
+                SELECT p.*, e.nama, e.role_karyawan
+                FROM payroll p
+                JOIN employees e ON p.employee_id = e.id
+                ORDER BY p.created_at DESC
+            """)
     
-    payroll = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
-    conn.close()
+        payroll = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
     return payroll
 
+@cached_query('payroll')
+def get_payroll_employee_ids(periode_awal, periode_akhir):
+    """Get id karyawan yang sudah punya payroll untuk periode tertentu"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT DISTINCT employee_id FROM payroll
+            WHERE periode_awal = ? AND periode_akhir = ?
+        """, (periode_awal, periode_akhir))
+        employee_ids = {row[0] for row in c.fetchall()}
+    return employee_ids
+
 def update_payroll_status(payroll_id, status, tanggal_bayar):
-    """Update payroll status"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    c.execute("""
-        UPDATE payroll 
-        SET status=?, tanggal_bayar=?
-        WHERE id=?
-    """, (status, tanggal_bayar, payroll_id))
-    conn.commit()
-    conn.close()
+    """Update payroll status"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            UPDATE payroll 
+            SET status=?, tanggal_bayar=?
+            WHERE id=?
+        """, (status, tanggal_bayar, payroll_id))
+        conn.commit()
+        invalidate_tables('payroll')
 
 
 # ========== KAS BON FUNCTIONS ==========
 
 def add_kas_bon(employee_id, tanggal, jumlah, keterangan, created_by):
     """Add new kas bon record"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    now = datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S")
-    c.execute("""
-        INSERT INTO kas_bon (employee_id, tanggal, jumlah, keterangan, status, sisa_hutang, created_at, created_by)
-        VALUES (?, ?, ?, ?, 'Belum Lunas', ?, ?, ?)
-    """, (employee_id, tanggal, jumlah, keterangan, jumlah, now, created_by))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        now = datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S")
+        c.execute("""
+            INSERT INTO kas_bon (employee_id, tanggal, jumlah, keterangan, status, sisa_hutang, created_at, created_by)
+            VALUES (?, ?, ?, ?, 'Belum Lunas', ?, ?, ?)
+        """, (employee_id, tanggal, jumlah, keterangan, jumlah, now, created_by))
+        conn.commit()
+        invalidate_tables('kas_bon')
 
+@cached_query('kas_bon', 'employees')
 def get_kas_bon_by_employee(employee_id, status_filter=None):
     """Get kas bon records by employee"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    
-    if status_filter:
-        c.execute("""
-            SELECT kb.*, e.nama, e.role_karyawan
-            FROM kas_bon kb
-            JOIN employees e ON kb.employee_id = e.id
-            WHERE kb.employee_id = ? AND kb.status = ?
-            ORDER BY kb.tanggal DESC
-        """, (employee_id, status_filter))
-    else:
-        c.execute("""
-            SELECT kb.*, e.nama, e.role_karyawan
-            FROM kas_bon kb
-            JOIN employees e ON kb.employee_id = e.id
-            WHERE kb.employee_id = ?
-            ORDER BY kb.tanggal DESC
-        """, (employee_id,))
+    with db_connection() as conn:
+        c = conn.cursor()
     
-    kas_bon = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
-    conn.close()
+        if status_filter:
+            c.execute("""
+                SELECT kb.*, e.nama, e.role_karyawan
+                FROM kas_bon kb
+                JOIN employees e ON kb.employee_id = e.id
+                WHERE kb.employee_id = ? AND kb.status = ?
+                ORDER BY kb.tanggal DESC
+            """, (employee_id, status_filter))
+        else:
+            c.execute("""
+                SELECT kb.*, e.nama, e.role_karyawan
+                FROM kas_bon kb
+                JOIN employees e ON kb.employee_id = e.id
+                WHERE kb.employee_id = ?
+                ORDER BY kb.tanggal DESC
+            """, (employee_id,))
+    
+        kas_bon = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
     return kas_bon
 
+@cached_query('kas_bon', 'employees')
 def get_all_kas_bon(status_filter=None):
     """Get all kas bon records"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
+    with db_connection() as conn:
+        c = conn.cursor()
     
-    if status_filter:
-        c.execute("""
-            SELECT kb.*, e.nama, e.role_karyawan
-            FROM kas_bon kb
-            JOIN employees e ON kb.employee_id = e.id
-            WHERE kb.status = ?
-            ORDER BY kb.tanggal DESC
-        """, (status_filter,))
-    else:
-        c.execute("""
-            SELECT kb.*, e.nama, e.role_karyawan
-            FROM kas_bon kb
-            JOIN employees e ON kb.employee_id = e.id
-            ORDER BY kb.tanggal DESC
-        """)
+        if status_filter:
+            c.execute("""
+                SELECT kb.*, e.nama, e.role_karyawan
+                FROM kas_bon kb
+                JOIN employees e ON kb.employee_id = e.id
+                WHERE kb.status = ?
+                ORDER BY kb.tanggal DESC
+            """, (status_filter,))
+        else:
+            c.execute("""
+                SELECT kb.*, e.nama, e.role_karyawan
+                FROM kas_bon kb
+                JOIN employees e ON kb.employee_id = e.id
+                ORDER BY kb.tanggal DESC
+            """)
     
-    kas_bon = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
-    conn.close()
+        kas_bon = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
     return kas_bon
 
+@cached_query('kas_bon')
 def get_total_hutang_by_employee(employee_id):
     """Get total hutang belum lunas by employee"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    c.execute("""
-        SELECT COALESCE(SUM(sisa_hutang), 0)
-        FROM kas_bon
-        WHERE employee_id = ? AND status = 'Belum Lunas'
-    """, (employee_id,))
-    total = c.fetchone()[0]
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT COALESCE(SUM(sisa_hutang), 0)
+            FROM kas_bon
+            WHERE employee_id = ? AND status = 'Belum Lunas'
+        """, (employee_id,))
+        total = c.fetchone()[0]
     return total
 
+@cached_query('kas_bon')
+def get_total_hutang_all_employees():
+    """Get total hutang belum lunas semua karyawan sekaligus ({employee_id: total})"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT employee_id, COALESCE(SUM(sisa_hutang), 0)
+            FROM kas_bon
+            WHERE status = 'Belum Lunas'
+            GROUP BY employee_id
+        """)
+        totals = dict(c.fetchall())
+    return totals
+
 def add_pembayaran_kas_bon(kas_bon_id, payroll_id, tanggal_bayar, jumlah_bayar, metode, keterangan, created_by):
     """Add pembayaran kas bon and update sisa hutang"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    now = datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S")
+    with db_connection() as conn:
+        c = conn.cursor()
+        now = datetime.now(WIB).strftime("%d-%m-%Y %H:%M:%S")
     
-    try:
-        # Insert pembayaran
-        c.execute("""
-            INSERT INTO pembayaran_kas_bon (kas_bon_id, payroll_id, tanggal_bayar, jumlah_bayar, metode, keterangan, created_at, created_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (kas_bon_id, payroll_id, tanggal_bayar, jumlah_bayar, metode, keterangan, now, created_by))
+        try:
+            # Insert pembayaran
+            c.execute("""
+                INSERT INTO pembayaran_kas_bon (kas_bon_id, payroll_id, tanggal_bayar, jumlah_bayar, metode, keterangan, created_at, created_by)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (kas_bon_id, payroll_id, tanggal_bayar, jumlah_bayar, metode, keterangan, now, created_by))
         
-        # Update sisa hutang di kas_bon
-        c.execute("""
-            UPDATE kas_bon
-            SET sisa_hutang = sisa_hutang - ?
-            WHERE id = ?
-        """, (jumlah_bayar, kas_bon_id))
+            # Update sisa hutang di kas_bon
+            c.execute("""
+                UPDATE kas_bon
+                SET sisa_hutang = sisa_hutang - ?
+                WHERE id = ?
+            """, (jumlah_bayar, kas_bon_id))
         
-        # Update status jika sudah lunas
-        c.execute("""
-            UPDATE kas_bon
-            SET status = CASE 
-                WHEN sisa_hutang <= 0 THEN 'Lunas'
-                ELSE 'Belum Lunas'
-            END
-            WHERE id = ?
-        """, (kas_bon_id,))
+            # Update status jika sudah lunas
+            c.execute("""
+                UPDATE kas_bon
+                SET status = CASE 
+                    WHEN sisa_hutang <= 0 THEN 'Lunas'
+                    ELSE 'Belum Lunas'
+                END
+                WHERE id = ?
+            """, (kas_bon_id,))
         
-        conn.commit()
-        return True
-    except Exception as e:
-        conn.rollback()
-        return False
-    finally:
-        conn.close()
+            conn.commit()
+            invalidate_tables('pembayaran_kas_bon', 'kas_bon')
+            return True
+        except Exception as e:
+            conn.rollback()
+            return False
 
+@cached_query('pembayaran_kas_bon')
 def get_pembayaran_kas_bon(kas_bon_id):
     """Get pembayaran history for specific kas bon"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    c.execute("""
-        SELECT * FROM pembayaran_kas_bon
-        WHERE kas_bon_id = ?
-        ORDER BY tanggal_bayar DESC
-    """, (kas_bon_id,))
-    pembayaran = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT * FROM pembayaran_kas_bon
+            WHERE kas_bon_id = ?
+            ORDER BY tanggal_bayar DESC
+        """, (kas_bon_id,))
+        pembayaran = [dict(zip([column[0] for column in c.description], row)) for row in c.fetchall()]
+    return pembayaran
+
+# Jumlah id per query IN (...) agar tetap di bawah batas parameter SQLite
+KAS_BON_ID_CHUNK_SIZE = 500
+
+@cached_query('pembayaran_kas_bon')
+def get_pembayaran_kas_bon_map(kas_bon_ids):
+    """Riwayat pembayaran banyak kas bon sekaligus: dict kas_bon_id -> list pembayaran (seperti get_pembayaran_kas_bon)"""
+    pembayaran = {kas_bon_id: [] for kas_bon_id in kas_bon_ids}
+    ids = list(pembayaran)
+    with db_connection() as conn:
+        c = conn.cursor()
+        for start in range(0, len(ids), KAS_BON_ID_CHUNK_SIZE):
+            chunk = ids[start:start + KAS_BON_ID_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            c.execute(f"""
+                SELECT * FROM pembayaran_kas_bon
+                WHERE kas_bon_id IN ({placeholders})
+                ORDER BY tanggal_bayar DESC
+            """, chunk)
+            columns = [column[0] for column in c.description]
+            for row in c.fetchall():
+                item = dict(zip(columns, row))
+                pembayaran[item['kas_bon_id']].append(item)
     return pembayaran
 
 def delete_kas_bon(kas_bon_id):
     """Delete kas bon and related pembayaran"""
-    conn = sqlite3.connect('car_wash.db')
-    c = conn.cursor()
-    try:
-        # Delete pembayaran first (foreign key constraint)
-        c.execute("DELETE FROM pembayaran_kas_bon WHERE kas_bon_id = ?", (kas_bon_id,))
-        # Delete kas bon
-        c.execute("DELETE FROM kas_bon WHERE id = ?", (kas_bon_id,))
-        conn.commit()
-        return True
-    except Exception as e:
-        conn.rollback()
-        return False
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            # Delete pembayaran first (foreign key constraint)
+            c.execute("DELETE FROM pembayaran_kas_bon WHERE kas_bon_id = ?", (kas_bon_id,))
+            # Delete kas bon
+            c.execute("DELETE FROM kas_bon WHERE id = ?", (kas_bon_id,))
+            conn.commit()
+            invalidate_tables('pembayaran_kas_bon', 'kas_bon')
+            return True
+        except Exception as e:
+            conn.rollback()
+            return False
 
 
 # --- Coffee Shop Helpers ---
@@ -1679,118 +3273,350 @@ def get_coffee_menu():
 
 def save_coffee_sale(data):
     """Simpan transaksi penjualan coffee/snack ke DB"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        c.execute("""
-            INSERT INTO coffee_sales (items, total, tanggal, waktu, nama_customer, no_telp, created_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            json.dumps(data.get('items', []), ensure_ascii=False),
-            int(data.get('total', 0)),
-            data.get('tanggal', ''),
-            data.get('waktu', ''),
-            data.get('nama_customer', ''),
-            data.get('no_telp', ''),
-            data.get('created_by', '')
-        ))
-        conn.commit()
-        return True, "Penjualan Coffee berhasil disimpan"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("""
+                INSERT INTO coffee_sales (items, total, tanggal, waktu, nama_customer, no_telp, created_by)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                json.dumps(data.get('items', []), ensure_ascii=False),
+                int(data.get('total', 0)),
+                data.get('tanggal', ''),
+                data.get('waktu', ''),
+                data.get('nama_customer', ''),
+                data.get('no_telp', ''),
+                data.get('created_by', '')
+            ))
+            insert_sale_items(c, c.lastrowid, data.get('items', []))
+            conn.commit()
+            invalidate_tables('coffee_sales')
+            return True, "Penjualan Coffee berhasil disimpan"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
 
 
+@cached_query('coffee_sales')
 def get_all_coffee_sales():
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql("SELECT * FROM coffee_sales ORDER BY tanggal DESC, waktu DESC", conn)
-    conn.close()
+    """Semua penjualan coffee beserta teks item (items_text) dari sale_items"""
+    with db_connection() as conn:
+        df = pd.read_sql(f"""
+            SELECT *, {sale_items_text_sql()} AS items_text
+            FROM coffee_sales ORDER BY tanggal_iso DESC, waktu DESC
+        """, conn)
     return df
 
+@cached_query('coffee_sales')
+def get_coffee_sales_by_date_range(start_date, end_date, columns=None):
+    """Ambil penjualan coffee dalam rentang tanggal (default: semua kolom + items_text dari sale_items)"""
+    return load_by_date_range('coffee_sales', start_date, end_date,
+                              columns or ['*', f"{sale_items_text_sql()} AS items_text"],
+                              order_by='tanggal_iso DESC, waktu DESC')
+
 # --- Kasir Functions ---
+@cached_query('wash_transactions', 'kasir_transactions')
 def get_pending_wash_transactions():
     """Ambil transaksi cuci mobil yang belum dibayar (status 'Dalam Proses' atau 'Selesai')"""
-    conn = sqlite3.connect(DB_NAME)
-    # Cek transaksi yang belum ada di kasir_transactions
-    query = """
-        SELECT wt.* FROM wash_transactions wt
-        LEFT JOIN kasir_transactions kt ON wt.id = kt.wash_trans_id
-        WHERE kt.id IS NULL
-        ORDER BY wt.tanggal DESC, wt.waktu_masuk DESC
-    """
-    df = pd.read_sql(query, conn)
-    conn.close()
+    with db_connection() as conn:
+        query = """
+            SELECT wt.* FROM wash_transactions wt
+            LEFT JOIN kasir_transactions kt ON wt.id = kt.wash_trans_id
+            WHERE kt.id IS NULL
+            ORDER BY wt.tanggal_iso DESC, wt.waktu_masuk DESC
+        """
+        df = pd.read_sql(query, conn)
     return df
 
 def save_kasir_transaction(data):
     """Simpan transaksi kasir (bisa gabungan cuci mobil + coffee atau hanya salah satu)"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        # Generate unique secret code
-        secret_code = generate_secret_code()
-        while True:
-            # Check if code already exists
-            c.execute("SELECT COUNT(*) FROM kasir_transactions WHERE secret_code = ?", (secret_code,))
-            if c.fetchone()[0] == 0:
-                break
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            # Generate unique secret code
             secret_code = generate_secret_code()
+            while True:
+                # Check if code already exists
+                c.execute("SELECT COUNT(*) FROM kasir_transactions WHERE secret_code = ?", (secret_code,))
+                if c.fetchone()[0] == 0:
+                    break
+                secret_code = generate_secret_code()
         
-        c.execute("""
-            INSERT INTO kasir_transactions 
-            (nopol, nama_customer, no_telp, tanggal, waktu, wash_trans_id, paket_cuci, harga_cuci,
-             coffee_items, harga_coffee, total_bayar, status_bayar, metode_bayar, created_by, catatan, secret_code)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data.get('nopol', '').upper(),
-            data.get('nama_customer', ''),
-            data.get('no_telp', ''),
-            data.get('tanggal', ''),
-            data.get('waktu', ''),
-            data.get('wash_trans_id'),
-            data.get('paket_cuci', ''),
-            int(data.get('harga_cuci', 0)),
-            data.get('coffee_items', ''),
-            int(data.get('harga_coffee', 0)),
-            int(data.get('total_bayar', 0)),
-            data.get('status_bayar', 'Lunas'),
-            data.get('metode_bayar', ''),
-            data.get('created_by', ''),
-            data.get('catatan', ''),
-            secret_code
-        ))
-        
-        # Jika ada transaksi coffee, simpan juga ke tabel coffee_sales untuk laporan terpisah
-        if data.get('coffee_items') and data.get('harga_coffee', 0) > 0:
             c.execute("""
-                INSERT INTO coffee_sales 
-                (items, total, tanggal, waktu, nama_customer, no_telp, created_by)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO kasir_transactions 
+                (nopol, nama_customer, no_telp, tanggal, waktu, wash_trans_id, paket_cuci, harga_cuci,
+                 coffee_items, harga_coffee, total_bayar, status_bayar, metode_bayar, created_by, catatan, secret_code)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
-                data.get('coffee_items', ''),
-                int(data.get('harga_coffee', 0)),
-                data.get('tanggal', ''),
-                data.get('waktu', ''),
+                data.get('nopol', '').upper(),
                 data.get('nama_customer', ''),
                 data.get('no_telp', ''),
-                data.get('created_by', '')
+                data.get('tanggal', ''),
+                data.get('waktu', ''),
+                data.get('wash_trans_id'),
+                data.get('paket_cuci', ''),
+                int(data.get('harga_cuci', 0)),
+                data.get('coffee_items', ''),
+                int(data.get('harga_coffee', 0)),
+                int(data.get('total_bayar', 0)),
+                data.get('status_bayar', 'Lunas'),
+                data.get('metode_bayar', ''),
+                data.get('created_by', ''),
+                data.get('catatan', ''),
+                secret_code
             ))
+            kasir_id = c.lastrowid
         
-        conn.commit()
-        return True, "Transaksi kasir berhasil disimpan", secret_code
-    except Exception as e:
-        return False, f"Error: {str(e)}", None
-    finally:
-        conn.close()
+            # Jika ada transaksi coffee, simpan juga ke tabel coffee_sales untuk laporan terpisah
+            if data.get('coffee_items') and data.get('harga_coffee', 0) > 0:
+                c.execute("""
+                    INSERT INTO coffee_sales 
+                    (items, total, tanggal, waktu, nama_customer, no_telp, created_by)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    data.get('coffee_items', ''),
+                    int(data.get('harga_coffee', 0)),
+                    data.get('tanggal', ''),
+                    data.get('waktu', ''),
+                    data.get('nama_customer', ''),
+                    data.get('no_telp', ''),
+                    data.get('created_by', '')
+                ))
+                insert_sale_items(c, c.lastrowid, data.get('coffee_items', ''), kasir_id)
+        
+            conn.commit()
+            invalidate_tables('kasir_transactions', 'coffee_sales')
+            return True, "Transaksi kasir berhasil disimpan", secret_code
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}", None
 
+@cached_query('kasir_transactions')
 def get_all_kasir_transactions():
     """Ambil semua transaksi kasir"""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql("SELECT * FROM kasir_transactions ORDER BY tanggal DESC, waktu DESC", conn)
-    conn.close()
+    with db_connection() as conn:
+        df = pd.read_sql("SELECT * FROM kasir_transactions ORDER BY tanggal_iso DESC, waktu DESC", conn)
+    return df
+
+@cached_query('kasir_transactions', 'sale_items')
+def get_kasir_transactions_by_date_range(start_date, end_date, columns=None):
+    """Ambil transaksi kasir dalam rentang tanggal (default: semua kolom + items_text dari sale_items)"""
+    return load_by_date_range('kasir_transactions', start_date, end_date,
+                              columns or ['*', f"{kasir_items_text_sql()} AS items_text"],
+                              order_by='tanggal_iso DESC, waktu DESC')
+
+# --- Revenue Rollup Functions ---
+@cached_query('daily_revenue')
+def get_daily_revenue(start_date, end_date):
+    """Ambil rollup pendapatan harian (per tanggal & line) dalam rentang tanggal"""
+    with db_connection() as conn:
+        df = pd.read_sql("""
+            SELECT * FROM daily_revenue
+            WHERE tanggal_iso BETWEEN ? AND ?
+            ORDER BY tanggal_iso
+        """, conn, params=(to_iso_date(start_date), to_iso_date(end_date)))
     return df
 
+@cached_query('daily_revenue')
+def get_revenue_summary(start_date, end_date):
+    """Total pendapatan per line (wash/coffee/kasir) dalam rentang tanggal, dibaca dari rollup"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT line, SUM(jumlah_transaksi), SUM(total), SUM(total_cuci), SUM(total_coffee), SUM(jumlah_dengan_coffee)
+            FROM daily_revenue
+            WHERE tanggal_iso BETWEEN ? AND ?
+            GROUP BY line
+        """, (to_iso_date(start_date), to_iso_date(end_date)))
+        rows = c.fetchall()
+    fields = ['jumlah_transaksi', 'total', 'total_cuci', 'total_coffee', 'jumlah_dengan_coffee']
+    summary = {line: dict.fromkeys(fields, 0) for line, *_ in DAILY_REVENUE_SOURCES.values()}
+    for line, *values in rows:
+        summary[line] = dict(zip(fields, values))
+    return summary
+
+@cached_query('daily_revenue')
+def get_revenue_years():
+    """Daftar tahun yang punya data transaksi (terbaru di depan)"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT DISTINCT CAST(substr(tanggal_iso, 1, 4) AS INTEGER) FROM daily_revenue ORDER BY 1 DESC")
+        years = [row[0] for row in c.fetchall()]
+    return years
+
+# --- Keyset Pagination ---
+# Riwayat transaksi dimuat per halaman dengan keyset (tanggal_iso, waktu, id) DESC,
+# memakai index (tanggal_iso, waktu) sehingga biaya per halaman tetap walau data terus bertambah.
+PAGE_SIZE = 20
+# Kolom waktu yang menjadi bagian keyset per tabel
+KEYSET_TIME_COLUMNS = {
+    'wash_transactions': 'waktu_masuk',
+    'kasir_transactions': 'waktu',
+}
+
+def _history_filter_sql(table, search=None, search_date=None):
+    """Bangun sumber FROM + klausa WHERE pencarian riwayat (nopol/nama customer & tanggal)"""
+    source = table
+    clauses = ["tanggal_iso IS NOT NULL"]
+    params = []
+    if search_date:
+        search_date = search_date.strip()
+        iso = to_iso_date(search_date) if len(search_date) == 10 else None
+        if iso:
+            # Tanggal lengkap: pakai index tanggal_iso
+            clauses.append("tanggal_iso = ?")
+            params.append(iso)
+        else:
+            clauses.append("tanggal LIKE ?")
+            params.append(f"%{search_date}%")
+    if search:
+        fts_source = fts_match_source(table, search, ['nopol', 'nama_customer'])
+        if fts_source:
+            # Mulai dari hasil FTS lalu lookup per id, bukan scan seluruh riwayat
+            source = fts_source[0]
+            params = fts_source[1] + params
+        else:
+            clauses.append("(nopol LIKE ? OR nama_customer LIKE ?)")
+            params.extend([f"%{search.strip()}%"] * 2)
+    return source, clauses, params
+
+def load_transaction_page(table, cursor=None, search=None, search_date=None, page_size=PAGE_SIZE, columns=None):
+    """Ambil satu halaman transaksi terbaru, return (DataFrame, cursor halaman berikutnya atau None)"""
+    time_col = KEYSET_TIME_COLUMNS[table]
+    source, clauses, params = _history_filter_sql(table, search, search_date)
+    if cursor:
+        clauses.append(f"(tanggal_iso, {time_col}, id) < (?, ?, ?)")
+        params.extend(cursor)
+    query = f"""
+        SELECT {', '.join(columns or [f'{table}.*'])} FROM {source}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY tanggal_iso DESC, {time_col} DESC, id DESC
+        LIMIT ?
+    """
+    with db_connection() as conn:
+        df = pd.read_sql(query, conn, params=(*params, page_size + 1))
+
+    next_cursor = None
+    if len(df) > page_size:
+        df = df.head(page_size)
+        last = df.iloc[-1]
+        next_cursor = (last['tanggal_iso'], last[time_col], int(last['id']))
+    return df, next_cursor
+
+@cached_query('wash_transactions')
+def get_wash_transactions_page(cursor=None, search=None, search_date=None, page_size=PAGE_SIZE):
+    """Satu halaman transaksi cuci mobil (terbaru di depan)"""
+    return load_transaction_page('wash_transactions', cursor, search, search_date, page_size)
+
+@cached_query('kasir_transactions', 'sale_items')
+def get_kasir_transactions_page(cursor=None, search=None, search_date=None, page_size=PAGE_SIZE):
+    """Satu halaman transaksi kasir (terbaru di depan) + items_text dari sale_items"""
+    return load_transaction_page('kasir_transactions', cursor, search, search_date, page_size,
+                                 ['kasir_transactions.*', f"{kasir_items_text_sql()} AS items_text"])
+
+@cached_query('kasir_transactions', 'daily_revenue')
+def get_kasir_history_summary(search=None, search_date=None):
+    """Jumlah & total transaksi kasir sesuai pencarian; tanpa cari nopol dibaca dari rollup daily_revenue,
+    yang juga menghitung transaksi yang sudah diarsip (`arsip` True jika database arsip ada)"""
+    iso = to_iso_date(search_date.strip()) if search_date and len(search_date.strip()) == 10 else None
+    if not search and (iso or not search_date):
+        start, end = (iso, iso) if iso else (date(1900, 1, 1), date(9999, 12, 31))
+        kasir = get_revenue_summary(start, end)['kasir']
+        return {'jumlah': kasir['jumlah_transaksi'] or 0, 'total': kasir['total'] or 0,
+                'total_cuci': kasir['total_cuci'] or 0, 'total_coffee': kasir['total_coffee'] or 0,
+                'arsip': os.path.exists(get_archive_db_name())}
+
+    source, clauses, params = _history_filter_sql('kasir_transactions', search, search_date)
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(total_bayar), 0), COALESCE(SUM(harga_cuci), 0), COALESCE(SUM(harga_coffee), 0)
+            FROM {source}
+            WHERE {' AND '.join(clauses)}
+        """, params)
+        jumlah, total, total_cuci, total_coffee = c.fetchone()
+    return {'jumlah': jumlah, 'total': total, 'total_cuci': total_cuci, 'total_coffee': total_coffee,
+            'arsip': False}
+
+# Pilihan urutan daftar customer (label UI -> sort_by get_customer_stats_page)
+CUSTOMER_SORT_OPTIONS = {
+    "📅 Terdaftar Terbaru": 'registered',
+    "🕒 Kunjungan Terakhir": 'last_visit',
+    "💰 Total Belanja": 'total_spend',
+    "🔁 Jumlah Kunjungan": 'visits',
+    "🧾 Rata-rata per Kunjungan": 'avg_ticket',
+}
+
+@cached_query('customers', 'customer_stats')
+def get_customer_stats_page(sort_by='last_visit', min_spend=0, min_visits=0, cursor=None, page_size=PAGE_SIZE):
+    """Satu halaman customer + statistik urut menurun per `sort_by` (keyset di index customer_stats),
+    return (DataFrame, cursor halaman berikutnya atau None); 'registered' = customer terdaftar terbaru"""
+    if sort_by == 'registered':
+        # Customer yang belum pernah transaksi ikut tampil
+        source = "customers c LEFT JOIN customer_stats s ON s.nopol = c.nopol"
+        keys = ["c.id"]
+    else:
+        source = "customer_stats s LEFT JOIN customers c ON c.nopol = s.nopol"
+        keys = [CUSTOMER_STATS_SORTS[sort_by], "s.nopol"]
+
+    clauses, params = [], []
+    if min_spend:
+        clauses.append("(s.total_wash + s.total_coffee) >= ?")
+        params.append(min_spend)
+    if min_visits:
+        clauses.append("s.visits >= ?")
+        params.append(min_visits)
+    if cursor and sort_by == 'registered':
+        clauses.append("c.id < ?")
+        params.append(cursor[0])
+    elif cursor:
+        # Bentuk ini (bukan row value) agar range index ekspresi tetap dipakai
+        clauses.append(f"{keys[0]} <= ? AND ({keys[0]} < ? OR s.nopol < ?)")
+        params.extend([cursor[0], cursor[0], cursor[1]])
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT COALESCE(c.nopol, s.nopol) AS nopol, c.nama_customer, c.no_telp, c.created_at,
+                   {CUSTOMER_STATS_SELECT}, {', '.join(keys)}
+            FROM {source}
+            {'WHERE ' + ' AND '.join(clauses) if clauses else ''}
+            ORDER BY {', '.join(f'{key} DESC' for key in keys)}
+            LIMIT ?
+        """, (*params, page_size + 1))
+        columns = [column[0] for column in c.description][:-len(keys)]
+        rows = c.fetchall()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = tuple(rows[-1][-len(keys):])
+    df = pd.DataFrame([row[:-len(keys)] for row in rows], columns=columns)
+    return df, next_cursor
+
+def get_page_cursor(page_key, filters):
+    """Cursor halaman aktif untuk sebuah list; kembali ke halaman pertama jika filter berubah"""
+    state = st.session_state.setdefault(f"pager_{page_key}", {'filters': None, 'cursors': [None]})
+    if state['filters'] != filters:
+        state['filters'] = filters
+        state['cursors'] = [None]
+    return state['cursors'][-1]
+
+def render_pager(page_key, next_cursor):
+    """Tombol navigasi halaman sebelumnya / berikutnya"""
+    state = st.session_state[f"pager_{page_key}"]
+    page_no = len(state['cursors'])
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("⬅️ Sebelumnya", key=f"{page_key}_prev", disabled=page_no == 1, use_container_width=True):
+            state['cursors'].pop()
+            st.rerun()
+    with col_info:
+        st.markdown(f"<div style='text-align: center; padding-top: 0.5rem;'>Halaman {page_no}</div>", unsafe_allow_html=True)
+    with col_next:
+        if st.button("Berikutnya ➡️", key=f"{page_key}_next", disabled=next_cursor is None, use_container_width=True):
+            state['cursors'].append(next_cursor)
+            st.rerun()
+
 def generate_kasir_invoice(trans_data, toko_info):
     """Generate invoice kasir untuk WhatsApp (cuci mobil + coffee)"""
     # Parse coffee items jika ada
@@ -2008,13 +3834,13 @@ def create_whatsapp_link(phone_number, message):
 
 
 # --- Review Customer Functions ---
+@cached_query('kasir_transactions')
 def get_transaction_by_secret_code(secret_code):
     """Ambil transaksi berdasarkan secret code"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT * FROM kasir_transactions WHERE secret_code = ?", (secret_code.upper(),))
-    result = c.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM kasir_transactions WHERE secret_code = ?", (secret_code.upper(),))
+        result = c.fetchone()
     if result:
         columns = ['id', 'nopol', 'nama_customer', 'no_telp', 'tanggal', 'waktu', 'wash_trans_id', 
                    'paket_cuci', 'harga_cuci', 'coffee_items', 'harga_coffee', 'total_bayar', 
@@ -2022,115 +3848,147 @@ def get_transaction_by_secret_code(secret_code):
         return dict(zip(columns, result))
     return None
 
+@cached_query('customer_reviews')
 def check_review_exists(secret_code):
     """Cek apakah secret code sudah pernah digunakan untuk review"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM customer_reviews WHERE secret_code = ?", (secret_code.upper(),))
-    count = c.fetchone()[0]
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM customer_reviews WHERE secret_code = ?", (secret_code.upper(),))
+        count = c.fetchone()[0]
     return count > 0
 
 def save_customer_review(review_data):
-    """Simpan review customer dan berikan reward points"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        now_wib = datetime.now(WIB)
-        
-        # Simpan review
-        c.execute("""
-            INSERT INTO customer_reviews 
-            (secret_code, trans_id, trans_type, nopol, no_telp, nama_customer, rating, review_text, 
-             review_date, review_time, reward_points)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            review_data.get('secret_code', '').upper(),
-            review_data.get('trans_id'),
-            review_data.get('trans_type', 'kasir'),
-            review_data.get('nopol', ''),
-            review_data.get('no_telp', ''),
-            review_data.get('nama_customer', ''),
-            int(review_data.get('rating', 5)),
-            review_data.get('review_text', ''),
-            now_wib.strftime('%d-%m-%Y'),
-            now_wib.strftime('%H:%M:%S'),
-            10  # Default 10 points per review
-        ))
-        
-        # Update atau tambah customer points
-        identifier_nopol = review_data.get('nopol', '')
-        identifier_telp = review_data.get('no_telp', '')
-        
-        # Cek apakah customer sudah ada
-        c.execute("""
-            SELECT id, total_points FROM customer_points 
-            WHERE (nopol = ? AND nopol != '') OR (no_telp = ? AND no_telp != '')
-        """, (identifier_nopol, identifier_telp))
-        
-        existing = c.fetchone()
+    """Simpan review customer dan berikan reward points (event earn di ledger, transaksi yang sama)"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            now_wib = datetime.now(WIB)
+            secret_code = review_data.get('secret_code', '').upper()
+            identifier_nopol = review_data.get('nopol', '')
+            identifier_telp = review_data.get('no_telp', '')
+            # Transaksi tanpa nopol & no. telepon tidak punya akun poin
+            reward_points = REVIEW_REWARD_POINTS if points_customer_key(identifier_nopol, identifier_telp) else 0
         
-        if existing:
-            # Update points yang ada
-            new_total = existing[1] + 10
-            c.execute("""
-                UPDATE customer_points 
-                SET total_points = ?, last_updated = ?
-                WHERE id = ?
-            """, (new_total, now_wib.strftime('%d-%m-%Y %H:%M:%S'), existing[0]))
-        else:
-            # Insert customer baru
+            # Simpan review
             c.execute("""
-                INSERT INTO customer_points (nopol, no_telp, nama_customer, total_points, last_updated)
-                VALUES (?, ?, ?, ?, ?)
+                INSERT INTO customer_reviews 
+                (secret_code, trans_id, trans_type, nopol, no_telp, nama_customer, rating, review_text, 
+                 review_date, review_time, reward_points)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
+                secret_code,
+                review_data.get('trans_id'),
+                review_data.get('trans_type', 'kasir'),
                 identifier_nopol,
                 identifier_telp,
                 review_data.get('nama_customer', ''),
-                10,
-                now_wib.strftime('%d-%m-%Y %H:%M:%S')
+                int(review_data.get('rating', 5)),
+                review_data.get('review_text', ''),
+                now_wib.strftime('%d-%m-%Y'),
+                now_wib.strftime('%H:%M:%S'),
+                reward_points
             ))
         
-        conn.commit()
-        return True, "Review berhasil disimpan! Anda mendapat 10 poin reward 🎉"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
-
+            if reward_points:
+                # Index unik (source, ref_id) menolak reward kedua untuk kode yang sama
+                _record_points(c, 'earn', reward_points, identifier_nopol, identifier_telp,
+                               review_data.get('nama_customer', ''), source='review', ref_id=secret_code,
+                               keterangan=f"Review transaksi {secret_code}", created_by='customer')
+        
+            conn.commit()
+            invalidate_tables('customer_reviews', 'customer_points', 'points_ledger')
+            if not reward_points:
+                return True, "Review berhasil disimpan! Terima kasih 🎉"
+            return True, f"Review berhasil disimpan! Anda mendapat {reward_points} poin reward 🎉"
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            # Hanya index unik (source, ref_id) di ledger yang berarti kode sudah pernah dipakai
+            if 'points_ledger.source' in str(e):
+                return False, "Kode transaksi ini sudah pernah digunakan untuk review"
+            return False, f"Error: {str(e)}"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
+
+def add_points_event(event_type, points, nopol='', no_telp='', nama_customer='', keterangan='', created_by=''):
+    """Tukar poin (redeem, poin dikurangi) atau koreksi manual (adjust, poin bertanda) untuk satu customer"""
+    if event_type == 'redeem':
+        points = -abs(int(points))
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            if event_type not in ('redeem', 'adjust') or not points:
+                return False, "Jenis event harus redeem/adjust dengan jumlah poin bukan nol"
+            balance = _record_points(c, event_type, int(points), nopol, no_telp, nama_customer,
+                                     source='manual', keterangan=keterangan, created_by=created_by)
+            conn.commit()
+            invalidate_tables('customer_points', 'points_ledger')
+            return True, f"Poin berhasil dicatat ({points:+d}), saldo sekarang {balance} poin"
+        except ValueError as e:
+            conn.rollback()
+            return False, str(e)
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
+
+@cached_query('customer_reviews')
 def get_all_reviews():
     """Ambil semua review customer"""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql("SELECT * FROM customer_reviews ORDER BY review_date DESC, review_time DESC", conn)
-    conn.close()
+    with db_connection() as conn:
+        df = pd.read_sql("SELECT * FROM customer_reviews ORDER BY review_date DESC, review_time DESC", conn)
     return df
 
+CUSTOMER_POINTS_COLUMNS = ['id', 'nopol', 'no_telp', 'nama_customer', 'total_points', 'last_updated']
+# Jumlah customer di leaderboard poin
+POINTS_LEADERBOARD_SIZE = 50
+
+@cached_query('customer_points')
 def get_customer_points_by_identifier(nopol=None, no_telp=None):
-    """Ambil poin customer berdasarkan nopol atau no_telp"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    if nopol:
-        c.execute("SELECT * FROM customer_points WHERE nopol = ?", (nopol,))
-    elif no_telp:
-        c.execute("SELECT * FROM customer_points WHERE no_telp = ?", (no_telp,))
-    else:
-        conn.close()
+    """Ambil poin customer berdasarkan nopol atau no_telp (lookup customer_key ber-index)"""
+    key = points_customer_key(nopol, no_telp)
+    if key is None:
         return None
-    
-    result = c.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"SELECT {', '.join(CUSTOMER_POINTS_COLUMNS)} FROM customer_points WHERE customer_key = ?", (key,))
+        result = c.fetchone()
     if result:
-        columns = ['id', 'nopol', 'no_telp', 'nama_customer', 'total_points', 'last_updated']
-        return dict(zip(columns, result))
+        return dict(zip(CUSTOMER_POINTS_COLUMNS, result))
     return None
 
-def get_all_customer_points():
-    """Ambil semua data poin customer"""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql("SELECT * FROM customer_points ORDER BY total_points DESC", conn)
-    conn.close()
+@cached_query('customer_points')
+def get_all_customer_points(limit=POINTS_LEADERBOARD_SIZE):
+    """Leaderboard poin: `limit` customer dengan poin terbanyak (None = semua), dibaca urut dari index"""
+    with db_connection() as conn:
+        df = pd.read_sql(f"""
+            SELECT {', '.join(CUSTOMER_POINTS_COLUMNS)} FROM customer_points
+            ORDER BY total_points DESC, id DESC
+            LIMIT ?
+        """, conn, params=(-1 if limit is None else limit,))
     return df
 
+@cached_query('customer_points')
+def get_customer_points_summary():
+    """Jumlah customer berpoin, total & rata-rata poin (agregat SQL)"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*), COALESCE(SUM(total_points), 0), COALESCE(AVG(total_points), 0) FROM customer_points")
+        jumlah, total, rata_rata = c.fetchone()
+    return {'jumlah': jumlah, 'total': total, 'rata_rata': rata_rata}
+
+@cached_query('points_ledger')
+def get_points_ledger(nopol=None, no_telp=None, limit=PAGE_SIZE):
+    """Riwayat event poin satu customer, terbaru di depan"""
+    key = points_customer_key(nopol, no_telp)
+    with db_connection() as conn:
+        df = pd.read_sql("""
+            SELECT event_type, points, balance_after, source, keterangan, created_at, created_by
+            FROM points_ledger
+            WHERE customer_key = ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, conn, params=(key, limit))
+    return df
 
 
 USERS = {
@@ -2142,11 +4000,10 @@ USERS = {
 # --- User Management Functions ---
 def get_user_from_db(username):
     """Ambil user dari database"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE username = ?", (username.lower(),))
-    result = c.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM users WHERE username = ?", (username.lower(),))
+        result = c.fetchone()
     if result:
         return {
             'id': result[0],
@@ -2159,106 +4016,471 @@ def get_user_from_db(username):
         }
     return None
 
+@cached_query('users')
 def get_all_users():
     """Ambil semua users"""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql("SELECT id, username, role, created_at, created_by, last_login FROM users ORDER BY created_at DESC", conn)
-    conn.close()
+    with db_connection() as conn:
+        df = pd.read_sql("SELECT id, username, role, created_at, created_by, last_login FROM users ORDER BY created_at DESC", conn)
     return df
 
 def add_user(username, password, role, created_by):
     """Tambah user baru"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    now_wib = datetime.now(WIB)
-    try:
-        c.execute("""
-            INSERT INTO users (username, password, role, created_at, created_by, last_login)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (username.lower(), password, role, now_wib.strftime("%d-%m-%Y %H:%M:%S"), created_by, None))
-        conn.commit()
-        return True, "User berhasil ditambahkan"
-    except sqlite3.IntegrityError:
-        return False, "Username sudah terdaftar"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        now_wib = datetime.now(WIB)
+        try:
+            c.execute("""
+                INSERT INTO users (username, password, role, created_at, created_by, last_login)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (username.lower(), password, role, now_wib.strftime("%d-%m-%Y %H:%M:%S"), created_by, None))
+            conn.commit()
+            invalidate_tables('users')
+            return True, "User berhasil ditambahkan"
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return False, "Username sudah terdaftar"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
 
 def update_user(username, password=None, role=None):
     """Update user"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        if password and role:
-            c.execute("UPDATE users SET password = ?, role = ? WHERE username = ?",
-                     (password, role, username.lower()))
-        elif password:
-            c.execute("UPDATE users SET password = ? WHERE username = ?",
-                     (password, username.lower()))
-        elif role:
-            c.execute("UPDATE users SET role = ? WHERE username = ?",
-                     (role, username.lower()))
-        conn.commit()
-        return True, "User berhasil diupdate"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            if password and role:
+                c.execute("UPDATE users SET password = ?, role = ? WHERE username = ?",
+                         (password, role, username.lower()))
+            elif password:
+                c.execute("UPDATE users SET password = ? WHERE username = ?",
+                         (password, username.lower()))
+            elif role:
+                c.execute("UPDATE users SET role = ? WHERE username = ?",
+                         (role, username.lower()))
+            conn.commit()
+            invalidate_tables('users')
+            return True, "User berhasil diupdate"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
 
 def delete_user(username):
     """Hapus user"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        c.execute("DELETE FROM users WHERE username = ?", (username.lower(),))
-        conn.commit()
-        return True, "User berhasil dihapus"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("DELETE FROM users WHERE username = ?", (username.lower(),))
+            conn.commit()
+            invalidate_tables('users')
+            return True, "User berhasil dihapus"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
 
 def update_last_login(username):
     """Update last login timestamp"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    now_wib = datetime.now(WIB)
-    c.execute("UPDATE users SET last_login = ? WHERE username = ?",
-             (now_wib.strftime("%d-%m-%Y %H:%M:%S"), username.lower()))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        now_wib = datetime.now(WIB)
+        c.execute("UPDATE users SET last_login = ? WHERE username = ?",
+                 (now_wib.strftime("%d-%m-%Y %H:%M:%S"), username.lower()))
+        conn.commit()
+        invalidate_tables('users')
 
 # --- Audit Trail Helper ---
+# add_audit() hanya memasukkan event ke antrian memori. Thread latar menulis antrian ke
+# SQLite dalam satu transaksi executemany saat jumlahnya mencapai batas atau interval
+# habis, sehingga klik user tidak menunggu write lock + fsync. Sisa antrian selalu
+# di-flush saat proses berhenti (atexit) dan sebelum audit trail dibaca.
+AUDIT_FLUSH_BATCH_SIZE = 50
+AUDIT_FLUSH_INTERVAL_SECONDS = 2.0
+audit_logger = logging.getLogger("car_wash.audit")
+
+
+class AuditWriter:
+    """Penulis audit trail ter-buffer: antrian di memori, di-flush per batch oleh thread latar"""
+
+    def __init__(self, batch_size=AUDIT_FLUSH_BATCH_SIZE, interval=AUDIT_FLUSH_INTERVAL_SECONDS):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, db_name, row):
+        """Masukkan satu event (timestamp, user, action, detail) ke antrian"""
+        with self._lock:
+            if self._stopped:
+                pending = False
+            else:
+                self._pending.append((db_name, row))
+                pending = len(self._pending)
+        if pending is False:
+            # Writer sudah berhenti (proses sedang shutdown): tulis langsung
+            self._write(db_name, [row])
+        elif pending >= self.batch_size:
+            self._wakeup.set()
+
+    def pending_count(self):
+        """Jumlah event yang belum ditulis ke database"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Tulis semua event di antrian sekarang juga (dipanggil thread latar, pembaca, dan atexit)"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            by_db = OrderedDict()
+            for db_name, row in batch:
+                by_db.setdefault(db_name, []).append(row)
+            for db_name, rows in by_db.items():
+                try:
+                    self._write(db_name, rows)
+                except sqlite3.Error as e:
+                    # Simpan kembali agar dicoba lagi pada flush berikutnya
+                    with self._lock:
+                        self._pending[:0] = [(db_name, row) for row in rows]
+                    audit_logger.error("Audit trail gagal ditulis (%d event, dicoba lagi): %s", len(rows), e)
+            return len(batch)
+
+    def _write(self, db_name, rows):
+        """Satu transaksi executemany untuk semua event milik satu database"""
+        # Pragma sama dengan koneksi aplikasi (WAL, synchronous, busy_timeout); kembali ke pool jika DB aktif
+        conn = _open_connection(db_name)
+        try:
+            with conn:
+                conn.executemany("""
+                    INSERT INTO audit_trail (timestamp, user, action, detail)
+                    VALUES (?, ?, ?, ?)
+                """, rows)
+        finally:
+            conn.close()
+        invalidate_tables('audit_trail')
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Hentikan thread latar lalu flush sisa antrian"""
+        with self._lock:
+            self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+
+@st.cache_resource(show_spinner=False)
+def get_audit_writer():
+    """Satu AuditWriter per proses, bertahan antar rerun Streamlit"""
+    writer = AuditWriter()
+    atexit.register(writer.close)
+    return writer
+
+
 def add_audit(action, detail=None):
     """Simpan audit trail ke database SQLite agar persisten dan bisa dilihat semua user"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
     # Gunakan timezone WIB (GMT+7)
     now_wib = datetime.now(WIB)
-    c.execute("""
-        INSERT INTO audit_trail (timestamp, user, action, detail)
-        VALUES (?, ?, ?, ?)
-    """, (
+    get_audit_writer().add(DB_NAME, (
         now_wib.strftime("%d-%m-%Y %H:%M:%S"),
         st.session_state.get("login_user", "-"),
         action,
         detail or ""
     ))
-    conn.commit()
-    conn.close()
 
-def load_audit_trail(user=None):
-    """Load audit trail dari database. Jika user specified, filter by user."""
-    conn = sqlite3.connect(DB_NAME)
-    if user:
-        query = "SELECT * FROM audit_trail WHERE user = ? ORDER BY timestamp DESC"
-        df = pd.read_sql(query, conn, params=(user,))
+def flush_audit():
+    """Tulis semua audit trail yang masih di antrian ke database"""
+    return get_audit_writer().flush()
+
+def load_audit_trail(user=None):
+    """Load audit trail dari database. Jika user specified, filter by user."""
+    # Event yang masih di antrian ditulis dulu agar pembaca selalu melihat data terbaru
+    flush_audit()
+    return _load_audit_trail(user)
+
+@cached_query('audit_trail')
+def _load_audit_trail(user=None):
+    """Query audit trail (hasil di-cache sampai ada event baru yang di-flush)"""
+    with db_connection() as conn:
+        if user:
+            query = "SELECT * FROM audit_trail WHERE user = ? ORDER BY timestamp_iso DESC, id DESC"
+            df = pd.read_sql(query, conn, params=(user,))
+        else:
+            query = "SELECT * FROM audit_trail ORDER BY timestamp_iso DESC, id DESC"
+            df = pd.read_sql(query, conn)
+    return df
+
+AUDIT_PAGE_SIZE = 50
+
+def _audit_filter_sql(users=None, search=None, start_date=None, end_date=None):
+    """Bangun sumber FROM + klausa WHERE filter audit trail (user, kata kunci, rentang tanggal)"""
+    source = "audit_trail"
+    clauses = ["1 = 1"]
+    params = []
+    if users:
+        clauses.append(f"user IN ({', '.join('?' * len(users))})")
+        params.extend(users)
+    if start_date:
+        clauses.append("timestamp_iso >= ?")
+        params.append(to_iso_date(start_date))
+    if end_date:
+        # Batas atas eksklusif: awal hari setelah end_date
+        clauses.append("timestamp_iso < ?")
+        params.append(to_iso_date(end_date + timedelta(days=1)))
+    if search:
+        fts_source = fts_match_source('audit_trail', search, ['action', 'detail'])
+        if fts_source:
+            source = fts_source[0]
+            params = fts_source[1] + params
+        else:
+            clauses.append("(action LIKE ? OR detail LIKE ?)")
+            params.extend([f"%{search.strip()}%"] * 2)
+    return source, clauses, params
+
+@cached_query('audit_trail')
+def get_audit_trail_page(users=None, search=None, start_date=None, end_date=None,
+                         offset=0, page_size=AUDIT_PAGE_SIZE):
+    """Satu halaman audit trail terbaru sesuai filter, return (DataFrame, offset berikutnya atau None)"""
+    source, clauses, params = _audit_filter_sql(users, search, start_date, end_date)
+    query = f"""
+        SELECT audit_trail.timestamp, audit_trail.user, audit_trail.action, audit_trail.detail
+        FROM {source}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY timestamp_iso DESC, audit_trail.id DESC
+        LIMIT ? OFFSET ?
+    """
+    with db_connection() as conn:
+        df = pd.read_sql(query, conn, params=(*params, page_size + 1, offset))
+    if len(df) > page_size:
+        return df.head(page_size), offset + page_size
+    return df, None
+
+@cached_query('audit_trail')
+def get_audit_trail_stats(users=None, search=None, start_date=None, end_date=None):
+    """Statistik audit trail sesuai filter: total, jumlah user & action unik, jumlah per action"""
+    source, clauses, params = _audit_filter_sql(users, search, start_date, end_date)
+    with db_connection() as conn:
+        df = pd.read_sql(f"""
+            SELECT audit_trail.user AS user, audit_trail.action AS action, COUNT(*) AS jumlah
+            FROM {source}
+            WHERE {' AND '.join(clauses)}
+            GROUP BY audit_trail.user, audit_trail.action
+        """, conn, params=params)
+    per_action = df.groupby('action')['jumlah'].sum().sort_values(ascending=False)
+    return {
+        'total': int(df['jumlah'].sum()),
+        'unique_users': df['user'].nunique(),
+        'unique_actions': df['action'].nunique(),
+        'per_action': per_action.reset_index(),
+    }
+
+@cached_query('audit_trail')
+def get_audit_users():
+    """Daftar user yang pernah tercatat di audit trail"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT DISTINCT user FROM audit_trail WHERE user IS NOT NULL ORDER BY user")
+        users = [row[0] for row in c.fetchall()]
+    return users
+
+@cached_query('audit_trail')
+def get_audit_date_bounds():
+    """Tanggal audit trail paling awal & paling akhir, atau (None, None) jika kosong"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT MIN(timestamp_iso), MAX(timestamp_iso) FROM audit_trail")
+        first, last = c.fetchone()
+    if not first:
+        return None, None
+    return date.fromisoformat(first[:10]), date.fromisoformat(last[:10])
+
+# --- Excel Export ---
+# File Excel dibuat hanya saat tombol download diklik (data callable di st.download_button).
+# Workbook write-only openpyxl menulis baris satu per satu ke file sementara di disk, dan
+# data laporan dibaca dari SQL per chunk, sehingga memori tetap kecil walau datanya besar.
+# Kolom uang disimpan sebagai angka dengan number format Rupiah (bisa di-SUM di Excel).
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXCEL_RUPIAH_FORMAT = '"Rp "#,##0;-"Rp "#,##0;"-"'
+EXPORT_CHUNK_SIZE = 1000
+
+def iter_query_rows(query, params=(), chunk_size=EXPORT_CHUNK_SIZE):
+    """Generator baris hasil query, diambil dari SQLite per chunk (fetchmany)"""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(query, params)
+        while True:
+            rows = c.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+
+def _write_excel_sheet(workbook, title, headers, rows, money_headers=()):
+    """Tulis satu sheet write-only: header tebal lalu baris data, kolom uang dengan format Rupiah"""
+    ws = workbook.create_sheet(title[:31])
+    for idx, header in enumerate(headers, start=1):
+        # Lebar kolom harus diatur sebelum baris pertama ditulis (mode write-only)
+        ws.column_dimensions[get_column_letter(idx)].width = max(12, len(str(header)) + 4)
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True)
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    money_idx = {headers.index(h) for h in money_headers}
+
+    def money_cell(value):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.number_format = EXCEL_RUPIAH_FORMAT
+        return cell
+
+    for row in rows:
+        ws.append([money_cell(value) if idx in money_idx else value for idx, value in enumerate(row)])
+
+def build_excel(sheets):
+    """Buat file Excel dari list sheet (judul, header, baris, header kolom uang), return file siap dibaca"""
+    workbook = Workbook(write_only=True)
+    for title, headers, rows, money_headers in sheets:
+        _write_excel_sheet(workbook, title, headers, rows, money_headers)
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+def export_customers_excel(search=None, sort_by='registered', min_spend=0, min_visits=0):
+    """Excel daftar customer + statistik kunjungan & belanja (filter sama dengan halaman Customer), dibaca dari SQL per chunk"""
+    clauses, params = [], []
+    if search:
+        # Semua customer yang cocok (halaman hanya menampilkan SEARCH_LIMIT teratas)
+        fts_source = fts_match_source('customers', search)
+        if fts_source:
+            source, params = fts_source
+        else:
+            source = "customers"
+            clauses.append("(" + " OR ".join(f"customers.{col} LIKE ?" for col in FTS_INDEXES['customers'][1]) + ")")
+            params = [f"%{search.strip()}%"] * len(FTS_INDEXES['customers'][1])
+        source += " LEFT JOIN customer_stats s ON s.nopol = customers.nopol"
+        order = "customers.id DESC"
+    elif sort_by == 'registered':
+        source = "customers LEFT JOIN customer_stats s ON s.nopol = customers.nopol"
+        order = "customers.id DESC"
     else:
-        query = "SELECT * FROM audit_trail ORDER BY timestamp DESC"
-        df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+        source = "customer_stats s LEFT JOIN customers ON customers.nopol = s.nopol"
+        order = f"{CUSTOMER_STATS_SORTS[sort_by]} DESC, s.nopol DESC"
+    if min_spend:
+        clauses.append("(s.total_wash + s.total_coffee) >= ?")
+        params.append(min_spend)
+    if min_visits:
+        clauses.append("s.visits >= ?")
+        params.append(min_visits)
+    rows = iter_query_rows(f"""
+        SELECT COALESCE(customers.nopol, s.nopol), customers.nama_customer, customers.no_telp,
+               COALESCE(s.visits, 0), s.last_visit, COALESCE(s.total_wash + s.total_coffee, 0),
+               COALESCE((s.total_wash + s.total_coffee) / s.visits, 0), customers.created_at
+        FROM {source}
+        {'WHERE ' + ' AND '.join(clauses) if clauses else ''}
+        ORDER BY {order}
+    """, params)
+    headers = ['🔖 Nopol', '👤 Nama', '📞 Telepon', '🔁 Kunjungan', '🕒 Terakhir', '💰 Total Belanja', '🧾 Rata-rata',
+               '📅 Terdaftar']
+    return build_excel([('Customer List', headers, rows, ('💰 Total Belanja', '🧾 Rata-rata'))])
+
+# Sheet laporan transaksi: (header, header kolom uang, kolom SQL, sumber data).
+# Sumber berisi {kasir}/{coffee} = "FROM ... WHERE tanggal_iso BETWEEN ? AND ?"; kolom SQL
+# bernama agar filter tab laporan bisa diterapkan di luar UNION.
+TRANSACTION_REPORT_SHEETS = {
+    'Cuci Mobil': (
+        ['📅 Tanggal', '⏰ Waktu', '🚗 Nopol', '👤 Customer', '📦 Paket', '💰 Harga', '💳 Pembayaran', '👨‍💼 Kasir'],
+        ['💰 Harga'],
+        "tanggal, waktu, nopol, customer, paket, harga, metode, kasir",
+        """SELECT tanggal, waktu, tanggal_iso, nopol, nama_customer AS customer, paket_cuci AS paket,
+                  harga_cuci AS harga, metode_bayar AS metode, created_by AS kasir
+           {kasir} AND harga_cuci > 0 AND harga_coffee = 0""",
+    ),
+    'Coffee Shop': (
+        ['📅 Tanggal', '⏰ Waktu', '👤 Customer', '☕ Items', '💰 Total', '👨‍💼 Kasir', '📍 Sumber'],
+        ['💰 Total'],
+        "tanggal, waktu, customer, items, total, kasir, sumber",
+        """SELECT tanggal, waktu, tanggal_iso, COALESCE(nama_customer, 'Walk-in') AS customer,
+                  COALESCE({items_sql}, items) AS items, total, created_by AS kasir, 'Coffee Shop' AS sumber
+           {coffee}
+           UNION ALL
+           SELECT tanggal, waktu, tanggal_iso, nama_customer, COALESCE({kasir_items_sql}, '-'), harga_coffee,
+                  created_by, 'Kasir'
+           {kasir} AND harga_cuci = 0 AND harga_coffee > 0""",
+    ),
+    'Combo Cuci+Coffee': (
+        ['📅 Tanggal', '⏰ Waktu', '🚗 Nopol', '👤 Customer', '📦 Paket', '🚗 Cuci', '☕ Coffee',
+         '💰 Total', '💳 Pembayaran', '👨‍💼 Kasir'],
+        ['🚗 Cuci', '☕ Coffee', '💰 Total'],
+        "tanggal, waktu, nopol, customer, paket, cuci, coffee, total, metode, kasir",
+        """SELECT tanggal, waktu, tanggal_iso, nopol, nama_customer AS customer, paket_cuci AS paket,
+                  harga_cuci AS cuci, harga_coffee AS coffee, total_bayar AS total, metode_bayar AS metode,
+                  created_by AS kasir
+           {kasir} AND harga_cuci > 0 AND harga_coffee > 0""",
+    ),
+    'Semua Transaksi': (
+        ['📅 Tanggal', '⏰ Waktu', '🚗 Nopol', '👤 Customer', '🔖 Jenis', '📝 Detail', '🚗 Cuci', '☕ Coffee',
+         '💰 Total', '💳 Pembayaran', '👨‍💼 Kasir'],
+        ['🚗 Cuci', '☕ Coffee', '💰 Total'],
+        "tanggal, waktu, nopol, customer, jenis, detail, cuci, coffee, total, metode, kasir",
+        """SELECT tanggal, waktu, tanggal_iso, nopol, nama_customer AS customer,
+                  CASE WHEN harga_cuci > 0 AND harga_coffee > 0 THEN 'Cuci + Coffee'
+                       WHEN harga_cuci > 0 THEN 'Cuci'
+                       WHEN harga_coffee > 0 THEN 'Coffee' ELSE '' END AS jenis,
+                  COALESCE(paket_cuci, '-') AS detail, harga_cuci AS cuci, harga_coffee AS coffee,
+                  total_bayar AS total, COALESCE(metode_bayar, '-') AS metode, COALESCE(created_by, '-') AS kasir
+           {kasir}
+           UNION ALL
+           SELECT tanggal, waktu, tanggal_iso, '-', COALESCE(nama_customer, 'Walk-in'), 'Coffee', 'Standalone',
+                  0, total, total, 'Tunai', COALESCE(created_by, '-')
+           {coffee}""",
+    ),
+}
+
+def transaction_report_sheet(sheet, start_date, end_date, search=None, equals=None):
+    """Satu sheet laporan transaksi (judul, header, baris SQL per chunk, kolom uang) untuk build_excel"""
+    # Filter tab Laporan: `search` {kolom / tuple kolom: teks} pakai LIKE, `equals` {kolom: nilai} sama persis
+    headers, money_headers, columns, source = TRANSACTION_REPORT_SHEETS[sheet]
+    period = (to_iso_date(start_date), to_iso_date(end_date))
+    source = source.format(kasir="FROM kasir_transactions WHERE tanggal_iso BETWEEN ? AND ?",
+                           coffee="FROM coffee_sales WHERE tanggal_iso BETWEEN ? AND ?",
+                           items_sql=sale_items_text_sql(), kasir_items_sql=kasir_items_text_sql())
+    params = list(period * source.count("BETWEEN ? AND ?"))
+    clauses = []
+    for cols, text in (search or {}).items():
+        if text:
+            cols = (cols,) if isinstance(cols, str) else cols
+            clauses.append("(" + " OR ".join(f"{col} LIKE ?" for col in cols) + ")")
+            params.extend([f"%{text.strip()}%"] * len(cols))
+    for col, value in (equals or {}).items():
+        clauses.append(f"{col} = ?")
+        params.append(value)
+    rows = iter_query_rows(f"""
+        SELECT {columns} FROM ({source})
+        {'WHERE ' + ' AND '.join(clauses) if clauses else ''}
+        ORDER BY tanggal_iso DESC, waktu DESC
+    """, params)
+    return sheet, headers, rows, money_headers
+
+def export_transaction_sheet(sheet, start_date, end_date, search=None, equals=None):
+    """Excel satu sheet laporan transaksi (dengan filter tab), data dibaca dari SQL per chunk"""
+    return build_excel([transaction_report_sheet(sheet, start_date, end_date, search, equals)])
+
+def export_transaction_pack(start_date, end_date):
+    """Excel multi-sheet laporan transaksi periode (Cuci Mobil, Coffee Shop, Combo, Semua Transaksi)"""
+    return build_excel([transaction_report_sheet(sheet, start_date, end_date) for sheet in TRANSACTION_REPORT_SHEETS])
+
 
 def login_page():
     st.set_page_config(page_title="TIME AUTOCARE - Review & Login", layout="centered")
@@ -2353,11 +4575,10 @@ def login_page():
             # Cek apakah sudah pernah review
             if check_review_exists(secret_code_input):
                 # Ambil data review yang sudah ada
-                conn = sqlite3.connect(DB_NAME)
-                c = conn.cursor()
-                c.execute("SELECT * FROM customer_reviews WHERE secret_code = ?", (secret_code_input,))
-                review = c.fetchone()
-                conn.close()
+                with db_connection() as conn:
+                    c = conn.cursor()
+                    c.execute("SELECT * FROM customer_reviews WHERE secret_code = ?", (secret_code_input,))
+                    review = c.fetchone()
                 
                 if review:
                     st.session_state['existing_review'] = {
@@ -2682,12 +4903,6 @@ def dashboard_page(role):
     </div>
     ''', unsafe_allow_html=True)
     
-    # Load data transaksi
-    df_trans = get_all_transactions()
-    df_cust = get_all_customers()
-    df_coffee = get_all_coffee_sales()
-    df_kasir = get_all_kasir_transactions()
-    
     # Filter tanggal - default hari ini
     today = datetime.now(WIB).date()
     
@@ -2707,53 +4922,46 @@ def dashboard_page(role):
         if date_filter != st.session_state.dashboard_date_filter:
             st.session_state.dashboard_date_filter = date_filter
     
-    # Apply filter
-    if isinstance(date_filter, (list, tuple)) and len(date_filter) == 2:
-        start_date = date_filter[0].strftime('%d-%m-%Y')
-        end_date = date_filter[1].strftime('%d-%m-%Y')
-        df_filtered = get_transactions_by_date_range(start_date, end_date)
-        
-        # Filter coffee sales by date range
-        df_coffee_filtered = df_coffee[
-            (pd.to_datetime(df_coffee['tanggal'], format='%d-%m-%Y', errors='coerce') >= pd.to_datetime(start_date, format='%d-%m-%Y')) &
-            (pd.to_datetime(df_coffee['tanggal'], format='%d-%m-%Y', errors='coerce') <= pd.to_datetime(end_date, format='%d-%m-%Y'))
-        ]
-        
-        # Filter kasir transactions by date range
-        df_kasir_filtered = df_kasir[
-            (pd.to_datetime(df_kasir['tanggal'], format='%d-%m-%Y', errors='coerce') >= pd.to_datetime(start_date, format='%d-%m-%Y')) &
-            (pd.to_datetime(df_kasir['tanggal'], format='%d-%m-%Y', errors='coerce') <= pd.to_datetime(end_date, format='%d-%m-%Y'))
-        ]
+    # Apply filter - saat range baru dipilih sebagian, pakai tanggal awal saja
+    if isinstance(date_filter, (list, tuple)):
+        start_date = date_filter[0] if date_filter else today
+        end_date = date_filter[1] if len(date_filter) == 2 else start_date
     else:
-        df_filtered = df_trans
-        df_coffee_filtered = df_coffee
-        df_kasir_filtered = df_kasir
+        start_date = end_date = date_filter
+    
+    # Load data transaksi hanya untuk periode terpilih, kolom yang dipakai saja
+    df_filtered = get_transactions_by_date_range(
+        start_date, end_date,
+        columns=['id', 'tanggal', 'nopol', 'nama_customer', 'paket_cuci', 'harga', 'status', 'created_by']
+    )
+    # Total pendapatan per line dari rollup daily_revenue
+    revenue = get_revenue_summary(start_date, end_date)
     
     # Hitung statistik cuci mobil (yang belum masuk kasir)
-    total_transaksi_wash = len(df_filtered)
-    total_pendapatan_wash = df_filtered['harga'].sum() if not df_filtered.empty else 0
+    total_transaksi_wash = revenue['wash']['jumlah_transaksi']
+    total_pendapatan_wash = revenue['wash']['total']
     transaksi_selesai = len(df_filtered[df_filtered['status'] == 'Selesai'])
     transaksi_proses = len(df_filtered[df_filtered['status'] == 'Dalam Proses'])
     
     # Hitung statistik kasir (transaksi gabungan)
-    total_transaksi_kasir = len(df_kasir_filtered)
-    total_pendapatan_kasir = df_kasir_filtered['total_bayar'].sum() if not df_kasir_filtered.empty else 0
-    pendapatan_kasir_wash = df_kasir_filtered['harga_cuci'].sum() if not df_kasir_filtered.empty else 0
-    pendapatan_kasir_coffee = df_kasir_filtered['harga_coffee'].sum() if not df_kasir_filtered.empty else 0
+    total_transaksi_kasir = revenue['kasir']['jumlah_transaksi']
+    total_pendapatan_kasir = revenue['kasir']['total']
+    pendapatan_kasir_wash = revenue['kasir']['total_cuci']
+    pendapatan_kasir_coffee = revenue['kasir']['total_coffee']
     
     # Hitung statistik coffee shop - gabungan dari coffee_sales dan kasir_transactions
     # Coffee dari tabel coffee_sales saja (bukan dari kasir)
-    total_transaksi_coffee_only = len(df_coffee_filtered)
-    total_pendapatan_coffee_only = df_coffee_filtered['total'].sum() if not df_coffee_filtered.empty else 0
+    total_transaksi_coffee_only = revenue['coffee']['jumlah_transaksi']
+    total_pendapatan_coffee_only = revenue['coffee']['total']
     # Total semua pendapatan coffee (dari kasir + coffee only)
     total_pendapatan_coffee = pendapatan_kasir_coffee + total_pendapatan_coffee_only
-    total_transaksi_coffee = total_transaksi_coffee_only + len(df_kasir_filtered[df_kasir_filtered['harga_coffee'] > 0])
+    total_transaksi_coffee = total_transaksi_coffee_only + revenue['kasir']['jumlah_dengan_coffee']
     
     # Total keseluruhan (hitung semua pendapatan)
     # Note: cuci mobil yang sudah masuk kasir tidak dihitung lagi di total_pendapatan_wash
     total_pendapatan_gabungan = pendapatan_kasir_wash + total_pendapatan_coffee
     total_transaksi_gabungan = total_transaksi_kasir + total_transaksi_coffee_only
-    total_customer = len(df_cust)
+    total_customer = get_customer_count()
     
     # Cards
     st.markdown(f'''
@@ -3259,15 +5467,13 @@ def transaksi_page(role):
                     if (jenis_kendaraan != jenis_kendaraan_existing or 
                         merk_kendaraan != merk_kendaraan_existing or 
                         ukuran_mobil != ukuran_mobil_existing):
-                        conn = sqlite3.connect(DB_NAME)
-                        c = conn.cursor()
-                        c.execute("""
-                            UPDATE customers 
-                            SET jenis_kendaraan = ?, merk_kendaraan = ?, ukuran_mobil = ?
-                            WHERE nopol = ?
-                        """, (jenis_kendaraan, merk_kendaraan, ukuran_mobil, nopol_input.upper()))
-                        conn.commit()
-                        conn.close()
+                        with db_connection() as conn:
+                            conn.execute("""
+                                UPDATE customers 
+                                SET jenis_kendaraan = ?, merk_kendaraan = ?, ukuran_mobil = ?
+                                WHERE nopol = ?
+                            """, (jenis_kendaraan, merk_kendaraan, ukuran_mobil, nopol_input.upper()))
+                        invalidate_tables('customers')
                 
                 # Gunakan waktu sistem otomatis
                 now_wib = datetime.now(WIB)
@@ -3652,7 +5858,12 @@ Terima kasih atas kepercayaan Anda! 🙏
                 df_display = df_selesai[['id', 'tanggal', 'waktu_masuk', 'waktu_selesai', 'nopol', 'nama_customer', 'paket_cuci', 'harga']].copy()
                 df_display.insert(0, 'Pilih', False)  # Tambahkan kolom checkbox
                 df_display['harga'] = df_display['harga'].apply(lambda x: f"Rp {x:,.0f}")
-                df_display.columns = ['Pilih', 'ID', '📅 Tanggal', '⏰ Masuk', '⏰ Selesai', '🔖 Nopol', '👤 Customer', '📦 Paket', '💰 Harga']
+                # Statistik customer dibaca sekali untuk semua nopol di tabel (customer_stats)
+                history_stats = get_customer_stats_map(tuple(sorted(df_display['nopol'].dropna().unique())))
+                df_display['kunjungan'] = df_display['nopol'].map(lambda x: history_stats.get(x, {}).get('visits', 0))
+                df_display['belanja'] = df_display['nopol'].map(lambda x: f"Rp {history_stats.get(x, {}).get('total_spend', 0):,.0f}")
+                df_display.columns = ['Pilih', 'ID', '📅 Tanggal', '⏰ Masuk', '⏰ Selesai', '🔖 Nopol', '👤 Customer', '📦 Paket', '💰 Harga',
+                                      '🔁 Kunjungan', '💎 Total Belanja']
                 
                 # Tampilkan tabel dengan data editor untuk checkbox
                 edited_df_selesai = st.data_editor(
@@ -3666,7 +5877,8 @@ Terima kasih atas kepercayaan Anda! 🙏
                             default=False,
                         )
                     },
-                    disabled=["ID", "📅 Tanggal", "⏰ Masuk", "⏰ Selesai", "🔖 Nopol", "👤 Customer", "📦 Paket", "💰 Harga"],
+                    disabled=["ID", "📅 Tanggal", "⏰ Masuk", "⏰ Selesai", "🔖 Nopol", "👤 Customer", "📦 Paket", "💰 Harga",
+                              "🔁 Kunjungan", "💎 Total Belanja"],
                     key="history_table_editor"
                 )
                 
@@ -3713,6 +5925,14 @@ Terima kasih atas kepercayaan Anda! 🙏
                             st.write(f"🕐 Masuk: {selected_hist['waktu_masuk']}")
                             st.write(f"🕐 Selesai: {selected_hist['waktu_selesai']}")
                             st.write(f"👤 Oleh: {selected_hist['created_by']}")
+                            
+                            cust_stats = history_stats.get(selected_hist['nopol'])
+                            if cust_stats:
+                                st.markdown("**📈 Riwayat Customer**")
+                                st.write(f"🔁 Kunjungan: {cust_stats['visits']}x "
+                                         f"({format_date(parse_date(cust_stats['first_visit']))} - {format_date(parse_date(cust_stats['last_visit']))})")
+                                st.write(f"💎 Total Belanja: Rp {cust_stats['total_spend']:,.0f}")
+                                st.write(f"🧾 Rata-rata: Rp {cust_stats['avg_ticket']:,.0f} / kunjungan")
                         
                         with col3:
                             st.markdown("**✅ Checklist & QC**")
@@ -3799,17 +6019,16 @@ Terima kasih atas kepercayaan Anda! 🙏
         </div>
         """, unsafe_allow_html=True)
         
-        df_all_trans = get_all_transactions()
+        search_trans_edit = st.text_input("🔍 Cari Nopol / Nama", key="search_trans_edit")
+        trans_edit_cursor = get_page_cursor("wash_edit", (search_trans_edit,))
+        df_editable, next_trans_edit_cursor = get_wash_transactions_page(trans_edit_cursor, search=search_trans_edit)
         
-        if df_all_trans.empty:
+        if df_editable.empty and not search_trans_edit:
             st.info("📭 Belum ada transaksi untuk diedit atau dihapus")
         else:
             st.warning("⚠️ Hanya dapat mengedit/menghapus transaksi yang belum masuk kasir")
             
-            # Filter only transactions not in kasir
-            df_editable = df_all_trans.copy()
-            
-            # Select transaction
+            # Select transaction (hanya dari halaman aktif)
             trans_options = {}
             for _, row in df_editable.iterrows():
                 label = f"ID:{row['id']} | {row['tanggal']} | {row['nopol']} - {row['nama_customer']} | {row['paket_cuci']} | {row['status']}"
@@ -3817,6 +6036,7 @@ Terima kasih atas kepercayaan Anda! 🙏
             
             if trans_options:
                 selected_trans = st.selectbox("Pilih Transaksi", list(trans_options.keys()), key="select_trans_edit")
+                render_pager("wash_edit", next_trans_edit_cursor)
                 
                 if selected_trans:
                     trans_data = trans_options[selected_trans]
@@ -3868,7 +6088,7 @@ Terima kasih atas kepercayaan Anda! 🙏
                             else:
                                 st.error(f"❌ {msg}")
             else:
-                st.info("📭 Semua transaksi sudah masuk kasir. Tidak ada yang bisa diedit.")
+                st.warning("⚠️ Tidak ada transaksi yang sesuai dengan pencarian")
     
     with tab5:
         # Setting Paket Cuci
@@ -4133,10 +6353,9 @@ def kasir_page(role):
     st.markdown('<div class="kasir-header"><h2>💰 KASIR</h2><p>Pusat Transaksi - Cuci Mobil & Coffee Shop</p></div>', unsafe_allow_html=True)
 
     # Hitung jumlah transaksi untuk badge
-    df_sales_check = get_all_coffee_sales()
-    df_kasir_check = get_all_kasir_transactions()
-    jumlah_history_coffee = len(df_sales_check)
-    jumlah_history_kasir = len(df_kasir_check)
+    revenue_all = get_revenue_summary(date(1900, 1, 1), date(9999, 12, 31))
+    jumlah_history_coffee = revenue_all['coffee']['jumlah_transaksi'] or 0
+    jumlah_history_kasir = revenue_all['kasir']['jumlah_transaksi'] or 0
     
     # Ambil transaksi cuci mobil yang pending pembayaran (status 'Dalam Proses' atau 'Selesai')
     df_pending = get_pending_wash_transactions()
@@ -4451,16 +6670,7 @@ def kasir_page(role):
                 if not df_sales.empty:
                     st.success(f"📊 **{len(df_sales)} transaksi** ditemukan")
                     
-                    # parse items for display
-                    def items_str(js):
-                        try:
-                            arr = json.loads(js)
-                            return '\n'.join([f"{i['qty']}x {i['name']} (Rp {i['price']:,.0f})" for i in arr])
-                        except:
-                            return js
-
-                    df_sales['Items Detail'] = df_sales['items'].apply(items_str)
-                    df_disp = df_sales[['tanggal', 'waktu', 'Items Detail', 'total', 'created_by']].copy()
+                    df_disp = df_sales[['tanggal', 'waktu', 'items_text', 'total', 'created_by']].copy()
                     df_disp.columns = ['📅 Tanggal', '⏰ Waktu', '☕️ Items', '💰 Total', '👤 Kasir']
                     df_disp['💰 Total'] = df_disp['💰 Total'].apply(lambda x: f"Rp {x:,.0f}")
                     
@@ -4484,102 +6694,106 @@ def kasir_page(role):
         st.subheader('📜 History Transaksi Kasir')
         st.info("💡 Riwayat transaksi gabungan (cuci mobil + coffee) yang diproses di kasir")
         
-        df_kasir = get_all_kasir_transactions()
-        if df_kasir.empty:
-            st.info('📭 Belum ada transaksi kasir tersimpan')
+        # Filter pencarian (diproses di SQL, hasil ditampilkan per halaman)
+        col1, col2, col3 = st.columns([2, 2, 1])
+        with col1:
+            search_date_kasir = st.text_input("🔍 Cari Tanggal", placeholder="dd-mm-yyyy", key="search_kasir_date")
+        with col2:
+            search_nopol_kasir = st.text_input("🔍 Cari Nopol / Nama", key="search_kasir_nopol")
+        
+        summary_kasir = get_kasir_history_summary(search_nopol_kasir, search_date_kasir)
+        if summary_kasir['jumlah'] == 0:
+            if search_date_kasir or search_nopol_kasir:
+                st.warning("⚠️ Tidak ada transaksi yang sesuai dengan pencarian")
+            else:
+                st.info('📭 Belum ada transaksi kasir tersimpan')
         else:
-            # Filter pencarian
-            col1, col2, col3 = st.columns([2, 2, 1])
-            with col1:
-                search_date_kasir = st.text_input("🔍 Cari Tanggal", placeholder="dd-mm-yyyy", key="search_kasir_date")
-            with col2:
-                search_nopol_kasir = st.text_input("🔍 Cari Nopol", key="search_kasir_nopol")
+            st.success(f"📊 **{summary_kasir['jumlah']} transaksi** ditemukan")
+            if summary_kasir['arsip']:
+                st.caption("ℹ️ Jumlah & total termasuk transaksi yang sudah diarsip; daftar di bawah hanya menampilkan data aktif")
             
-            # Apply filter
-            if search_date_kasir:
-                df_kasir = df_kasir[df_kasir['tanggal'].str.contains(search_date_kasir, case=False, na=False)]
-            if search_nopol_kasir:
-                df_kasir = df_kasir[df_kasir['nopol'].str.contains(search_nopol_kasir, case=False, na=False)]
+            kasir_cursor = get_page_cursor("kasir_history", (search_date_kasir, search_nopol_kasir))
+            df_kasir, next_kasir_cursor = get_kasir_transactions_page(
+                kasir_cursor, search=search_nopol_kasir, search_date=search_date_kasir
+            )
+            if df_kasir.empty:
+                st.info("🗄️ Transaksi pada pencarian ini sudah dipindah ke arsip")
             
-            if not df_kasir.empty:
-                st.success(f"📊 **{len(df_kasir)} transaksi** ditemukan")
-                
-                # Display detailed
-                for idx, row in df_kasir.iterrows():
-                    with st.expander(f"💳 {row['tanggal']} | {row['nopol']} - {row['nama_customer']} | Total: Rp {row['total_bayar']:,.0f}"):
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            st.write("**Data Customer:**")
-                            st.write(f"Nopol: {row['nopol']}")
-                            st.write(f"Nama: {row['nama_customer']}")
-                            st.write(f"Telp: {row.get('no_telp', '-')}")
-                        with col2:
-                            st.write("**Detail Transaksi:**")
-                            st.write(f"Tanggal: {row['tanggal']}")
-                            st.write(f"Waktu: {row['waktu']}")
-                            st.write(f"Kasir: {row.get('created_by', '-')}")
-                        with col3:
-                            st.write("**Pembayaran:**")
-                            st.write(f"Metode: {row.get('metode_bayar', '-')}")
-                            st.write(f"Status: {row.get('status_bayar', '-')}")
-                        
-                        st.markdown("---")
-                        
-                        # Detail biaya
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            if row.get('paket_cuci') and row.get('harga_cuci', 0) > 0:
-                                st.metric("🚗 Cuci Mobil", f"Rp {row['harga_cuci']:,.0f}")
-                                st.caption(f"Paket: {row['paket_cuci']}")
-                        with col2:
-                            if row.get('coffee_items') and row.get('harga_coffee', 0) > 0:
-                                st.metric("☕️ Coffee/Snack", f"Rp {row['harga_coffee']:,.0f}")
-                                try:
-                                    items = json.loads(row['coffee_items'])
-                                    items_text = ", ".join([f"{i['qty']}x {i['name']}" for i in items])
-                                    st.caption(items_text)
-                                except:
-                                    pass
-                        with col3:
-                            st.metric("💰 TOTAL", f"Rp {row['total_bayar']:,.0f}")
-                        
-                        if row.get('catatan'):
-                            st.info(f"📝 Catatan: {row['catatan']}")
-                
-                # Statistik ringkas
-                st.markdown("---")
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    total_kasir = df_kasir['total_bayar'].sum()
-                    st.metric("💰 Total Penjualan", f"Rp {total_kasir:,.0f}")
-                with col2:
-                    st.metric("📊 Jumlah Transaksi", len(df_kasir))
-                with col3:
-                    avg_kasir = total_kasir / len(df_kasir) if len(df_kasir) > 0 else 0
-                    st.metric("📈 Rata-rata", f"Rp {avg_kasir:,.0f}")
-                with col4:
-                    total_cuci = df_kasir['harga_cuci'].sum()
-                    total_coffee = df_kasir['harga_coffee'].sum()
-                    st.metric("🚗 Total Cuci", f"Rp {total_cuci:,.0f}")
-            else:
-                st.warning("⚠️ Tidak ada transaksi yang sesuai dengan pencarian")
+            # Display detailed
+            for idx, row in df_kasir.iterrows():
+                with st.expander(f"💳 {row['tanggal']} | {row['nopol']} - {row['nama_customer']} | Total: Rp {row['total_bayar']:,.0f}"):
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.write("**Data Customer:**")
+                        st.write(f"Nopol: {row['nopol']}")
+                        st.write(f"Nama: {row['nama_customer']}")
+                        st.write(f"Telp: {row.get('no_telp', '-')}")
+                    with col2:
+                        st.write("**Detail Transaksi:**")
+                        st.write(f"Tanggal: {row['tanggal']}")
+                        st.write(f"Waktu: {row['waktu']}")
+                        st.write(f"Kasir: {row.get('created_by', '-')}")
+                    with col3:
+                        st.write("**Pembayaran:**")
+                        st.write(f"Metode: {row.get('metode_bayar', '-')}")
+                        st.write(f"Status: {row.get('status_bayar', '-')}")
+                    
+                    st.markdown("---")
+                    
+                    # Detail biaya
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        if row.get('paket_cuci') and row.get('harga_cuci', 0) > 0:
+                            st.metric("🚗 Cuci Mobil", f"Rp {row['harga_cuci']:,.0f}")
+                            st.caption(f"Paket: {row['paket_cuci']}")
+                    with col2:
+                        if row.get('coffee_items') and row.get('harga_coffee', 0) > 0:
+                            st.metric("☕️ Coffee/Snack", f"Rp {row['harga_coffee']:,.0f}")
+                            if row['items_text']:
+                                st.caption(row['items_text'])
+                    with col3:
+                        st.metric("💰 TOTAL", f"Rp {row['total_bayar']:,.0f}")
+                    
+                    if row.get('catatan'):
+                        st.info(f"📝 Catatan: {row['catatan']}")
+            
+            render_pager("kasir_history", next_kasir_cursor)
+            
+            # Statistik ringkas
+            st.markdown("---")
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("💰 Total Penjualan", f"Rp {summary_kasir['total']:,.0f}")
+            with col2:
+                st.metric("📊 Jumlah Transaksi", summary_kasir['jumlah'])
+            with col3:
+                avg_kasir = summary_kasir['total'] / summary_kasir['jumlah']
+                st.metric("📈 Rata-rata", f"Rp {avg_kasir:,.0f}")
+            with col4:
+                st.metric("🚗 Total Cuci", f"Rp {summary_kasir['total_cuci']:,.0f}")
     
     with tab4:
         st.subheader("✏️ Edit / Hapus Transaksi Kasir")
         st.warning("⚠️ Hati-hati saat menghapus transaksi! Data yang dihapus tidak dapat dikembalikan.")
         
-        df_kasir_all = get_all_kasir_transactions()
+        search_kasir_edit = st.text_input("🔍 Cari Nopol / Nama", key="search_kasir_edit")
+        kasir_edit_cursor = get_page_cursor("kasir_edit", (search_kasir_edit,))
+        df_kasir_page, next_kasir_edit_cursor = get_kasir_transactions_page(kasir_edit_cursor, search=search_kasir_edit)
         
-        if df_kasir_all.empty:
-            st.info("📭 Belum ada transaksi kasir untuk diedit atau dihapus")
+        if df_kasir_page.empty:
+            if search_kasir_edit:
+                st.warning("⚠️ Tidak ada transaksi yang sesuai dengan pencarian")
+            else:
+                st.info("📭 Belum ada transaksi kasir untuk diedit atau dihapus")
         else:
-            # Select transaction
+            # Select transaction (hanya dari halaman aktif)
             trans_options = {}
-            for _, row in df_kasir_all.iterrows():
+            for _, row in df_kasir_page.iterrows():
                 label = f"ID:{row['id']} | {row['tanggal']} {row['waktu']} | {row['nopol']} - {row['nama_customer']} | Total: Rp {row['total_bayar']:,.0f}"
                 trans_options[label] = row
             
             selected_trans = st.selectbox("Pilih Transaksi Kasir", list(trans_options.keys()), key="select_kasir_trans_edit")
+            render_pager("kasir_edit", next_kasir_edit_cursor)
             
             if selected_trans:
                 trans_data = trans_options[selected_trans]
@@ -4741,35 +6955,60 @@ def customer_page(role):
     tab1, tab2, tab3 = st.tabs(["📋 Daftar Customer", "➕ Tambah Customer Baru", "✏️ Edit/Hapus Customer"])
     
     with tab1:
-        df_cust = get_all_customers()
+        total_customer = get_customer_count()
         
-        if df_cust.empty:
+        if total_customer == 0:
             st.info("📭 Belum ada customer terdaftar. Silakan tambah customer baru di tab sebelah →")
         else:
             # Search dengan UI lebih baik
             col1, col2 = st.columns([3, 1])
             with col1:
                 search = st.text_input("🔍 Cari customer", key="cust_search", 
-                                      placeholder="Ketik nopol atau nama customer...",
+                                      placeholder="Ketik nopol, nama, atau no. telepon customer...",
                                       label_visibility="collapsed")
             with col2:
-                st.metric("📊 Total Customer", len(df_cust))
+                st.metric("📊 Total Customer", total_customer)
             
+            next_cursor = None
             if search:
-                mask = df_cust['nopol'].str.contains(search, case=False, na=False) | \
-                       df_cust['nama_customer'].str.contains(search, case=False, na=False)
-                df_display = df_cust[mask]
-                if not df_display.empty:
+                # Pencarian langsung di SQLite (index FTS), hasil terurut relevansi
+                df_display = search_records('customers', search)
+                if len(df_display) >= SEARCH_LIMIT:
+                    st.success(f"✅ Menampilkan {SEARCH_LIMIT} customer paling relevan")
+                elif not df_display.empty:
                     st.success(f"✅ Ditemukan {len(df_display)} customer")
                 else:
                     st.warning("⚠️ Tidak ada customer yang cocok dengan pencarian")
+                if not df_display.empty:
+                    stats = get_customer_stats_map(tuple(df_display['nopol']))
+                    df_stats = pd.DataFrame([stats.get(nopol, {}) for nopol in df_display['nopol']],
+                                            columns=['visits', 'last_visit', 'total_spend', 'avg_ticket'])
+                    df_display = pd.concat([df_display.reset_index(drop=True), df_stats], axis=1)
             else:
-                df_display = df_cust
+                # Urut & filter per nilai dari customer_stats, dimuat per halaman
+                col_sort, col_spend, col_visits = st.columns([2, 1, 1])
+                with col_sort:
+                    sort_label = st.selectbox("Urutkan", list(CUSTOMER_SORT_OPTIONS), key="cust_sort")
+                with col_spend:
+                    min_spend = st.number_input("Min. total belanja (Rp)", min_value=0, value=0, step=50000, key="cust_min_spend")
+                with col_visits:
+                    min_visits = st.number_input("Min. kunjungan", min_value=0, value=0, step=1, key="cust_min_visits")
+                filters = (CUSTOMER_SORT_OPTIONS[sort_label], int(min_spend), int(min_visits))
+                cust_cursor = get_page_cursor("customers", filters)
+                df_display, next_cursor = get_customer_stats_page(*filters, cust_cursor)
+                if df_display.empty:
+                    st.warning("⚠️ Tidak ada customer yang sesuai filter")
             
             if not df_display.empty:
                 # Display dengan styling lebih baik
-                df_show = df_display[['nopol', 'nama_customer', 'no_telp', 'created_at']].copy()
-                df_show.columns = ['🔖 Nopol', '👤 Nama', '📞 Telepon', '📅 Terdaftar']
+                df_show = df_display[['nopol', 'nama_customer', 'no_telp', 'visits', 'last_visit',
+                                      'total_spend', 'avg_ticket', 'created_at']].copy()
+                # Customer yang belum pernah transaksi tidak punya baris statistik
+                for col in ['visits', 'total_spend', 'avg_ticket']:
+                    df_show[col] = df_show[col].fillna(0).astype(int)
+                df_show['last_visit'] = df_show['last_visit'].apply(lambda x: format_date(parse_date(x)) or '-')
+                df_show.columns = ['🔖 Nopol', '👤 Nama', '📞 Telepon', '🔁 Kunjungan', '🕒 Terakhir',
+                                   '💰 Total Belanja', '🧾 Rata-rata', '📅 Terdaftar']
                 
                 st.dataframe(
                     df_show,
@@ -4779,25 +7018,28 @@ def customer_page(role):
                         "🔖 Nopol": st.column_config.TextColumn(width="small"),
                         "👤 Nama": st.column_config.TextColumn(width="medium"),
                         "📞 Telepon": st.column_config.TextColumn(width="medium"),
+                        "🔁 Kunjungan": st.column_config.NumberColumn(width="small"),
+                        "💰 Total Belanja": st.column_config.NumberColumn(format="Rp %d"),
+                        "🧾 Rata-rata": st.column_config.NumberColumn(format="Rp %d"),
                         "📅 Terdaftar": st.column_config.TextColumn(width="small")
                     }
                 )
+                if not search:
+                    render_pager("customers", next_cursor)
                 
                 # Download Excel
                 col1, col2, col3 = st.columns([2, 1, 2])
                 with col2:
-                    # Create Excel file in memory
-                    from io import BytesIO
-                    buffer = BytesIO()
-                    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                        df_show.to_excel(writer, index=False, sheet_name='Customer List')
-                    buffer.seek(0)
-                    
+                    # File Excel baru dibuat saat tombol diklik
+                    if search:
+                        export_data = functools.partial(export_customers_excel, search)
+                    else:
+                        export_data = functools.partial(export_customers_excel, None, *filters)
                     st.download_button(
                         "📥 Download Excel", 
-                        data=buffer, 
+                        data=export_data, 
                         file_name=f"customer_list_{datetime.now(WIB).strftime('%d%m%Y')}.xlsx", 
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        mime=EXCEL_MIME,
                         use_container_width=True
                     )
     
@@ -4988,11 +7230,10 @@ def laporan_page(role):
     </div>
     ''', unsafe_allow_html=True)
     
-    # Load data
-    df_trans = get_all_transactions()
-    df_coffee = get_all_coffee_sales()
+    # Tahun yang tersedia diambil dari rollup pendapatan harian
+    all_years = get_revenue_years()
     
-    if df_trans.empty and df_coffee.empty:
+    if not all_years:
         st.info("📭 Belum ada data transaksi")
         return
     
@@ -5000,21 +7241,6 @@ def laporan_page(role):
     st.markdown('<div class="filter-section">', unsafe_allow_html=True)
     col1, col2, col3 = st.columns([1, 1, 2])
     
-    # Parse tanggal untuk wash
-    df_trans['tanggal_dt'] = pd.to_datetime(df_trans['tanggal'], format='%d-%m-%Y', errors='coerce')
-    df_trans['bulan'] = df_trans['tanggal_dt'].dt.month
-    df_trans['tahun'] = df_trans['tanggal_dt'].dt.year
-    
-    # Parse tanggal untuk coffee
-    df_coffee['tanggal_dt'] = pd.to_datetime(df_coffee['tanggal'], format='%d-%m-%Y', errors='coerce')
-    df_coffee['bulan'] = df_coffee['tanggal_dt'].dt.month
-    df_coffee['tahun'] = df_coffee['tanggal_dt'].dt.year
-    
-    # Get available years
-    years_trans = df_trans['tahun'].dropna().unique() if not df_trans.empty else []
-    years_coffee = df_coffee['tahun'].dropna().unique() if not df_coffee.empty else []
-    all_years = sorted(set(list(years_trans) + list(years_coffee)), reverse=True)
-    
     with col1:
         selected_year = st.selectbox("📅 Tahun", options=all_years, key="lap_year")
     
@@ -5025,15 +7251,18 @@ def laporan_page(role):
                                      format_func=lambda x: month_names[x], key="lap_month")
     st.markdown('</div>', unsafe_allow_html=True)
     
-    # Filter data wash
-    df_wash_filtered = df_trans[df_trans['tahun'] == selected_year].copy() if not df_trans.empty else pd.DataFrame()
-    if selected_month != 0 and not df_wash_filtered.empty:
-        df_wash_filtered = df_wash_filtered[df_wash_filtered['bulan'] == selected_month]
+    # Rentang tanggal periode terpilih
+    if selected_month != 0:
+        periode_awal = date(selected_year, selected_month, 1)
+        periode_akhir = date(selected_year, selected_month, calendar.monthrange(selected_year, selected_month)[1])
+    else:
+        periode_awal = date(selected_year, 1, 1)
+        periode_akhir = date(selected_year, 12, 31)
     
-    # Filter data coffee
-    df_coffee_filtered = df_coffee[df_coffee['tahun'] == selected_year].copy() if not df_coffee.empty else pd.DataFrame()
-    if selected_month != 0 and not df_coffee_filtered.empty:
-        df_coffee_filtered = df_coffee_filtered[df_coffee_filtered['bulan'] == selected_month]
+    # Load data wash & coffee periode terpilih (filter di SQL), total dari rollup
+    df_wash_filtered = get_transactions_by_date_range(periode_awal, periode_akhir)
+    df_coffee_filtered = get_coffee_sales_by_date_range(periode_awal, periode_akhir)
+    revenue = get_revenue_summary(periode_awal, periode_akhir)
     
     # Control Panel untuk Adjustment
     with st.expander("⚙️ Control Panel - Adjustment Laporan Keuangan", expanded=False):
@@ -5099,13 +7328,13 @@ def laporan_page(role):
     adjustment_coffee = coffee_percentage / 100 if 'coffee_percentage' in locals() else 1.0
     
     # Hitung statistik dengan adjustment
-    total_pendapatan_wash_actual = df_wash_filtered['harga'].sum() if not df_wash_filtered.empty else 0
+    total_pendapatan_wash_actual = revenue['wash']['total']
     total_pendapatan_wash = total_pendapatan_wash_actual * adjustment_wash
-    total_transaksi_wash = len(df_wash_filtered)
+    total_transaksi_wash = revenue['wash']['jumlah_transaksi']
     
-    total_pendapatan_coffee_actual = df_coffee_filtered['total'].sum() if not df_coffee_filtered.empty else 0
+    total_pendapatan_coffee_actual = revenue['coffee']['total']
     total_pendapatan_coffee = total_pendapatan_coffee_actual * adjustment_coffee
-    total_transaksi_coffee = len(df_coffee_filtered)
+    total_transaksi_coffee = revenue['coffee']['jumlah_transaksi']
     
     total_pendapatan_gabungan = total_pendapatan_wash + total_pendapatan_coffee
     total_transaksi_gabungan = total_transaksi_wash + total_transaksi_coffee
@@ -5254,78 +7483,47 @@ def laporan_page(role):
             with col3:
                 st.metric("📊 Rata-rata/Transaksi", f"Rp {avg_coffee:,.0f}")
             
-            # Analisis item terjual
+            # Analisis item terjual (agregasi di SQL dari sale_items)
             st.markdown("**☕ Item Terlaris**")
-            all_items = []
-            for items_str in df_coffee_filtered['items']:
-                try:
-                    items = json.loads(items_str)
-                    for item in items:
-                        all_items.append(item)
-                except:
-                    pass
-            
-            if all_items:
-                items_df = pd.DataFrame(all_items)
-                
-                # Deteksi nama kolom dengan helper function
-                def get_column(df, possible_names):
-                    for name in possible_names:
-                        if name in df.columns:
-                            return name
-                    return None
-                
-                name_col = get_column(items_df, ['nama', 'name', 'item'])
-                qty_col = get_column(items_df, ['qty', 'quantity', 'jumlah'])
-                total_col = get_column(items_df, ['subtotal', 'total', 'harga'])
-                
-                if not name_col:
-                    st.warning("⚠️ Struktur data items tidak sesuai. Kolom yang tersedia: " + ", ".join(items_df.columns.tolist()))
-                elif not qty_col or not total_col:
-                    st.warning("⚠️ Data items tidak memiliki kolom qty atau subtotal yang diperlukan")
-                else:
-                    # Apply adjustment to items
-                    items_df[total_col] = items_df[total_col] * adjustment_coffee
-                    
-                    items_summary = items_df.groupby(name_col).agg(
-                        Jumlah=(qty_col, 'sum'),
-                        Total_Pendapatan=(total_col, 'sum')
-                    ).reset_index()
-                    items_summary.columns = ['Item', 'Qty Terjual', 'Total Pendapatan']
-                    items_summary = items_summary.sort_values('Total Pendapatan', ascending=False)
-                    
-                    # Add percentage
-                    items_summary['% Kontribusi'] = (items_summary['Total Pendapatan'] / items_summary['Total Pendapatan'].sum() * 100).round(1)
-                    
-                    # Format
-                    df_display = items_summary.copy()
-                    df_display['Total Pendapatan'] = df_display['Total Pendapatan'].apply(lambda x: f"Rp {x:,.0f}")
-                    df_display['% Kontribusi'] = df_display['% Kontribusi'].apply(lambda x: f"{x}%")
-                    
-                    st.dataframe(df_display, use_container_width=True, hide_index=True)
-                    
-                    st.divider()
-                    # Grafik
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.markdown("**📊 Qty Terjual (Top 10)**")
-                        top_items = items_summary.head(10)
-                        chart = alt.Chart(top_items).mark_bar(cornerRadiusEnd=8).encode(
-                            x=alt.X('Qty Terjual:Q', title='Quantity'),
-                            y=alt.Y('Item:N', sort='-x', title=''),
-                            color=alt.Color('Qty Terjual:Q', scale=alt.Scale(scheme='oranges'), legend=None),
-                            tooltip=['Item:N', 'Qty Terjual:Q']
-                        ).properties(height=320)
-                        st.altair_chart(chart, use_container_width=True)
-                    
-                    with col2:
-                        st.markdown("**💰 Pendapatan per Item**")
-                        pie = alt.Chart(top_items).mark_arc(innerRadius=50).encode(
-                            theta='Total Pendapatan:Q',
-                            color=alt.Color('Item:N', scale=alt.Scale(scheme='oranges'), legend=alt.Legend(orient='bottom')),
-                            tooltip=['Item:N', alt.Tooltip('Total Pendapatan:Q', format=',.0f')]
-                        ).properties(height=320)
-                        st.altair_chart(pie, use_container_width=True)
+            items_summary = get_sale_item_summary(periode_awal, periode_akhir)
+            
+            if not items_summary.empty:
+                items_summary = items_summary[['Item', 'Qty Terjual', 'Total Pendapatan']].copy()
+                # Apply adjustment to items
+                items_summary['Total Pendapatan'] = items_summary['Total Pendapatan'] * adjustment_coffee
+                
+                # Add percentage
+                items_summary['% Kontribusi'] = (items_summary['Total Pendapatan'] / items_summary['Total Pendapatan'].sum() * 100).round(1)
+                
+                # Format
+                df_display = items_summary.copy()
+                df_display['Total Pendapatan'] = df_display['Total Pendapatan'].apply(lambda x: f"Rp {x:,.0f}")
+                df_display['% Kontribusi'] = df_display['% Kontribusi'].apply(lambda x: f"{x}%")
+                
+                st.dataframe(df_display, use_container_width=True, hide_index=True)
+                
+                st.divider()
+                # Grafik
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.markdown("**📊 Qty Terjual (Top 10)**")
+                    top_items = items_summary.head(10)
+                    chart = alt.Chart(top_items).mark_bar(cornerRadiusEnd=8).encode(
+                        x=alt.X('Qty Terjual:Q', title='Quantity'),
+                        y=alt.Y('Item:N', sort='-x', title=''),
+                        color=alt.Color('Qty Terjual:Q', scale=alt.Scale(scheme='oranges'), legend=None),
+                        tooltip=['Item:N', 'Qty Terjual:Q']
+                    ).properties(height=320)
+                    st.altair_chart(chart, use_container_width=True)
+                
+                with col2:
+                    st.markdown("**💰 Pendapatan per Item**")
+                    pie = alt.Chart(top_items).mark_arc(innerRadius=50).encode(
+                        theta='Total Pendapatan:Q',
+                        color=alt.Color('Item:N', scale=alt.Scale(scheme='oranges'), legend=alt.Legend(orient='bottom')),
+                        tooltip=['Item:N', alt.Tooltip('Total Pendapatan:Q', format=',.0f')]
+                    ).properties(height=320)
+                    st.altair_chart(pie, use_container_width=True)
             else:
                 st.info("📭 Tidak ada data item coffee untuk periode ini")
         else:
@@ -5418,42 +7616,22 @@ def laporan_page(role):
             # Tren harian
             st.markdown("**📅 Tren Pendapatan Harian**")
             
-            # Prepare daily data for wash dengan adjustment
-            df_wash_daily = df_wash_filtered.copy() if not df_wash_filtered.empty else pd.DataFrame()
-            if not df_wash_daily.empty:
-                df_wash_daily['harga'] = df_wash_daily['harga'] * adjustment_wash
-            
-            daily_wash = df_wash_daily.groupby('tanggal')['harga'].sum().reset_index() if not df_wash_daily.empty else pd.DataFrame()
-            if not daily_wash.empty:
-                daily_wash.columns = ['tanggal', 'wash']
-                daily_wash['tanggal_dt'] = pd.to_datetime(daily_wash['tanggal'], format='%d-%m-%Y')
-            
-            # Prepare daily data for coffee dengan adjustment
-            df_coffee_daily = df_coffee_filtered.copy() if not df_coffee_filtered.empty else pd.DataFrame()
-            if not df_coffee_daily.empty:
-                df_coffee_daily['total'] = df_coffee_daily['total'] * adjustment_coffee
-            
-            daily_coffee = df_coffee_daily.groupby('tanggal')['total'].sum().reset_index() if not df_coffee_daily.empty else pd.DataFrame()
-            if not daily_coffee.empty:
-                daily_coffee.columns = ['tanggal', 'coffee']
-                daily_coffee['tanggal_dt'] = pd.to_datetime(daily_coffee['tanggal'], format='%d-%m-%Y')
-            
-            # Merge data
-            if not daily_wash.empty or not daily_coffee.empty:
-                if not daily_wash.empty and not daily_coffee.empty:
-                    daily_combined = pd.merge(daily_wash, daily_coffee, on='tanggal_dt', how='outer', suffixes=('', '_coffee'))
-                    daily_combined['wash'] = daily_combined['wash'].fillna(0)
-                    daily_combined['coffee'] = daily_combined['coffee'].fillna(0)
-                    daily_combined['total'] = daily_combined['wash'] + daily_combined['coffee']
-                elif not daily_wash.empty:
-                    daily_combined = daily_wash.copy()
-                    daily_combined['coffee'] = 0
-                    daily_combined['total'] = daily_combined['wash']
-                else:
-                    daily_combined = daily_coffee.copy()
-                    daily_combined['wash'] = 0
-                    daily_combined['total'] = daily_combined['coffee']
-                
+            # Data harian wash & coffee langsung dari rollup daily_revenue
+            df_daily = get_daily_revenue(periode_awal, periode_akhir)
+            df_daily = df_daily[df_daily['line'].isin(['wash', 'coffee'])]
+            
+            if not df_daily.empty:
+                daily_combined = df_daily.pivot_table(index='tanggal_iso', columns='line', values='total',
+                                                      aggfunc='sum', fill_value=0).reset_index()
+                for line in ['wash', 'coffee']:
+                    if line not in daily_combined.columns:
+                        daily_combined[line] = 0
+                
+                # Apply adjustment
+                daily_combined['wash'] = daily_combined['wash'] * adjustment_wash
+                daily_combined['coffee'] = daily_combined['coffee'] * adjustment_coffee
+                daily_combined['total'] = daily_combined['wash'] + daily_combined['coffee']
+                daily_combined['tanggal_dt'] = pd.to_datetime(daily_combined['tanggal_iso'], format='%Y-%m-%d')
                 daily_combined = daily_combined.sort_values('tanggal_dt')
                 
                 # Create line chart
@@ -5508,20 +7686,8 @@ def laporan_page(role):
         </div>
         """, unsafe_allow_html=True)
         
-        # Filter data kasir_transactions berdasarkan periode yang dipilih
-        df_kasir = get_all_kasir_transactions()
-        
-        if not df_kasir.empty:
-            # Apply date filter
-            df_kasir['tanggal_dt'] = pd.to_datetime(df_kasir['tanggal'], format='%d-%m-%Y', errors='coerce')
-            df_kasir['bulan'] = df_kasir['tanggal_dt'].dt.month
-            df_kasir['tahun'] = df_kasir['tanggal_dt'].dt.year
-            
-            df_kasir_filtered = df_kasir[df_kasir['tahun'] == selected_year].copy()
-            if selected_month != 0:
-                df_kasir_filtered = df_kasir_filtered[df_kasir_filtered['bulan'] == selected_month]
-        else:
-            df_kasir_filtered = pd.DataFrame()
+        # Data kasir_transactions untuk periode yang dipilih (filter di SQL)
+        df_kasir_filtered = get_kasir_transactions_by_date_range(periode_awal, periode_akhir)
         
         if not df_kasir_filtered.empty or not df_coffee_filtered.empty:
             # Statistik Gabungan - Summary Cards
@@ -5574,6 +7740,16 @@ def laporan_page(role):
                 </div>
                 """.format(grand_total_all, count_wash_only + count_coffee_only + count_combo), unsafe_allow_html=True)
             
+            # Paket laporan periode: semua sheet dalam satu file, data dibaca dari SQL per chunk
+            periode_label = f"{month_names[selected_month]}_{selected_year}"
+            st.download_button(
+                label="📦 Download Paket Laporan Periode Ini (Excel, 4 sheet)",
+                data=functools.partial(export_transaction_pack, periode_awal, periode_akhir),
+                file_name=f"laporan_transaksi_{periode_label}.xlsx",
+                mime=EXCEL_MIME,
+                use_container_width=True,
+            )
+            
             st.divider()
             
             # Tab untuk memisahkan jenis laporan
@@ -5635,18 +7811,15 @@ def laporan_page(role):
                             
                             st.dataframe(df_show, use_container_width=True, hide_index=True, height=400)
                             
-                            # Download
-                            from io import BytesIO
-                            buffer = BytesIO()
-                            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                                df_show.to_excel(writer, index=False, sheet_name='Cuci Mobil')
-                            buffer.seek(0)
-                            
+                            # Download: filter yang sama dijalankan ulang di SQL saat tombol diklik
                             st.download_button(
                                 label="📥 Download Data Cuci Mobil (Excel)",
-                                data=buffer,
+                                data=functools.partial(
+                                    export_transaction_sheet, 'Cuci Mobil', periode_awal, periode_akhir,
+                                    {'nopol': search_wash_nopol, 'customer': search_wash_customer},
+                                    {'paket': search_wash_paket} if search_wash_paket != "Semua" else None),
                                 file_name=f"cuci_mobil_{month_names[selected_month]}_{selected_year}.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                mime=EXCEL_MIME,
                             )
                         else:
                             st.warning("🔍 Tidak ada data yang sesuai dengan filter")
@@ -5674,7 +7847,7 @@ def laporan_page(role):
                             'Tanggal': row['tanggal'],
                             'Waktu': row['waktu'],
                             'Customer': row.get('nama_customer', 'Walk-in'),
-                            'Items': row['items'],
+                            'Items': row['items_text'] or '-',
                             'Total': row['total'],
                             'Kasir': row.get('created_by', '-'),
                             'Sumber': 'Coffee Shop'
@@ -5688,7 +7861,7 @@ def laporan_page(role):
                             'Tanggal': row['tanggal'],
                             'Waktu': row['waktu'],
                             'Customer': row['nama_customer'],
-                            'Items': 'Coffee Items',
+                            'Items': row['items_text'] or '-',
                             'Total': row['harga_coffee'],
                             'Kasir': row.get('created_by', '-'),
                             'Sumber': 'Kasir'
@@ -5724,35 +7897,22 @@ def laporan_page(role):
                             avg_price = df_coffee_display['Total'].mean()
                             st.metric("📈 Rata-rata", f"Rp {avg_price:,.0f}")
                         
-                        # Parse items for display
-                        def parse_items(items_str):
-                            try:
-                                items = json.loads(items_str)
-                                return ', '.join([f"{i['qty']}x {i['name']}" for i in items])
-                            except:
-                                return str(items_str)
-                        
                         # Display table
                         df_show = df_coffee_display.copy()
-                        df_show['Items'] = df_show['Items'].apply(parse_items)
                         df_show['Total'] = df_show['Total'].apply(lambda x: f"Rp {x:,.0f}")
                         df_show.columns = ['📅 Tanggal', '⏰ Waktu', '👤 Customer', '☕ Items', 
                                           '💰 Total', '👨‍💼 Kasir', '📍 Sumber']
                         
                         st.dataframe(df_show, use_container_width=True, hide_index=True, height=400)
                         
-                        # Download
-                        from io import BytesIO
-                        buffer = BytesIO()
-                        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                            df_show.to_excel(writer, index=False, sheet_name='Coffee Shop')
-                        buffer.seek(0)
-                        
+                        # Download: filter yang sama dijalankan ulang di SQL saat tombol diklik
                         st.download_button(
                             label="📥 Download Data Coffee Shop (Excel)",
-                            data=buffer,
+                            data=functools.partial(
+                                export_transaction_sheet, 'Coffee Shop', periode_awal, periode_akhir,
+                                {'customer': search_coffee_cust, 'kasir': search_coffee_kasir}),
                             file_name=f"coffee_shop_{month_names[selected_month]}_{selected_year}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                            mime=EXCEL_MIME,
                         )
                     else:
                         st.warning("🔍 Tidak ada data yang sesuai dengan filter")
@@ -5820,18 +7980,15 @@ def laporan_page(role):
                             
                             st.dataframe(df_show, use_container_width=True, hide_index=True, height=400)
                             
-                            # Download
-                            from io import BytesIO
-                            buffer = BytesIO()
-                            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                                df_show.to_excel(writer, index=False, sheet_name='Combo Cuci+Coffee')
-                            buffer.seek(0)
-                            
+                            # Download: filter yang sama dijalankan ulang di SQL saat tombol diklik
                             st.download_button(
                                 label="📥 Download Data Combo (Excel)",
-                                data=buffer,
+                                data=functools.partial(
+                                    export_transaction_sheet, 'Combo Cuci+Coffee', periode_awal, periode_akhir,
+                                    {'nopol': search_combo_nopol, 'customer': search_combo_customer},
+                                    {'paket': search_combo_paket} if search_combo_paket != "Semua" else None),
                                 file_name=f"combo_cuci_coffee_{month_names[selected_month]}_{selected_year}.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                mime=EXCEL_MIME,
                             )
                         else:
                             st.warning("🔍 Tidak ada data yang sesuai dengan filter")
@@ -5945,9 +8102,10 @@ def laporan_page(role):
                         df_show_combined['Total'] = df_show_combined['Total'].apply(lambda x: f"Rp {x:,.0f}")
                         
                         # Reorder columns
-                        df_show_combined = df_show_combined[['Tanggal', 'Waktu', 'Nopol', 'Customer', 
-                                                              'Jenis', 'Detail', 'Cuci', 'Coffee', 'Total', 
-                                                              'Metode', 'Kasir']]
+                        df_show_combined_cols = ['Tanggal', 'Waktu', 'Nopol', 'Customer', 
+                                                 'Jenis', 'Detail', 'Cuci', 'Coffee', 'Total', 
+                                                 'Metode', 'Kasir']
+                        df_show_combined = df_show_combined[df_show_combined_cols]
                         
                         df_show_combined.columns = ['📅 Tanggal', '⏰ Waktu', '🚗 Nopol', '👤 Customer', 
                                                    '🔖 Jenis', '📝 Detail', '🚗 Cuci', '☕ Coffee', 
@@ -5955,18 +8113,15 @@ def laporan_page(role):
                         
                         st.dataframe(df_show_combined, use_container_width=True, hide_index=True, height=450)
                         
-                        # Download button for combined data
-                        from io import BytesIO
-                        buffer = BytesIO()
-                        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                            df_show_combined.to_excel(writer, index=False, sheet_name='Semua Transaksi')
-                        buffer.seek(0)
-                        
+                        # Download: filter yang sama dijalankan ulang di SQL saat tombol diklik
                         st.download_button(
                             label="📥 Download Semua Transaksi (Excel)",
-                            data=buffer,
+                            data=functools.partial(
+                                export_transaction_sheet, 'Semua Transaksi', periode_awal, periode_akhir,
+                                {('customer', 'nopol'): search_all_customer, 'kasir': search_all_kasir},
+                                {'jenis': search_all_jenis} if search_all_jenis != "Semua" else None),
                             file_name=f"semua_transaksi_{month_names[selected_month]}_{selected_year}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                            mime=EXCEL_MIME,
                         )
                     else:
                         st.warning("🔍 Tidak ada transaksi yang sesuai filter")
@@ -6099,25 +8254,23 @@ def setting_toko_page(role):
         st.warning("⚠️ **PERHATIAN:** Fitur ini hanya untuk Admin. Berhati-hatilah saat menggunakan fitur ini!")
         
         # Check database stats
-        conn = sqlite3.connect(DB_NAME)
-        c = conn.cursor()
-        
-        c.execute("SELECT COUNT(*) FROM customers")
-        customer_count = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) FROM wash_transactions")
-        wash_count = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) FROM kasir_transactions")
-        kasir_count = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) FROM employees")
-        employee_count = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) FROM customer_reviews")
-        review_count = c.fetchone()[0]
-        
-        conn.close()
+        with db_connection() as conn:
+            c = conn.cursor()
+            
+            c.execute("SELECT COUNT(*) FROM customers")
+            customer_count = c.fetchone()[0]
+            
+            c.execute("SELECT COUNT(*) FROM wash_transactions")
+            wash_count = c.fetchone()[0]
+            
+            c.execute("SELECT COUNT(*) FROM kasir_transactions")
+            kasir_count = c.fetchone()[0]
+            
+            c.execute("SELECT COUNT(*) FROM employees")
+            employee_count = c.fetchone()[0]
+            
+            c.execute("SELECT COUNT(*) FROM customer_reviews")
+            review_count = c.fetchone()[0]
         
         st.markdown("### 📊 Status Database Saat Ini")
         
@@ -6181,6 +8334,54 @@ def setting_toko_page(role):
                             st.error(f"❌ Error populate data: {msg_populate}")
                     else:
                         st.error(f"❌ Error reset database: {msg_reset}")
+            
+            st.markdown("---")
+            
+            st.markdown("### 📈 Rebuild Rollup Pendapatan")
+            st.info("""
+            Tabel ringkasan pendapatan harian (dipakai Dashboard & Laporan) di-update otomatis setiap transaksi.
+            Gunakan tombol ini jika angka laporan tidak sesuai dengan data transaksi.
+            """)
+            
+            if st.button("📈 Rebuild Rollup Pendapatan", use_container_width=True):
+                with st.spinner("🔄 Menghitung ulang pendapatan harian..."):
+                    success, msg = rebuild_daily_revenue()
+                if success:
+                    add_audit("rebuild_daily_revenue", msg)
+                    st.success(f"✅ {msg}")
+                else:
+                    st.error(f"❌ {msg}")
+            
+            st.markdown("---")
+            
+            st.markdown("### 📇 Rebuild Statistik Customer")
+            st.info("""
+            Statistik customer (kunjungan, kunjungan terakhir, total belanja) di-update otomatis setiap transaksi.
+            Gunakan tombol ini jika angka di daftar customer tidak sesuai dengan riwayat transaksi.
+            """)
+            
+            if st.button("📇 Rebuild Statistik Customer", use_container_width=True):
+                with st.spinner("🔄 Menghitung ulang statistik customer..."):
+                    success, msg = rebuild_customer_stats()
+                if success:
+                    add_audit("rebuild_customer_stats", msg)
+                    st.success(f"✅ {msg}")
+                else:
+                    st.error(f"❌ {msg}")
+            
+            st.markdown("---")
+            st.markdown("### 🧠 Cache Query")
+            cache_stats = get_query_cache_stats()
+            st.caption(f"{cache_stats['entries']} entri • {cache_stats['hits']:,} hit • {cache_stats['misses']:,} miss")
+            st.info("""
+            Hasil query disimpan di memori dan otomatis diperbarui setiap ada perubahan data dari aplikasi.
+            Kosongkan cache jika database diubah dari luar aplikasi (mis. script atau file database diganti).
+            """)
+            
+            if st.button("🧠 Kosongkan Cache Query", use_container_width=True):
+                invalidate_all_tables()
+                invalidate_settings_cache()
+                st.success("✅ Cache query dikosongkan")
         
         with col_b:
             st.markdown("### 💾 Backup Database")
@@ -6190,47 +8391,95 @@ def setting_toko_page(role):
             - File akan disimpan dengan timestamp
             """)
             
+            compress_backup = st.checkbox("Kompres backup (.gz)", value=True, key="backup_compress")
+            
             if st.button("💾 Backup Database", type="secondary", use_container_width=True):
-                import shutil
-                from datetime import datetime
-                
-                try:
-                    # Create backup filename with timestamp
-                    backup_time = datetime.now(WIB).strftime("%Y%m%d_%H%M%S")
-                    backup_filename = f"car_wash_backup_{backup_time}.db"
-                    
-                    # Copy database file
-                    shutil.copy2(DB_NAME, backup_filename)
-                    
+                progress_bar = st.progress(0.0, text="Menyalin database...")
+                success, result = create_backup(
+                    compress=compress_backup,
+                    progress=lambda done: progress_bar.progress(done, text=f"Menyalin database... {done:.0%}")
+                )
+                if success:
+                    backup_filename = os.path.basename(result)
                     st.success(f"✅ Backup berhasil dibuat: {backup_filename}")
                     add_audit("backup_database", f"Backup database: {backup_filename}")
-                    
-                    # Offer download
-                    with open(backup_filename, 'rb') as f:
+                else:
+                    st.error(f"❌ {result}")
+            
+            backups = list_backups()
+            if backups:
+                st.caption(f"{len(backups)} backup tersimpan (maksimal {BACKUP_KEEP}, backup lama otomatis dihapus)")
+                for backup in backups:
+                    col_name, col_download = st.columns([3, 1])
+                    with col_name:
+                        st.write(f"📄 {backup['name']} • {format_bytes(backup['size'])} • "
+                                 f"{backup['created'].strftime('%d-%m-%Y %H:%M')}")
+                    with col_download:
+                        if backup['size'] > BACKUP_DOWNLOAD_MAX_BYTES:
+                            st.caption("📁 Terlalu besar untuk browser", help=f"Ambil langsung dari server: {backup['path']}")
+                            continue
+                        # File baru dibaca saat tombol diklik, tidak dimuat ke memori setiap rerun
                         st.download_button(
-                            label="📥 Download Backup",
-                            data=f,
-                            file_name=backup_filename,
-                            mime="application/x-sqlite3"
+                            label="📥",
+                            data=functools.partial(read_backup_file, backup['path']),
+                            file_name=backup['name'],
+                            mime="application/gzip" if backup['name'].endswith('.gz') else "application/x-sqlite3",
+                            key=f"download_{backup['name']}"
                         )
-                except Exception as e:
-                    st.error(f"❌ Error backup database: {str(e)}")
             
             st.markdown("---")
             
             st.markdown("### 🧹 Hapus Data Lama")
             st.info("""
-            **Fitur ini akan menghapus:**
-            - Transaksi lebih dari X hari
+            **Fitur ini akan memindahkan ke database arsip:**
+            - Transaksi kasir lunas (beserta transaksi cucinya) & penjualan coffee lebih dari X hari
+            - Kas bon yang sudah lunas beserta pembayarannya
             - Review lama
             - Audit trail lama
             
-            *(Coming soon)*
+            Total pendapatan di Dashboard & Laporan tetap mencakup data yang diarsip.
             """)
             
             days_to_keep = st.number_input("Simpan data X hari terakhir", min_value=30, max_value=365, value=90)
             
-            st.button("🧹 Bersihkan Data Lama", type="secondary", use_container_width=True, disabled=True)
+            if st.button("🔍 Cek Data yang Akan Dibersihkan", use_container_width=True):
+                with st.spinner("🔄 Menghitung data lama..."):
+                    report = get_retention_report(days_to_keep)
+                df_report = pd.DataFrame(report['tables'])
+                st.caption(f"Data sebelum {report['cutoff']}")
+                if df_report['baris'].sum() > 0:
+                    df_report['ukuran'] = df_report['bytes'].apply(format_bytes)
+                    st.dataframe(df_report[['tabel', 'baris', 'ukuran']], use_container_width=True, hide_index=True)
+                st.info(f"📦 {int(df_report['baris'].sum()):,} baris (± {format_bytes(df_report['bytes'].sum())}) akan dipindah ke arsip. "
+                        f"Ruang kosong saat ini: {format_bytes(report['free_bytes'])}")
+            
+            confirm_cleanup = st.checkbox("Saya yakin ingin memindahkan data lama ke arsip", key="confirm_cleanup")
+            if st.button("🧹 Bersihkan Data Lama", type="secondary", use_container_width=True, disabled=not confirm_cleanup):
+                progress_bar = st.progress(0.0)
+                def show_progress(table, done, total):
+                    progress_bar.progress(done / total if total else 1.0, text=f"Arsip {table}: {done:,}/{total:,}")
+                with st.spinner("🔄 Memindahkan data lama ke arsip..."):
+                    success, msg = archive_old_data(days_to_keep, progress=show_progress)
+                if success:
+                    with st.spinner("🔄 Mengembalikan ruang kosong (VACUUM)..."):
+                        freed = incremental_vacuum()
+                    add_audit("cleanup_data_lama", msg)
+                    st.success(f"✅ {msg}. Ukuran database berkurang {format_bytes(freed)}")
+                else:
+                    st.error(f"❌ {msg}")
+
+            if not is_incremental_vacuum_enabled():
+                st.caption("Database ini belum memakai incremental vacuum: ruang bekas data arsip dipakai ulang, "
+                           "tapi ukuran file tidak berkurang. Aktifkan sekali saat aplikasi sepi "
+                           "(VACUUM penuh, database terkunci selama proses).")
+                if st.button("🗜️ Aktifkan Incremental Vacuum", use_container_width=True):
+                    with st.spinner("🔄 VACUUM penuh..."):
+                        success, msg = enable_incremental_vacuum()
+                    if success:
+                        add_audit("enable_incremental_vacuum", msg)
+                        st.success(f"✅ {msg}")
+                    else:
+                        st.error(f"❌ {msg}")
 
 def audit_trail_page():
     st.header("Audit Trail")
@@ -6242,63 +8491,57 @@ def audit_trail_page():
     else:
         st.info("Anda hanya dapat melihat aktivitas Anda sendiri.")
     
-    # Load audit trail dari database
-    df_audit = load_audit_trail()
+    # Event yang masih di antrian ditulis dulu; filter & paging dijalankan di SQL
+    flush_audit()
+    date_min, date_max = get_audit_date_bounds()
 
     # Filters
     c1, c2, c3 = st.columns([1,1,1.2])
-    all_users = sorted(df_audit['user'].dropna().unique().tolist()) if not df_audit.empty else []
     with c1:
         if role == "Supervisor":
+            all_users = get_audit_users()
             user_filter = st.multiselect("Filter User", options=all_users, default=all_users)
+            # Semua user terpilih sama dengan tanpa filter (tidak perlu IN list panjang)
+            if set(user_filter) == set(all_users):
+                user_filter = []
         else:
             user_filter = [uname]
             st.multiselect("Filter User", options=[uname], default=[uname], disabled=True)
     with c2:
         search = st.text_input("Cari kata kunci", placeholder="action/detail...")
     with c3:
-        if not df_audit.empty:
-            # Parse timestamps dengan format fleksibel (support format lama dan baru)
-            df_audit['timestamp_dt'] = pd.to_datetime(df_audit['timestamp'], format='mixed', dayfirst=True, errors='coerce')
-            date_min = df_audit['timestamp_dt'].min().date()
-            date_max = df_audit['timestamp_dt'].max().date()
-        else:
+        if date_min is None:
             date_min = date_max = datetime.now().date()
         date_range = st.date_input("Rentang tanggal", value=(date_min, date_max))
 
-    # Apply filters
-    if not df_audit.empty:
-        # timestamp_dt sudah di-parse di atas
-        
-        # Filter by user
-        if user_filter:
-            df_audit = df_audit[df_audit['user'].isin(user_filter)]
-        
-        # Filter by search keyword
-        if search:
-            mask = df_audit['action'].str.contains(search, case=False, na=False) | df_audit['detail'].str.contains(search, case=False, na=False)
-            df_audit = df_audit[mask]
-        
-        # Filter by date range
-        if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
-            start_d, end_d = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
-            df_audit = df_audit[(df_audit['timestamp_dt'] >= start_d) & (df_audit['timestamp_dt'] <= end_d + pd.Timedelta(days=1))]
-        
-        # Display results
-        df_display = df_audit.drop(columns=['timestamp_dt', 'id']).sort_values('timestamp', ascending=False)
-        st.dataframe(df_display, use_container_width=True)
-        
-        # Statistics
-        st.markdown("---")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Total Records", len(df_display))
-        with col2:
-            st.metric("Unique Users", df_display['user'].nunique())
-        with col3:
-            st.metric("Unique Actions", df_display['action'].nunique())
-    else:
+    if get_audit_date_bounds()[0] is None:
         st.info("Belum ada data audit trail.")
+        return
+
+    start_d = end_d = None
+    if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
+        start_d, end_d = date_range
+    filters = (tuple(user_filter), search.strip() or None, start_d, end_d)
+
+    audit_offset = get_page_cursor("audit_trail", filters) or 0
+    df_display, next_offset = get_audit_trail_page(*filters, offset=audit_offset)
+    stats = get_audit_trail_stats(*filters)
+
+    st.dataframe(df_display, use_container_width=True)
+    render_pager("audit_trail", next_offset)
+    
+    # Statistics
+    st.markdown("---")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Records", stats['total'])
+    with col2:
+        st.metric("Unique Users", stats['unique_users'])
+    with col3:
+        st.metric("Unique Actions", stats['unique_actions'])
+    if not stats['per_action'].empty:
+        with st.expander("📊 Jumlah per Action"):
+            st.dataframe(stats['per_action'], use_container_width=True, hide_index=True)
 
 def user_setting_page():
     st.markdown("""
@@ -6543,14 +8786,15 @@ def review_customer_page():
             # Filter
             col1, col2, col3 = st.columns([2, 2, 1])
             with col1:
-                search_name = st.text_input("🔍 Cari Nama Customer", key="search_review_name")
+                search_name = st.text_input("🔍 Cari Nama / Nopol / Isi Review", key="search_review_name")
             with col2:
                 filter_rating = st.selectbox("⭐ Filter Rating", ["Semua", "5", "4", "3", "2", "1"], key="filter_rating")
             
-            # Apply filter
-            df_filtered = df_reviews.copy()
+            # Apply filter (pencarian teks lewat index FTS)
             if search_name:
-                df_filtered = df_filtered[df_filtered['nama_customer'].str.contains(search_name, case=False, na=False)]
+                df_filtered = search_records('customer_reviews', search_name)
+            else:
+                df_filtered = df_reviews.copy()
             if filter_rating != "Semua":
                 df_filtered = df_filtered[df_filtered['rating'] == int(filter_rating)]
             
@@ -6643,13 +8887,15 @@ def review_customer_page():
         st.subheader("🎁 Customer Reward Points")
         
         df_points = get_all_customer_points()
+        points_summary = get_customer_points_summary()
         
         if df_points.empty:
             st.info("📭 Belum ada customer yang mengumpulkan poin")
         else:
-            st.success(f"👥 **{len(df_points)} customer** memiliki poin reward")
+            st.success(f"👥 **{points_summary['jumlah']} customer** memiliki poin reward")
             
             # Display points leaderboard
+            st.caption(f"🏆 Top {min(POINTS_LEADERBOARD_SIZE, points_summary['jumlah'])} customer dengan poin terbanyak")
             df_display = df_points[['nama_customer', 'nopol', 'no_telp', 'total_points', 'last_updated']].copy()
             df_display.columns = ['👤 Nama', '🚗 Nopol', '📱 Telp', '🎁 Total Poin', '📅 Update Terakhir']
             
@@ -6659,15 +8905,52 @@ def review_customer_page():
             st.markdown("---")
             col1, col2, col3 = st.columns(3)
             with col1:
-                total_points_given = df_points['total_points'].sum()
-                st.metric("🎁 Total Poin Diberikan", total_points_given)
+                st.metric("🎁 Total Poin Diberikan", points_summary['total'])
             with col2:
-                avg_points = df_points['total_points'].mean()
-                st.metric("📊 Rata-rata Poin/Customer", f"{avg_points:.1f}")
+                st.metric("📊 Rata-rata Poin/Customer", f"{points_summary['rata_rata']:.1f}")
             with col3:
                 top_customer = df_points.iloc[0] if not df_points.empty else None
                 if top_customer is not None:
                     st.metric("🏆 Top Customer", f"{top_customer['nama_customer'][:15]}...")
+            
+            # Riwayat event poin per customer (points_ledger)
+            st.markdown("---")
+            st.markdown("#### 📜 Riwayat Poin")
+            points_options = {f"{row['nama_customer']} ({row['nopol'] or row['no_telp']})": row for _, row in df_points.iterrows()}
+            selected_points = st.selectbox("Pilih customer", list(points_options), key="points_history_customer")
+            points_row = points_options[selected_points]
+            df_ledger = get_points_ledger(points_row['nopol'], points_row['no_telp'])
+            if df_ledger.empty:
+                st.info("📭 Belum ada riwayat poin")
+            else:
+                df_ledger.columns = ['📌 Jenis', '🎁 Poin', '💰 Saldo', '🔗 Sumber', '📝 Keterangan', '📅 Waktu', '👤 Oleh']
+                st.dataframe(df_ledger, use_container_width=True, hide_index=True)
+        
+        # Tukar poin / koreksi manual
+        st.markdown("---")
+        st.markdown("#### 🔄 Tukar / Koreksi Poin")
+        with st.form("points_event_form"):
+            col1, col2 = st.columns(2)
+            with col1:
+                event_nopol = st.text_input("🚗 Nopol", placeholder="Kosongkan jika customer tanpa kendaraan")
+                event_type = st.radio("Jenis", ["redeem", "adjust"], horizontal=True,
+                                      format_func=lambda x: "🎁 Tukar Poin" if x == "redeem" else "✏️ Koreksi")
+            with col2:
+                event_telp = st.text_input("📱 No. Telepon", placeholder="Dipakai jika nopol kosong")
+                event_points = st.number_input("Jumlah poin (koreksi boleh minus)", value=0, step=10)
+            event_note = st.text_input("📝 Keterangan", placeholder="Contoh: Tukar 1x cuci gratis")
+            submit_event = st.form_submit_button("💾 Simpan", type="primary", use_container_width=True)
+            
+            if submit_event:
+                success, msg = add_points_event(event_type, int(event_points), event_nopol, event_telp,
+                                                keterangan=event_note,
+                                                created_by=st.session_state.get('login_user', ''))
+                if success:
+                    add_audit("points_" + event_type, f"{event_nopol or event_telp}: {int(event_points)} poin. {msg}")
+                    st.success(f"✅ {msg}")
+                    st.rerun()
+                else:
+                    st.error(f"❌ {msg}")
     
     with tab3:
         st.subheader("📊 Statistik Review")
@@ -6737,8 +9020,9 @@ def payroll_page(role):
             employees = get_all_employees()
             if employees:
                 df_emp = pd.DataFrame(employees)
+                shift_persen = [s['persentase_gaji'] for s in get_shift_settings()]
                 df_emp['gaji_display'] = df_emp.apply(
-                    lambda x: f"Rp {x['gaji_tetap']:,.0f}" if x['role_karyawan'] in ['Kasir', 'Supervisor'] else f"{x['shift']} ({get_shift_settings()[0 if x['shift']=='Pagi' else 1]['persentase_gaji']}% dari pendapatan)",
+                    lambda x: f"Rp {x['gaji_tetap']:,.0f}" if x['role_karyawan'] in ['Kasir', 'Supervisor'] else f"{x['shift']} ({shift_persen[0 if x['shift']=='Pagi' else 1]}% dari pendapatan)",
                     axis=1
                 )
                 
@@ -6970,33 +9254,10 @@ def payroll_page(role):
                     calculate_btn = st.form_submit_button("🧮 Hitung Gaji", use_container_width=True)
                     
                     if calculate_btn:
-                        # Get attendance data untuk periode ini
-                        attendance_data = get_attendance_by_date_range(
-                            periode_awal.strftime("%d-%m-%Y"),
-                            periode_akhir.strftime("%d-%m-%Y")
-                        )
-                        
-                        # Filter by employee
-                        emp_attendance = [a for a in attendance_data if a['employee_id'] == emp_data['id']]
-                        total_hari_kerja = len([a for a in emp_attendance if a['status'] in ['Hadir', 'Terlambat', 'Pulang Awal']])
-                        
-                        # Calculate salary
-                        if emp_data['role_karyawan'] in ['Kasir', 'Supervisor']:
-                            # Gaji tetap
-                            total_gaji = emp_data['gaji_tetap']
-                        else:
-                            # Worker - hitung berdasarkan pendapatan
-                            total_gaji = 0
-                            for att in emp_attendance:
-                                if att['status'] in ['Hadir', 'Terlambat', 'Pulang Awal']:
-                                    salary = calculate_worker_salary(
-                                        emp_data['id'],
-                                        att['tanggal'],
-                                        att['jam_masuk'],
-                                        att['jam_pulang'],
-                                        att['shift']
-                                    )
-                                    total_gaji += salary
+                        # Hitung gaji (gaji tetap untuk Kasir/Supervisor, pendapatan shift untuk worker)
+                        payroll_result = calculate_payroll_batch(periode_awal, periode_akhir, employee_ids=[emp_data['id']])
+                        total_hari_kerja = int(payroll_result['total_hari_kerja'].iloc[0])
+                        total_gaji = int(payroll_result['total_gaji'].iloc[0])
                         
                         gaji_bersih = total_gaji + bonus - potongan
                         
@@ -7076,6 +9337,83 @@ def payroll_page(role):
                         st.rerun()
             else:
                 st.info("💡 Silakan hitung gaji terlebih dahulu")
+        
+        st.markdown("---")
+        st.markdown("#### 👥 Payroll Massal (Semua Karyawan Aktif)")
+        
+        with st.form("payroll_run_form"):
+            col_r1, col_r2, col_r3 = st.columns([1, 1, 1])
+            with col_r1:
+                run_awal = st.date_input("Periode Awal", value=datetime.now(WIB) - timedelta(days=7), key="run_periode_awal")
+            with col_r2:
+                run_akhir = st.date_input("Periode Akhir", value=datetime.now(WIB), key="run_periode_akhir")
+            with col_r3:
+                run_potong_kas_bon = st.checkbox("Potong kas bon otomatis", value=True)
+            
+            preview_btn = st.form_submit_button("🔍 Preview Payroll Massal", use_container_width=True)
+            
+            if preview_btn:
+                df_run = prepare_payroll_run(run_awal, run_akhir, potong_kas_bon=run_potong_kas_bon)
+                if df_run.empty:
+                    st.warning("⚠️ Belum ada karyawan aktif")
+                else:
+                    st.session_state['payroll_run_preview'] = {
+                        'periode_awal': run_awal.strftime("%d-%m-%Y"),
+                        'periode_akhir': run_akhir.strftime("%d-%m-%Y"),
+                        'rows': df_run.to_dict('records')
+                    }
+                    st.rerun()
+        
+        if 'payroll_run_preview' in st.session_state:
+            run_preview = st.session_state['payroll_run_preview']
+            df_preview = pd.DataFrame(run_preview['rows'])
+            
+            st.markdown(f"**Periode:** {run_preview['periode_awal']} s/d {run_preview['periode_akhir']}")
+            if df_preview['sudah_ada'].any():
+                st.warning(f"⚠️ {int(df_preview['sudah_ada'].sum())} karyawan sudah memiliki payroll periode ini dan tidak akan diproses ulang")
+            
+            df_preview['catatan'] = ''
+            df_edit = st.data_editor(
+                df_preview[['employee_id', 'nama', 'role_karyawan', 'total_hari_kerja', 'total_gaji', 'total_hutang',
+                            'potongan_kas_bon', 'bonus', 'potongan', 'catatan', 'sudah_ada']],
+                disabled=['employee_id', 'nama', 'role_karyawan', 'total_hari_kerja', 'total_gaji', 'total_hutang', 'sudah_ada'],
+                hide_index=True,
+                use_container_width=True,
+                key="payroll_run_editor"
+            )
+            
+            df_edit['potongan_kas_bon'] = df_edit[['potongan_kas_bon', 'total_hutang']].min(axis=1).clip(lower=0)
+            df_edit['gaji_bersih'] = df_edit['total_gaji'] + df_edit['bonus'] - df_edit['potongan'] - df_edit['potongan_kas_bon']
+            df_proses = df_edit[~df_edit['sudah_ada']]
+            
+            col_m1, col_m2, col_m3 = st.columns(3)
+            with col_m1:
+                st.metric("👥 Karyawan Diproses", len(df_proses))
+            with col_m2:
+                st.metric("💸 Potongan Kas Bon", f"Rp {df_proses['potongan_kas_bon'].sum():,.0f}")
+            with col_m3:
+                st.metric("💰 Total Gaji Bersih", f"Rp {df_proses['gaji_bersih'].sum():,.0f}")
+            
+            col_btn1, col_btn2 = st.columns(2)
+            with col_btn1:
+                if st.button("💾 Proses Payroll Massal", use_container_width=True, type="primary", disabled=df_proses.empty):
+                    success, msg = run_payroll_batch(
+                        df_proses.to_dict('records'),
+                        run_preview['periode_awal'],
+                        run_preview['periode_akhir'],
+                        st.session_state.get('login_user')
+                    )
+                    if success:
+                        add_audit("run_payroll", f"Payroll massal {run_preview['periode_awal']} s/d {run_preview['periode_akhir']}: {msg}")
+                        del st.session_state['payroll_run_preview']
+                        st.success(f"✅ {msg}")
+                        st.rerun()
+                    else:
+                        st.error(f"❌ {msg}")
+            with col_btn2:
+                if st.button("❌ Batal", use_container_width=True, key="cancel_payroll_run"):
+                    del st.session_state['payroll_run_preview']
+                    st.rerun()
     
     with tab4:
         st.markdown("### 📊 Riwayat Pembayaran Gaji")
@@ -7202,6 +9540,9 @@ def payroll_page(role):
                 
                 st.markdown("---")
                 
+                # Riwayat pembayaran semua kas bon diambil sekali, bukan satu query per kas bon
+                pembayaran_map = get_pembayaran_kas_bon_map(tuple(kb['id'] for kb in kas_bon_list))
+                
                 # Display kas bon list
                 for kb in kas_bon_list:
                     status_icon = "⏳" if kb['status'] == 'Belum Lunas' else "✅"
@@ -7220,7 +9561,7 @@ def payroll_page(role):
                         
                         with col_kb2:
                             # Riwayat pembayaran
-                            pembayaran_list = get_pembayaran_kas_bon(kb['id'])
+                            pembayaran_list = pembayaran_map[kb['id']]
                             if pembayaran_list:
                                 st.markdown("**💰 Riwayat Bayar:**")
                                 for p in pembayaran_list:
@@ -7417,9 +9758,24 @@ def payroll_page(role):
 
 def main():
     st.set_page_config(page_title="TIME AUTOCARE - Detailing & Ceramic Coating", layout="wide", page_icon="🚗")
-    
+    start_profile()
+    try:
+        run_app()
+    finally:
+        # Juga saat st.rerun()/st.stop(): rerun yang terpotong tetap tercatat di riwayat & log
+        summary = finish_profile()
+        if summary and summary['n_plus_one'] and N_PLUS_ONE_MODE == "raise":
+            raise NPlusOneQueryError(format_n_plus_one(summary['n_plus_one']))
+    if summary and summary['n_plus_one'] and N_PLUS_ONE_MODE == "warn":
+        st.warning(f"🔁 N+1 query terdeteksi: {format_n_plus_one(summary['n_plus_one'])}")
+    if summary and st.session_state.get("login_role") == "Admin":
+        render_profile_panel(summary)
+
+def run_app():
+    """Isi satu rerun: init database, login, menu sidebar dan routing halaman"""
     # Initialize database di awal sebelum login
-    init_db()
+    with profile_section("init_db"):
+        init_db()
     
     # Auto-populate data dummy jika database kosong (untuk deployment pertama kali)
     if check_database_empty():
@@ -7603,27 +9959,28 @@ def main():
         st.info("Silakan hubungi administrator untuk mendapatkan akses.")
         return
 
-    # Route to pages
-    if menu == "Dashboard":
-        dashboard_page(role)
-    elif menu == "Cuci Mobil":
-        transaksi_page(role)
-    elif menu == "Kasir":
-        kasir_page(role)
-    elif menu == "Payroll":
-        payroll_page(role)
-    elif menu == "Customer":
-        customer_page(role)
-    elif menu == "Laporan":
-        laporan_page(role)
-    elif menu == "Setting Toko":
-        setting_toko_page(role)
-    elif menu == "Review Customer":
-        review_customer_page()
-    elif menu == "User Setting":
-        user_setting_page()
-    elif menu == "Audit Trail":
-        audit_trail_page()
+    # Route to pages (setiap halaman diukur sebagai satu bagian profil)
+    with profile_section(f"halaman: {menu}"):
+        if menu == "Dashboard":
+            dashboard_page(role)
+        elif menu == "Cuci Mobil":
+            transaksi_page(role)
+        elif menu == "Kasir":
+            kasir_page(role)
+        elif menu == "Payroll":
+            payroll_page(role)
+        elif menu == "Customer":
+            customer_page(role)
+        elif menu == "Laporan":
+            laporan_page(role)
+        elif menu == "Setting Toko":
+            setting_toko_page(role)
+        elif menu == "Review Customer":
+            review_customer_page()
+        elif menu == "User Setting":
+            user_setting_page()
+        elif menu == "Audit Trail":
+            audit_trail_page()
 
 if __name__ == "__main__":
     main()
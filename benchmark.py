@@ -0,0 +1,293 @@
+"""
+Benchmark fungsi data-access di app.py pada beberapa skala data
+Database dibuat dengan generator populate_dummy_data.py (seed + tanggal akhir tetap, jadi datanya
+selalu sama) dan disimpan sebagai template; setiap run bekerja di salinan template. Hasil ditulis
+ke JSON dan dibandingkan dengan baseline yang disimpan di repo.
+
+Cara pakai:
+    python benchmark.py                              # semua skala, bandingkan dengan baseline
+    python benchmark.py --scales small medium --repeat 10
+    python benchmark.py --only get_all_transactions load_audit_trail
+    python benchmark.py --save-baseline              # simpan hasil sebagai baseline baru
+    python benchmark.py --fail-on-regression         # exit code 1 jika ada yang lebih lambat dari threshold
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import populate_dummy_data
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BASE_DIR, "benchmarks", "baseline.json")
+OUTPUT_FILE = os.path.join(BASE_DIR, "benchmarks", "latest.json")
+TEMPLATE_DIR = os.path.join(tempfile.gettempdir(), "car_wash_benchmark_templates")
+
+BENCH_SEED = 42
+BENCH_END_DATE = date(2025, 12, 31)
+
+# Skala data: scale = volume relatif terhadap data demo, days = panjang riwayat
+SCALES = {
+    'small': {'scale': 1, 'days': 60},
+    'medium': {'scale': 10, 'days': 365},
+    'large': {'scale': 40, 'days': 1095},
+}
+
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 1.2
+# Selisih di bawah ini dianggap noise (benchmark sub-milidetik sangat fluktuatif)
+NOISE_FLOOR_MS = 1.0
+
+
+def _recent_attendance(conn):
+    """Presensi 'Hadir' terakhir untuk argumen calculate_worker_salary"""
+    return conn.execute("""
+        SELECT employee_id, tanggal, substr(jam_masuk, 1, 5), substr(jam_pulang, 1, 5), shift
+        FROM attendance
+        WHERE status = 'Hadir' AND tanggal_iso = ?
+        ORDER BY id LIMIT 1
+    """, (BENCH_END_DATE.isoformat(),)).fetchone()
+
+
+def _latest_kasir(conn):
+    """Transaksi kasir terakhir sebagai contoh data untuk benchmark tulis"""
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM kasir_transactions ORDER BY id DESC LIMIT 1").fetchone()
+    conn.row_factory = None
+    return dict(row)
+
+
+def build_benchmarks(app, db_path):
+    """Daftar (nama, fungsi) benchmark dengan argumen yang diambil dari database"""
+    conn = sqlite3.connect(db_path)
+    try:
+        attendance = _recent_attendance(conn)
+        kasir = _latest_kasir(conn)
+    finally:
+        conn.close()
+
+    end = BENCH_END_DATE
+    start = end - timedelta(days=29)
+    shift_start = datetime.combine(end, datetime.min.time()).replace(hour=8)
+    shift_end = shift_start.replace(hour=17)
+
+    def save_kasir():
+        ok, message, _ = app.save_kasir_transaction({
+            'nopol': kasir['nopol'], 'nama_customer': kasir['nama_customer'], 'no_telp': kasir['no_telp'],
+            'tanggal': end.strftime('%d-%m-%Y'), 'waktu': '12:00:00', 'paket_cuci': kasir['paket_cuci'],
+            'harga_cuci': kasir['harga_cuci'], 'coffee_items': kasir['coffee_items'] or '',
+            'harga_coffee': kasir['harga_coffee'], 'total_bayar': kasir['total_bayar'],
+            'status_bayar': 'Lunas', 'metode_bayar': 'Tunai', 'created_by': 'benchmark',
+        })
+        if not ok:
+            raise RuntimeError(message)
+
+    def save_review():
+        # Kode baru setiap panggilan: satu kode hanya bisa memberi reward review sekali
+        ok, message = app.save_customer_review({
+            'secret_code': app.generate_secret_code(), 'trans_id': kasir['id'], 'trans_type': 'kasir',
+            'nopol': kasir['nopol'], 'no_telp': kasir['no_telp'], 'nama_customer': kasir['nama_customer'],
+            'rating': 5, 'review_text': 'Benchmark',
+        })
+        if not ok:
+            raise RuntimeError(message)
+
+    return [
+        ('get_all_transactions', app.get_all_transactions),
+        ('get_transactions_by_date_range', lambda: app.get_transactions_by_date_range(start, end)),
+        ('get_pending_wash_transactions', app.get_pending_wash_transactions),
+        ('save_kasir_transaction', save_kasir),
+        ('save_customer_review', save_review),
+        ('calculate_worker_salary', lambda: app.calculate_worker_salary(*attendance)),
+        ('get_wash_revenue_by_time_range', lambda: app.get_wash_revenue_by_time_range(
+            shift_start.strftime('%Y-%m-%d %H:%M:%S'), shift_end.strftime('%Y-%m-%d %H:%M:%S'))),
+        ('load_audit_trail', app.load_audit_trail),
+    ]
+
+
+def time_call(app, func, repeat):
+    """Jalankan func (1x warmup + repeat kali) dengan cache query dikosongkan, return statistik dalam ms"""
+    timings = []
+    result = None
+    for run in range(repeat + 1):
+        # Cache dikosongkan agar yang diukur adalah kerja database, bukan cache hit;
+        # GC dimatikan selama pengukuran (seperti timeit) agar hasil lebih stabil
+        app.invalidate_all_tables()
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            result = func()
+            elapsed = (time.perf_counter() - started) * 1000
+        finally:
+            gc.enable()
+        if run:
+            timings.append(elapsed)
+    stats = {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'stdev_ms': round(statistics.stdev(timings), 3) if len(timings) > 1 else 0.0,
+        'runs': repeat,
+    }
+    if hasattr(result, '__len__') and not isinstance(result, str):
+        stats['result_rows'] = len(result)
+    return stats
+
+
+def table_counts(db_path):
+    """Jumlah baris tabel utama di database benchmark"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ('customers', 'wash_transactions', 'kasir_transactions', 'coffee_sales',
+                              'customer_reviews', 'attendance', 'audit_trail')}
+    finally:
+        conn.close()
+
+
+def run_scale(app, name, params, repeat, only, template_dir):
+    """Siapkan salinan database untuk satu skala lalu jalankan semua benchmark"""
+    print(f"\n📦 Skala {name}: scale={params['scale']} days={params['days']}")
+    template, counts = populate_dummy_data.ensure_template(
+        template_dir, params['scale'], params['days'], BENCH_SEED, BENCH_END_DATE, log=None)
+    if counts is not None:
+        print(f"   template baru: {template}")
+
+    fd, db_path = tempfile.mkstemp(suffix=".db", prefix=f"benchmark_{name}_")
+    os.close(fd)
+    populate_dummy_data.copy_database(template, db_path)
+    try:
+        app.close_all_connections()
+        app.DB_NAME = db_path
+        app.init_db()
+        rows = table_counts(db_path)
+        results = {}
+        for bench_name, func in build_benchmarks(app, db_path):
+            if only and bench_name not in only:
+                continue
+            results[bench_name] = time_call(app, func, repeat)
+            print(f"   {bench_name:<32} {results[bench_name]['median_ms']:>10.2f} ms")
+        return {'params': params, 'rows': rows}, results
+    finally:
+        app.flush_audit()
+        app.close_all_connections()
+        populate_dummy_data.remove_database(db_path)
+
+
+def git_commit():
+    """Commit git saat ini (kosong jika bukan git repo)"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(report, baseline, threshold):
+    """Bandingkan median dengan baseline, return list regresi"""
+    regressions = []
+    print("\n" + "=" * 78)
+    print(f"📊 Perbandingan dengan baseline ({baseline['meta'].get('git_commit') or '-'}, "
+          f"{baseline['meta'].get('created_at', '-')})")
+    print("=" * 78)
+    print(f"   {'skala':<7} {'benchmark':<32} {'baseline':>10} {'sekarang':>10} {'rasio':>7}")
+    for scale, results in report['results'].items():
+        for name, stats in results.items():
+            base = baseline['results'].get(scale, {}).get(name)
+            if not base:
+                print(f"   {scale:<7} {name:<32} {'-':>10} {stats['median_ms']:>8.2f}ms {'baru':>7}")
+                continue
+            ratio = stats['median_ms'] / max(base['median_ms'], 1e-6)
+            mark = ""
+            if ratio > threshold and stats['median_ms'] - base['median_ms'] > NOISE_FLOOR_MS:
+                mark = "  ❌ lebih lambat"
+                regressions.append(f"{scale}/{name}: {base['median_ms']:.2f} → {stats['median_ms']:.2f} ms ({ratio:.2f}x)")
+            elif ratio < 1 / threshold and base['median_ms'] - stats['median_ms'] > NOISE_FLOOR_MS:
+                mark = "  ✅ lebih cepat"
+            print(f"   {scale:<7} {name:<32} {base['median_ms']:>8.2f}ms {stats['median_ms']:>8.2f}ms "
+                  f"{ratio:>6.2f}x{mark}")
+    return regressions
+
+
+def write_json(path, data):
+    """Tulis JSON dengan indentasi (folder dibuat jika belum ada)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fungsi data-access app.py pada beberapa skala data")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=list(SCALES),
+                        help="Skala yang dijalankan (default: semua)")
+    parser.add_argument("--only", nargs="+", help="Hanya jalankan benchmark dengan nama ini")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"Jumlah repetisi per benchmark setelah warmup (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="File JSON hasil benchmark")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="File JSON baseline untuk perbandingan")
+    parser.add_argument("--save-baseline", action="store_true", help="Simpan hasil sebagai baseline baru")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Rasio median terhadap baseline yang dianggap regresi (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Exit code 1 jika ada benchmark yang melewati threshold")
+    parser.add_argument("--template-dir", default=TEMPLATE_DIR, help="Folder template database benchmark")
+    args = parser.parse_args()
+
+    if args.repeat < 1 or args.threshold <= 1:
+        parser.error("--repeat minimal 1 dan --threshold harus > 1")
+
+    import app
+
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': BENCH_SEED,
+            'end_date': BENCH_END_DATE.isoformat(),
+            'repeat': args.repeat,
+        },
+        'scales': {},
+        'results': {},
+    }
+    for name in args.scales:
+        report['scales'][name], report['results'][name] = run_scale(
+            app, name, SCALES[name], args.repeat, args.only, args.template_dir)
+
+    write_json(args.output, report)
+    print(f"\n💾 Hasil disimpan ke {args.output}")
+
+    regressions = []
+    if args.save_baseline:
+        write_json(args.baseline, report)
+        print(f"💾 Baseline disimpan ke {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+    else:
+        print(f"ℹ️  Baseline {args.baseline} belum ada; jalankan dengan --save-baseline")
+
+    if regressions:
+        print(f"\n⚠️  {len(regressions)} benchmark lebih lambat dari {args.threshold}x baseline:")
+        for message in regressions:
+            print(f"   {message}")
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
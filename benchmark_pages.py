@@ -0,0 +1,332 @@
+"""
+Benchmark render halaman end-to-end dengan Streamlit AppTest (headless)
+Menjalankan main() di app.py sebagai Admin/Kasir/Supervisor terhadap database hasil generator,
+lalu mencatat wall time, jumlah query SQL dan peak memory per halaman dan per interaksi
+(ganti filter tanggal, filter di dalam tab, pindah menu, checkout).
+
+Setiap skenario diukur dua kali:
+    warm : rerun biasa (cache proses sudah terisi oleh render sebelumnya)
+    cold : cache proses (st.cache_resource: pool koneksi, cache setting & query) dikosongkan
+           dulu, seperti request pertama setelah server start; peak memory diukur di mode ini
+
+Cara pakai:
+    python benchmark_pages.py                          # skala small, bandingkan dengan baseline
+    python benchmark_pages.py --scales small medium
+    python benchmark_pages.py --roles Kasir --pages Kasir Payroll
+    python benchmark_pages.py --save-baseline
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import benchmark
+import populate_dummy_data
+
+APP_FILE = os.path.join(benchmark.BASE_DIR, "app.py")
+BASELINE_FILE = os.path.join(benchmark.BASE_DIR, "benchmarks", "pages_baseline.json")
+OUTPUT_FILE = os.path.join(benchmark.BASE_DIR, "benchmarks", "pages_latest.json")
+
+DEFAULT_SCALES = ['small']
+DEFAULT_REPEAT = 3
+APPTEST_TIMEOUT = 600
+
+# Halaman yang diukur per role (sesuai menu di main())
+ROLE_PAGES = {
+    'Admin': ['Dashboard', 'Laporan', 'Kasir', 'Payroll'],
+    'Kasir': ['Dashboard', 'Kasir', 'Payroll'],
+    'Supervisor': ['Dashboard'],
+}
+ROLE_USERS = {'Admin': 'admin', 'Kasir': 'kasir', 'Supervisor': 'supervisor'}
+
+# Selisih di bawah ini dianggap noise
+NOISE_FLOOR_MS = 20.0
+QUERY_NOISE_FLOOR = 5
+
+
+# --- Jumlah Query SQL ---
+# main() di app.py menyimpan profil setiap rerun (lihat "Query Profiling") ke
+# st.session_state['profile_history']; query sebuah aksi = total query rerun yang baru.
+def profile_history(at):
+    """Riwayat profil rerun sesi AppTest (list kosong jika belum ada rerun)"""
+    return at.session_state['profile_history'] if 'profile_history' in at.session_state else []
+
+
+def last_rerun(at):
+    history = profile_history(at)
+    return history[-1]['rerun'] if history else 0
+
+
+def queries_since(at, rerun):
+    """Jumlah query SQL semua rerun setelah nomor rerun tertentu"""
+    return sum(item['queries'] for item in profile_history(at) if item['rerun'] > rerun)
+
+
+# --- Skenario ---
+def _render(at):
+    at.run()
+
+
+def _date_filter(at):
+    today = datetime.now(populate_dummy_data.WIB).date()
+    at.date_input(key="dashboard_date_input").set_value((today - timedelta(days=29), today)).run()
+
+
+def _month_filter(at):
+    at.selectbox(key="lap_month").set_value(datetime.now(populate_dummy_data.WIB).month).run()
+
+
+def _laporan_tab_filter(at):
+    paket = at.selectbox(key="wash_only_paket")
+    paket.set_value(paket.options[-1]).run()
+
+
+def _kasbon_tab_filter(at):
+    at.selectbox(key="kasbon_filter_status").set_value("Lunas").run()
+
+
+def _prepare_coffee_checkout(at):
+    at.run()
+    at.number_input(key="coffee_only_qty_0").set_value(2).run()
+
+
+def _coffee_checkout(at):
+    at.button(key="save_coffee_only_sale").click().run()
+
+
+def _navigate(page):
+    def action(at):
+        at.button(key=f"menu_{page}").click().run()
+    return action
+
+
+# (halaman, nama skenario, setup tanpa diukur, aksi yang diukur, halaman awal, role yang bisa)
+# Tab st.tabs berpindah di browser tanpa rerun; yang diukur adalah rerun dari widget di dalam tab.
+SCENARIOS = [
+    ('Dashboard', 'render', None, _render, None, None),
+    # Dashboard Kasir selalu hari ini (tanpa filter tanggal)
+    ('Dashboard', 'filter_tanggal', _render, _date_filter, None, ('Admin', 'Supervisor')),
+    ('Laporan', 'render', None, _render, None, None),
+    ('Laporan', 'navigasi_menu', _render, _navigate('Laporan'), 'Dashboard', None),
+    ('Laporan', 'filter_bulan', _render, _month_filter, None, None),
+    ('Laporan', 'filter_dalam_tab', _render, _laporan_tab_filter, None, None),
+    ('Kasir', 'render', None, _render, None, None),
+    ('Kasir', 'navigasi_menu', _render, _navigate('Kasir'), 'Dashboard', None),
+    ('Kasir', 'checkout_coffee', _prepare_coffee_checkout, _coffee_checkout, None, None),
+    ('Payroll', 'render', None, _render, None, None),
+    ('Payroll', 'navigasi_menu', _render, _navigate('Payroll'), 'Dashboard', None),
+    ('Payroll', 'filter_dalam_tab', _render, _kasbon_tab_filter, None, None),
+]
+
+
+def new_apptest(role, page):
+    """AppTest yang sudah login sebagai role dan membuka halaman tertentu"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_FILE, default_timeout=APPTEST_TIMEOUT)
+    at.session_state["is_logged_in"] = True
+    at.session_state["login_user"] = ROLE_USERS[role]
+    at.session_state["login_role"] = role
+    at.session_state["menu"] = page
+    return at
+
+
+def run_once(role, page, setup, action, cold, trace_memory=False):
+    """Satu pengukuran skenario, return (wall ms, jumlah query, peak memory KB atau None)"""
+    import streamlit as st
+
+    at = new_apptest(role, page)
+    if setup:
+        setup(at)
+    if cold:
+        st.cache_resource.clear()
+
+    peak_kb = None
+    if trace_memory:
+        tracemalloc.start()
+    rerun_before = last_rerun(at)
+    started = time.perf_counter()
+    try:
+        action(at)
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        if trace_memory:
+            peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            tracemalloc.stop()
+    queries = queries_since(at, rerun_before)
+
+    if at.exception:
+        raise RuntimeError(f"{role}/{page}: {at.exception[0].value}")
+    return elapsed, queries, peak_kb
+
+
+def measure(role, page, setup, action, repeat):
+    """Ukur skenario dalam mode warm dan cold"""
+    result = {}
+    for mode in ('warm', 'cold'):
+        timings, queries = [], []
+        for _ in range(repeat):
+            elapsed, count, _ = run_once(role, page, setup, action, cold=(mode == 'cold'))
+            timings.append(elapsed)
+            queries.append(count)
+        result[mode] = {
+            'median_ms': round(statistics.median(timings), 1),
+            'min_ms': round(min(timings), 1),
+            'queries': max(queries),
+            'runs': repeat,
+        }
+    # tracemalloc memperlambat eksekusi, jadi memory diukur di run terpisah
+    _, _, peak_kb = run_once(role, page, setup, action, cold=True, trace_memory=True)
+    result['cold']['peak_memory_kb'] = peak_kb
+    return result
+
+
+def run_scale(name, params, roles, pages, repeat, template_dir, workdir):
+    """Siapkan car_wash.db untuk satu skala di workdir lalu jalankan semua skenario"""
+    import streamlit as st
+
+    print(f"\n📦 Skala {name}: scale={params['scale']} days={params['days']}")
+    end_date = datetime.now(populate_dummy_data.WIB).date()
+    template, counts = populate_dummy_data.ensure_template(
+        template_dir, params['scale'], params['days'], benchmark.BENCH_SEED, end_date, log=None)
+    if counts is not None:
+        print(f"   template baru: {template}")
+
+    # app.py memakai DB_NAME relatif ("car_wash.db"), jadi AppTest dijalankan dari workdir
+    db_path = os.path.join(workdir, "car_wash.db")
+    populate_dummy_data.copy_database(template, db_path)
+    st.cache_resource.clear()
+
+    results = {}
+    try:
+        for role in roles:
+            for page, scenario, setup, action, start_page, scenario_roles in SCENARIOS:
+                if page not in ROLE_PAGES[role] or (pages and page not in pages):
+                    continue
+                if scenario_roles and role not in scenario_roles:
+                    continue
+                key = f"{role}/{page}/{scenario}"
+                results[key] = measure(role, start_page or page, setup, action, repeat)
+                warm, cold = results[key]['warm'], results[key]['cold']
+                print(f"   {key:<36} warm {warm['median_ms']:>8.1f} ms {warm['queries']:>5} q | "
+                      f"cold {cold['median_ms']:>8.1f} ms {cold['queries']:>5} q {cold['peak_memory_kb']:>9,.0f} KB")
+    finally:
+        st.cache_resource.clear()
+        populate_dummy_data.remove_database(db_path)
+    return {'params': params, 'end_date': end_date.isoformat(), 'rows': benchmark.table_counts(template)}, results
+
+
+def compare(report, baseline, threshold):
+    """Bandingkan dengan baseline (wall time, jumlah query, peak memory), return list regresi"""
+    regressions = []
+    print("\n" + "=" * 78)
+    print(f"📊 Perbandingan dengan baseline ({baseline['meta'].get('git_commit') or '-'}, "
+          f"{baseline['meta'].get('created_at', '-')})")
+    print("=" * 78)
+    checks = [
+        ('warm', 'median_ms', NOISE_FLOOR_MS, "ms"),
+        ('cold', 'median_ms', NOISE_FLOOR_MS, "ms"),
+        ('warm', 'queries', QUERY_NOISE_FLOOR, "query"),
+        ('cold', 'queries', QUERY_NOISE_FLOOR, "query"),
+        ('cold', 'peak_memory_kb', 1024, "KB"),
+    ]
+    for scale, results in report['results'].items():
+        for key, stats in results.items():
+            base = baseline['results'].get(scale, {}).get(key)
+            if not base:
+                print(f"   {scale:<7} {key:<36} baru")
+                continue
+            notes = []
+            for mode, metric, floor, unit in checks:
+                current, before = stats[mode].get(metric), base.get(mode, {}).get(metric)
+                if current is None or before is None:
+                    continue
+                if current > before * threshold and current - before > floor:
+                    notes.append(f"{mode} {metric} {before:,.0f} → {current:,.0f} {unit}")
+            ratio = stats['warm']['median_ms'] / max(base['warm']['median_ms'], 1e-6)
+            mark = "  ❌ " + "; ".join(notes) if notes else ""
+            print(f"   {scale:<7} {key:<36} warm {ratio:>5.2f}x{mark}")
+            regressions.extend(f"{scale}/{key}: {note}" for note in notes)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark render halaman app.py dengan Streamlit AppTest")
+    parser.add_argument("--scales", nargs="+", choices=list(benchmark.SCALES), default=DEFAULT_SCALES,
+                        help=f"Skala yang dijalankan (default: {' '.join(DEFAULT_SCALES)})")
+    parser.add_argument("--roles", nargs="+", choices=list(ROLE_PAGES), default=list(ROLE_PAGES),
+                        help="Role yang dijalankan (default: semua)")
+    parser.add_argument("--pages", nargs="+", choices=ROLE_PAGES['Admin'], help="Hanya halaman ini")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"Jumlah repetisi per skenario dan mode (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="File JSON hasil benchmark")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="File JSON baseline untuk perbandingan")
+    parser.add_argument("--save-baseline", action="store_true", help="Simpan hasil sebagai baseline baru")
+    parser.add_argument("--threshold", type=float, default=benchmark.DEFAULT_THRESHOLD,
+                        help=f"Rasio terhadap baseline yang dianggap regresi (default: {benchmark.DEFAULT_THRESHOLD})")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Exit code 1 jika ada skenario yang melewati threshold")
+    parser.add_argument("--template-dir", default=benchmark.TEMPLATE_DIR, help="Folder template database benchmark")
+    args = parser.parse_args()
+
+    if args.repeat < 1 or args.threshold <= 1:
+        parser.error("--repeat minimal 1 dan --threshold harus > 1")
+
+    args.output, args.baseline, args.template_dir = (
+        os.path.abspath(path) for path in (args.output, args.baseline, args.template_dir))
+    workdir = tempfile.mkdtemp(prefix="benchmark_pages_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': benchmark.git_commit(),
+            'python': sys.version.split()[0],
+            'sqlite': sqlite3.sqlite_version,
+            'seed': benchmark.BENCH_SEED,
+            'repeat': args.repeat,
+        },
+        'scales': {},
+        'results': {},
+    }
+    try:
+        for name in args.scales:
+            report['scales'][name], report['results'][name] = run_scale(
+                name, benchmark.SCALES[name], args.roles, args.pages, args.repeat, args.template_dir, workdir)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    benchmark.write_json(args.output, report)
+    print(f"\n💾 Hasil disimpan ke {args.output}")
+
+    regressions = []
+    if args.save_baseline:
+        benchmark.write_json(args.baseline, report)
+        print(f"💾 Baseline disimpan ke {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+    else:
+        print(f"ℹ️  Baseline {args.baseline} belum ada; jalankan dengan --save-baseline")
+
+    if regressions:
+        print(f"\n⚠️  {len(regressions)} skenario melewati {args.threshold}x baseline:")
+        for message in regressions:
+            print(f"   {message}")
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
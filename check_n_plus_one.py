@@ -0,0 +1,108 @@
+"""
+Script untuk mendeteksi N+1 query di halaman app.py
+Menjalankan setiap halaman per role dengan Streamlit AppTest (headless) terhadap database
+hasil generator, dengan cache proses dikosongkan dulu agar helper ber-cache ikut menjalankan SQL.
+Gagal (exit code 1) jika statement berparameter yang sama dijalankan lebih dari --threshold kali
+dalam satu rerun; laporan memuat fungsi yang menjalankan query dan pemanggilnya.
+
+Cara pakai:
+    python check_n_plus_one.py                     # semua halaman semua role
+    python check_n_plus_one.py --roles Admin --pages Payroll --verbose
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import benchmark
+import benchmark_pages
+import populate_dummy_data
+
+# Semua menu per role (sesuai menu di main())
+ROLE_MENUS = {
+    'Admin': ['Dashboard', 'Cuci Mobil', 'Kasir', 'Payroll', 'Customer', 'Review Customer',
+              'Laporan', 'Setting Toko', 'Audit Trail', 'User Setting'],
+    'Kasir': ['Dashboard', 'Kasir', 'Payroll'],
+    'Supervisor': ['Dashboard', 'Cuci Mobil'],
+}
+DEFAULT_THRESHOLD = 5
+
+
+def check_page(role, page, threshold):
+    """Render satu halaman (cache dingin), return (list pelanggaran N+1, jumlah query)"""
+    import streamlit as st
+
+    at = benchmark_pages.new_apptest(role, page)
+    st.cache_resource.clear()
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"{role}/{page}: {at.exception[0].value}")
+
+    violations, queries = [], 0
+    for summary in benchmark_pages.profile_history(at):
+        queries += summary['queries']
+        violations.extend(v for v in summary['query_groups'] if v['count'] > threshold)
+    return violations, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deteksi N+1 query di halaman app.py dengan Streamlit AppTest")
+    parser.add_argument("--roles", nargs="+", choices=list(ROLE_MENUS), default=list(ROLE_MENUS),
+                        help="Role yang dicek (default: semua)")
+    parser.add_argument("--pages", nargs="+", choices=ROLE_MENUS['Admin'], help="Hanya halaman ini")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help=f"Maksimal eksekusi statement yang sama per rerun (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--scale", default='small', choices=list(benchmark.SCALES),
+                        help="Skala data dummy (default: small)")
+    parser.add_argument("--template-dir", default=benchmark.TEMPLATE_DIR, help="Folder template database")
+    parser.add_argument("--verbose", action="store_true", help="Tampilkan jumlah query setiap halaman")
+    args = parser.parse_args()
+
+    params = benchmark.SCALES[args.scale]
+    end_date = datetime.now(populate_dummy_data.WIB).date()
+    template, _ = populate_dummy_data.ensure_template(
+        os.path.abspath(args.template_dir), params['scale'], params['days'], benchmark.BENCH_SEED,
+        end_date, log=lambda *a: None)
+
+    # app.py memakai DB_NAME relatif ("car_wash.db"), jadi AppTest dijalankan dari folder sementara
+    workdir = tempfile.mkdtemp(prefix="check_n_plus_one_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    db_path = os.path.join(workdir, "car_wash.db")
+    populate_dummy_data.copy_database(template, db_path)
+
+    failures = []
+    total = 0
+    try:
+        for role in args.roles:
+            for page in ROLE_MENUS[role]:
+                if args.pages and page not in args.pages:
+                    continue
+                total += 1
+                violations, queries = check_page(role, page, args.threshold)
+                if args.verbose:
+                    print(f"   {role + '/' + page:<28} {queries:>4} query, {len(violations)} N+1")
+                for v in violations:
+                    failures.append(f"{role}/{page}: {v['count']}x {v['sql'][:90]} "
+                                    f"(dari {', '.join(v['callers'])})")
+    finally:
+        os.chdir(cwd)
+        populate_dummy_data.remove_database(db_path)
+
+    print("\n" + "=" * 60)
+    print(f"📊 {total} halaman dicek, {len(failures)} N+1 query (threshold {args.threshold})")
+    print("=" * 60)
+    for message in failures:
+        print(f"❌ {message}")
+
+    if failures:
+        print("\n❌ Ada helper query yang dipanggil per baris. Ambil datanya sekali (batch) di luar loop.")
+        return 1
+    print("\n✓ Tidak ada N+1 query.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
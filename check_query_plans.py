@@ -0,0 +1,224 @@
+"""
+Script untuk mengecek query plan semua statement SQL di app.py
+Menjalankan EXPLAIN QUERY PLAN untuk setiap query dan gagal (exit code 1)
+jika query di fungsi "hot" melakukan full table SCAN tanpa index.
+SQL dinamis (f-string) tidak bisa dibaca statis; query-nya ditangkap lewat profiler app.py
+saat fungsi hot dijalankan dengan argumen representatif (DYNAMIC_HOT_CALLS), lalu di-EXPLAIN.
+
+Cara pakai:
+    python check_query_plans.py              # cek terhadap database sementara hasil init_db()
+    python check_query_plans.py --db car_wash.db --verbose
+"""
+
+import argparse
+import ast
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import date, timedelta
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# Fungsi yang dipanggil terus-menerus per rerun / per transaksi.
+# Query di fungsi-fungsi ini tidak boleh melakukan full table SCAN.
+HOT_QUERY_FUNCTIONS = {
+    "get_customer_by_nopol",
+    "get_transactions_by_date_range",
+    "get_pending_wash_transactions",
+    "delete_wash_transaction",
+    "get_attendance_by_date_range",
+    "get_wash_revenue_by_time_range",
+    "get_total_hutang_by_employee",
+    "get_kas_bon_by_employee",
+    "get_pembayaran_kas_bon",
+    "get_sale_item_summary",
+    "get_transaction_by_secret_code",
+    "check_review_exists",
+    "save_customer_review",
+    "get_customer_points_by_identifier",
+    "get_all_customer_points",
+    "get_points_ledger",
+}
+
+# Fungsi hot dengan SQL dinamis: (label, fungsi app, args, kwargs). Argumen mewakili pemakaian
+# halaman (rentang tanggal, halaman berikutnya lewat cursor keyset, pencarian FTS & LIKE, filter audit).
+_TODAY = date.today()
+_MONTH_AGO = _TODAY - timedelta(days=30)
+_KEYSET_CURSOR = (_TODAY.isoformat(), "23:59:59", 1_000_000)
+DYNAMIC_HOT_CALLS = [
+    ("get_transactions_by_date_range", "get_transactions_by_date_range", (_MONTH_AGO, _TODAY), {}),
+    ("get_kasir_transactions_by_date_range", "get_kasir_transactions_by_date_range", (_MONTH_AGO, _TODAY), {}),
+    ("get_coffee_sales_by_date_range", "get_coffee_sales_by_date_range", (_MONTH_AGO, _TODAY), {}),
+    ("get_wash_transactions_page (cursor)", "get_wash_transactions_page", (_KEYSET_CURSOR,), {}),
+    ("get_kasir_transactions_page (cursor)", "get_kasir_transactions_page", (_KEYSET_CURSOR,), {}),
+    ("get_kasir_transactions_page (FTS + tanggal)", "get_kasir_transactions_page", (),
+     {"search": "budi", "search_date": _TODAY.strftime("%d-%m-%Y")}),
+    ("get_wash_transactions_page (LIKE)", "get_wash_transactions_page", (), {"search": "b1"}),
+    ("get_customer_stats_page (registered)", "get_customer_stats_page", ("registered",), {"cursor": (1_000_000,)}),
+    ("get_customer_stats_page (last_visit)", "get_customer_stats_page", ("last_visit", 0, 0, (_TODAY.isoformat(), "ZZ")), {}),
+    ("get_customer_stats_page (total_spend)", "get_customer_stats_page", ("total_spend", 100000, 2, (10**9, "ZZ")), {}),
+    ("get_customer_stats_page (visits)", "get_customer_stats_page", ("visits", 0, 0, (10**6, "ZZ")), {}),
+    ("get_customer_stats_page (avg_ticket)", "get_customer_stats_page", ("avg_ticket", 0, 0, (10**9, "ZZ")), {}),
+    ("search_records (customers FTS)", "search_records", ("customers", "budi"), {}),
+    ("search_records (customer_reviews FTS)", "search_records", ("customer_reviews", "bersih"), {}),
+    ("get_audit_trail_page (user + FTS + tanggal)", "get_audit_trail_page", (["admin"], "login", _MONTH_AGO, _TODAY), {}),
+    ("get_audit_trail_page (tanggal)", "get_audit_trail_page", (None, None, _MONTH_AGO, _TODAY), {}),
+    ("get_audit_trail_stats (tanggal)", "get_audit_trail_stats", (None, None, _MONTH_AGO, _TODAY), {}),
+    ("export_transaction_pack", "export_transaction_pack", (_MONTH_AGO, _TODAY), {}),
+    ("export_transaction_sheet (filter)", "export_transaction_sheet", ("Semua Transaksi", _MONTH_AGO, _TODAY),
+     {"search": {("customer", "nopol"): "budi"}, "equals": {"jenis": "Cuci"}}),
+]
+
+SQL_START_RE = re.compile(r"^(SELECT|INSERT|UPDATE|DELETE|WITH)\s")
+
+# "SCAN t" / "SCAN TABLE t" (SQLite lama) tanpa index = full table scan
+FULL_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+# Katalog skema kecil dan tidak bisa diberi index
+CATALOG_TABLES = {"sqlite_master", "sqlite_schema", "sqlite_temp_master"}
+AUTO_INDEX_RE = re.compile(r"AUTOMATIC (?:COVERING |PARTIAL )?INDEX")
+
+
+def extract_sql_statements(path=APP_FILE):
+    """Ambil semua string literal SQL dari app.py beserta nama fungsi dan nomor barisnya"""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+
+    statements = []
+
+    def is_docstring(node, parent):
+        return (isinstance(parent, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))
+                and parent.body and node is parent.body[0]
+                and isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)
+                and isinstance(node.value.value, str))
+
+    def visit(node, func_name):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            func_name = node.name
+        if isinstance(node, ast.JoinedStr):
+            # f-string (SQL dinamis) tidak bisa di-EXPLAIN secara statis
+            return
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            sql = node.value.strip()
+            # Template str.format (mis. TRANSACTION_REPORT_SHEETS) ditangkap lewat DYNAMIC_HOT_CALLS
+            if SQL_START_RE.match(sql) and "{" not in sql:
+                statements.append((func_name, node.lineno, sql))
+            return
+        for child in ast.iter_child_nodes(node):
+            # Docstring (mis. "INSERT ... SELECT agregat") bukan query
+            if not is_docstring(child, node):
+                visit(child, func_name)
+
+    visit(tree, "<module>")
+    return statements
+
+
+def capture_dynamic_sql(db_path):
+    """Jalankan DYNAMIC_HOT_CALLS dengan profiler app.py, return (label, caller, sql) unik per statement"""
+    import app
+
+    app.DB_NAME = db_path
+    statements, seen = [], set()
+    try:
+        for label, func_name, args, kwargs in DYNAMIC_HOT_CALLS:
+            # Cache dikosongkan agar fungsi ber-cache benar-benar menjalankan SQL
+            app.invalidate_all_tables()
+            app.start_profile()
+            getattr(app, func_name)(*args, **kwargs)
+            for entry in app._current_profile()['queries']:
+                sql = entry['sql'].strip()
+                if SQL_START_RE.match(sql) and sql not in seen:
+                    seen.add(sql)
+                    statements.append((label, entry['caller'], sql))
+    finally:
+        app.start_profile()
+        app.close_all_connections()
+    return statements
+
+
+def explain(conn, sql):
+    """Jalankan EXPLAIN QUERY PLAN dengan parameter NULL, return list detail plan"""
+    params = (None,) * sql.count("?")
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def find_full_scans(plan):
+    """Return baris plan yang berupa full table scan atau automatic index"""
+    return [detail for detail in plan
+            if (FULL_SCAN_RE.match(detail) and FULL_SCAN_RE.match(detail).group(1) not in CATALOG_TABLES)
+            or AUTO_INDEX_RE.search(detail)]
+
+
+def build_temp_database():
+    """Buat database sementara dengan skema + index terbaru dari app.init_db()"""
+    import app
+
+    fd, path = tempfile.mkstemp(suffix=".db", prefix="query_plan_")
+    os.close(fd)
+    app.DB_NAME = path
+    app.init_db()
+    app.close_all_connections()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cek EXPLAIN QUERY PLAN untuk semua query di app.py")
+    parser.add_argument("--db", help="Path database yang dicek (default: database sementara dari init_db)")
+    parser.add_argument("--verbose", action="store_true", help="Tampilkan plan untuk semua query")
+    args = parser.parse_args()
+
+    db_path = args.db or build_temp_database()
+    conn = sqlite3.connect(db_path)
+
+    failures = []
+    warnings = []
+    total = 0
+    try:
+        # Sumber query: "fungsi (baris N)" untuk literal, "label [dinamis: caller]" untuk SQL tertangkap
+        statements = [(f"{func_name} (baris {lineno})", func_name in HOT_QUERY_FUNCTIONS, sql)
+                      for func_name, lineno, sql in extract_sql_statements()]
+        statements += [(f"{label} [dinamis: {caller}]", True, sql)
+                       for label, caller, sql in capture_dynamic_sql(db_path)]
+        for source, hot, sql in statements:
+            total += 1
+            first_line = " ".join(sql.split())[:90]
+            try:
+                plan = explain(conn, sql)
+            except sqlite3.Error as e:
+                (failures if hot else warnings).append(f"{source}: ERROR {e} -> {first_line}")
+                continue
+
+            scans = find_full_scans(plan)
+            if args.verbose:
+                print(f"\n[{'HOT' if hot else '   '}] {source}: {first_line}")
+                for detail in plan:
+                    print(f"      {detail}")
+            if scans:
+                message = f"{source}: {', '.join(scans)} -> {first_line}"
+                (failures if hot else warnings).append(message)
+    finally:
+        conn.close()
+        if not args.db:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+
+    print("\n" + "=" * 60)
+    print(f"📊 {total} query dicek, {len(failures)} gagal, {len(warnings)} peringatan")
+    print("=" * 60)
+    for message in warnings:
+        print(f"⚠️  {message}")
+    for message in failures:
+        print(f"❌ {message}")
+
+    if failures:
+        print("\n❌ Query hot melakukan full table SCAN. Tambahkan index di DB_INDEXES (app.py).")
+        return 1
+    print("\n✓ Semua query hot memakai index.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,48 @@
 """
-Script untuk mengisi database dengan data dummy yang lengkap
-Termasuk: Pelanggan, Transaksi, Karyawan, Presensi, Gaji, Review, dll.
+Generator data dummy untuk demo dan load testing
+Satu generator yang dipakai oleh tombol "Reset & Populate" di app.py maupun script ini.
+Data dibuat dari seed (seed + parameter yang sama = data yang sama) dan ukurannya diatur
+dengan scale factor, dari data demo kecil sampai dataset multi-tahun berisi jutaan baris.
+Baris ditulis per chunk dengan executemany di dalam satu transaksi.
+
+Cara pakai:
+    python populate_dummy_data.py                                      # data demo ke car_wash.db
+    python populate_dummy_data.py --db load_test.db --fresh --scale 50 --days 1095 --seed 42
+    python populate_dummy_data.py --template-dir templates --scale 50 --days 1095 --seed 42 --end-date 2025-12-31
 """
 
-import sqlite3
-import random
-from datetime import datetime, timedelta, date, time
+import argparse
 import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
 import pytz
-import secrets
 
 # Timezone GMT+7 (WIB)
 WIB = pytz.timezone('Asia/Jakarta')
 
 DB_NAME = "car_wash.db"
 
+DEFAULT_DAYS = 60
+DEFAULT_CHUNK_SIZE = 5000
+
+# Ukuran data untuk scale = 1 (data demo); semua volume dikalikan scale
+BASE_CUSTOMERS = 50
+BASE_EMPLOYEES = 8
+WASH_PER_DAY = 3.0
+COFFEE_PER_DAY = 1.5
+COFFEE_ONLY_KASIR_PER_DAY = 0.3
+AUDIT_PER_DAY = 4.0
+WEEKEND_FACTOR = 1.4
+KASIR_COFFEE_RATE = 0.35
+REVIEW_RATE = 0.5
+UNPAID_TODAY_RATE = 0.1
+IN_PROGRESS_TODAY_RATE = 0.2
+
 # Data dummy untuk generate
 NAMA_DEPAN = [
     "Budi", "Siti", "Ahmad", "Dewi", "Rudi", "Ani", "Agus", "Sri", "Bambang", "Lina",
@@ -31,7 +59,7 @@ NAMA_BELAKANG = [
 JENIS_KENDARAAN = ["Mobil", "Motor"]
 
 MERK_MOBIL = [
-    "Toyota", "Honda", "Suzuki", "Daihatsu", "Mitsubishi", "Nissan", "Mazda", 
+    "Toyota", "Honda", "Suzuki", "Daihatsu", "Mitsubishi", "Nissan", "Mazda",
     "Mercedes-Benz", "BMW", "Audi", "Hyundai", "Kia"
 ]
 
@@ -41,6 +69,7 @@ MERK_MOTOR = [
 
 UKURAN_MOBIL = ["Kecil", "Sedang", "Besar", "Extra Besar"]
 
+# Default harga & menu, dipakai jika settings di database belum ada
 PAKET_CUCI = {
     "Cuci Reguler": 50000,
     "Cuci Premium": 75000,
@@ -62,9 +91,21 @@ COFFEE_MENU = {
     "Sandwich": 20000
 }
 
+UKURAN_MULTIPLIER = {
+    "Kecil": 1.0,
+    "Sedang": 1.2,
+    "Besar": 1.5,
+    "Extra Besar": 2.0
+}
+
+SHIFT_TIMES = {
+    "Pagi": ("08:00", "17:00"),
+    "Malam": ("17:00", "08:00")
+}
+
 CHECKLIST_DATANG = [
     "Ban lengkap dan baik",
-    "Wiper berfungsi", 
+    "Wiper berfungsi",
     "Kaca tidak retak",
     "Body tidak penyok",
     "Lampu lengkap",
@@ -95,724 +136,694 @@ REVIEW_TEXTS = [
 
 METODE_BAYAR = ["Tunai", "Transfer", "QRIS", "Debit"]
 
-def generate_nopol():
+ROLES = ["Washer", "QC Inspector", "Kasir", "Supervisor"]
+ROLE_WEIGHTS = [55, 15, 20, 10]
+
+GAJI_RANGES = {
+    "Washer": (3000000, 4000000),
+    "QC Inspector": (3500000, 4500000),
+    "Kasir": (3500000, 4500000),
+    "Supervisor": (5000000, 6000000)
+}
+
+KETERANGAN_KASBON = [
+    "Keperluan mendesak keluarga",
+    "Biaya pengobatan",
+    "Keperluan sekolah anak",
+    "Renovasi rumah",
+    "Bayar hutang lain",
+    "Modal usaha sampingan",
+    "Keperluan hajatan"
+]
+
+AUDIT_ACTIONS = [
+    ("admin", "login", "Admin login ke sistem"),
+    ("kasir", "login", "Kasir login ke sistem"),
+    ("supervisor", "login", "Supervisor login ke sistem"),
+    ("kasir", "transaksi_kasir", "Pembayaran transaksi {nopol}"),
+    ("supervisor", "tambah_cuci", "Transaksi cuci baru {nopol}"),
+    ("supervisor", "selesai_cuci", "Transaksi cuci selesai {nopol}"),
+    ("kasir", "coffee_sale", "Penjualan coffee/snack"),
+    ("admin", "add_attendance", "Presensi karyawan"),
+    ("admin", "update_settings", "Mengubah pengaturan toko"),
+]
+
+# Kolom yang ditulis generator per tabel (id eksplisit agar baris anak bisa langsung mereferensi)
+TABLE_COLUMNS = {
+    'customers': ['id', 'nopol', 'nama_customer', 'no_telp', 'jenis_kendaraan', 'merk_kendaraan',
+                  'ukuran_mobil', 'created_at'],
+    'employees': ['id', 'nama', 'role_karyawan', 'gaji_tetap', 'shift', 'jam_masuk_default',
+                  'jam_pulang_default', 'status', 'no_telp', 'created_at', 'created_by'],
+    'attendance': ['id', 'employee_id', 'tanggal', 'tanggal_iso', 'jam_masuk', 'jam_pulang', 'shift',
+                   'status', 'catatan', 'created_by'],
+    'wash_transactions': ['id', 'nopol', 'nama_customer', 'tanggal', 'tanggal_iso', 'waktu_masuk',
+                          'waktu_selesai', 'paket_cuci', 'harga', 'jenis_kendaraan', 'merk_kendaraan',
+                          'ukuran_mobil', 'checklist_datang', 'checklist_selesai', 'qc_barang', 'catatan',
+                          'status', 'created_by'],
+    'kasir_transactions': ['id', 'nopol', 'nama_customer', 'no_telp', 'tanggal', 'tanggal_iso', 'waktu',
+                           'wash_trans_id', 'paket_cuci', 'harga_cuci', 'coffee_items', 'harga_coffee',
+                           'total_bayar', 'status_bayar', 'metode_bayar', 'secret_code', 'created_by',
+                           'catatan'],
+    'coffee_sales': ['id', 'items', 'total', 'tanggal', 'tanggal_iso', 'waktu', 'nama_customer', 'no_telp',
+                     'created_by'],
+    'sale_items': ['id', 'sale_id', 'kasir_transaction_id', 'item_name', 'qty', 'unit_price'],
+    'customer_reviews': ['id', 'secret_code', 'trans_id', 'trans_type', 'nopol', 'no_telp', 'nama_customer',
+                         'rating', 'review_text', 'review_date', 'review_time', 'reward_points'],
+    'points_ledger': ['id', 'customer_key', 'nopol', 'no_telp', 'nama_customer', 'event_type', 'points',
+                      'balance_after', 'source', 'ref_id', 'keterangan', 'created_at', 'created_by'],
+    'payroll': ['id', 'employee_id', 'periode_awal', 'periode_akhir', 'total_hari_kerja', 'total_gaji',
+                'bonus', 'potongan', 'gaji_bersih', 'status', 'tanggal_bayar', 'catatan', 'created_at',
+                'created_by'],
+    'kas_bon': ['id', 'employee_id', 'tanggal', 'jumlah', 'keterangan', 'status', 'sisa_hutang',
+                'created_at', 'created_by'],
+    'pembayaran_kas_bon': ['id', 'kas_bon_id', 'payroll_id', 'tanggal_bayar', 'jumlah_bayar', 'metode',
+                           'keterangan', 'created_at', 'created_by'],
+    'audit_trail': ['id', 'timestamp', 'timestamp_iso', 'user', 'action', 'detail'],
+}
+
+# Secret code: id di-scramble secara bijektif ke 8 karakter base32, jadi unik tanpa cek ke database
+SECRET_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+SECRET_SPACE = len(SECRET_ALPHABET) ** 8
+SECRET_MULTIPLIER = 0x9E3779B1
+
+
+def generate_nopol(rng):
     """Generate nomor polisi kendaraan random"""
     huruf = ['B', 'D', 'L', 'F', 'N', 'T', 'S', 'H', 'K', 'R']
-    angka = random.randint(1000, 9999)
-    huruf_akhir = random.choice(['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z'])
-    huruf_akhir2 = random.choice(['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T'])
-    return f"{random.choice(huruf)}{angka}{huruf_akhir}{huruf_akhir2}"
+    angka = rng.randint(1000, 9999)
+    huruf_akhir = rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+    huruf_akhir2 = rng.choice('ABCDEFGHIJKLMNOPQRST')
+    return f"{rng.choice(huruf)}{angka}{huruf_akhir}{huruf_akhir2}"
 
-def generate_phone():
+def generate_phone(rng):
     """Generate nomor telepon random"""
-    return f"08{random.randint(1, 9)}{random.randint(10000000, 99999999)}"
+    return f"08{rng.randint(1, 9)}{rng.randint(10000000, 99999999)}"
 
-def generate_nama():
+def generate_nama(rng):
     """Generate nama random"""
-    return f"{random.choice(NAMA_DEPAN)} {random.choice(NAMA_BELAKANG)}"
+    return f"{rng.choice(NAMA_DEPAN)} {rng.choice(NAMA_BELAKANG)}"
 
-def generate_secret_code():
-    """Generate unique 8-character secret code"""
-    return secrets.token_urlsafe(6).upper().replace('-', 'X').replace('_', 'Y')[:8]
+def secret_code_for(row_id, salt):
+    """Secret code 8 karakter yang unik per id transaksi kasir"""
+    value = (row_id * SECRET_MULTIPLIER + salt) % SECRET_SPACE
+    code = []
+    for _ in range(8):
+        value, index = divmod(value, len(SECRET_ALPHABET))
+        code.append(SECRET_ALPHABET[index])
+    return ''.join(code)
 
 def format_date(date_obj):
-    """Format datetime ke string dd-mm-yyyy"""
+    """Format date ke string dd-mm-yyyy"""
     return date_obj.strftime('%d-%m-%Y')
 
-def format_time(time_obj):
-    """Format time ke string HH:MM"""
-    if isinstance(time_obj, str):
-        return time_obj
-    return time_obj.strftime('%H:%M')
-
 def format_datetime(dt):
     """Format datetime ke string dd-mm-yyyy HH:MM:SS"""
     return dt.strftime('%d-%m-%Y %H:%M:%S')
 
-def populate_customers(conn, num_customers=50):
-    """Populate customers table dengan data dummy"""
-    print(f"Membuat {num_customers} pelanggan dummy...")
-    c = conn.cursor()
+def points_customer_key(nopol, no_telp):
+    """Identitas akun poin, sama dengan app.points_customer_key (nopol, atau TELP:<no> jika tanpa nopol)"""
+    nopol = ''.join(str(nopol or '').split()).upper()
+    if nopol:
+        return nopol
+    digits = ''.join(ch for ch in str(no_telp or '') if ch.isdigit())
+    if digits.startswith('62'):
+        digits = '0' + digits[2:]
+    elif digits.startswith('8'):
+        digits = '0' + digits
+    return f"TELP:{digits}" if digits else None
+
+def random_seconds(rng, start_hour=8, end_hour=20):
+    """Detik random dalam jam operasional (start_hour:00 - end_hour:59)"""
+    return rng.randint(start_hour * 3600, end_hour * 3600 + 3599)
+
+def format_clock(seconds):
+    """Format detik dalam hari ke string HH:MM:SS"""
+    seconds = min(seconds, 24 * 3600 - 1)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def random_count(rng, expected):
+    """Bulatkan rata-rata ke jumlah bulat secara acak (nilai harapan tetap `expected`)"""
+    count = int(expected)
+    return count + (1 if rng.random() < expected - count else 0)
+
+def daily_count(rng, rate, day):
+    """Jumlah kejadian per hari: rate rata-rata dengan variasi harian dan lonjakan di akhir pekan"""
+    expected = rate * rng.uniform(0.7, 1.3)
+    if day.weekday() >= 5:
+        expected *= WEEKEND_FACTOR
+    return random_count(rng, expected)
+
+def coffee_order(rng, menu, max_items):
+    """Buat pesanan coffee/snack dalam format yang sama dengan menu Kasir, return (items, total)"""
+    items = []
+    total = 0
+    for name in rng.sample(list(menu), rng.randint(1, min(max_items, len(menu)))):
+        qty = rng.randint(1, 2)
+        price = menu[name]
+        items.append({'name': name, 'price': price, 'qty': qty, 'subtotal': price * qty})
+        total += price * qty
+    return items, total
+
+
+class ChunkedInserter:
+    """Buffer baris per tabel dan tulis dengan executemany setiap `chunk_size` baris"""
+
+    def __init__(self, conn, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.buffers = {table: [] for table in TABLE_COLUMNS}
+        self.counts = {table: 0 for table in TABLE_COLUMNS}
+
+    def add(self, table, row):
+        buffer = self.buffers[table]
+        buffer.append(row)
+        if len(buffer) >= self.chunk_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        for name in ([table] if table else list(self.buffers)):
+            buffer = self.buffers[name]
+            if not buffer:
+                continue
+            columns = TABLE_COLUMNS[name]
+            self.conn.executemany(
+                f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                buffer
+            )
+            self.counts[name] += len(buffer)
+            buffer.clear()
+
+
+def next_id(conn, table):
+    """Id berikutnya untuk tabel (generator menulis id eksplisit)"""
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+
+def load_setting(conn, key, default):
+    """Baca setting JSON dari database, fallback ke default"""
+    row = conn.execute("SELECT setting_value FROM settings WHERE setting_key = ?", (key,)).fetchone()
+    if not row:
+        return default
+    try:
+        return json.loads(row[0]) or default
+    except ValueError:
+        return default
+
+def load_shift_settings(conn):
+    """Return {shift: (jam_mulai, jam_selesai, persentase_gaji)} dari shift_settings"""
+    rows = conn.execute("SELECT shift_name, jam_mulai, jam_selesai, persentase_gaji FROM shift_settings").fetchall()
+    if not rows:
+        return {name: (start, end, 100.0) for name, (start, end) in SHIFT_TIMES.items()}
+    return {name: (start, end, pct) for name, start, end, pct in rows}
+
+
+def _generate_customers(rng, conn, inserter, count, start_date):
+    """Buat pelanggan baru dengan nopol unik, return list dict pelanggan"""
+    used_nopol = {row[0] for row in conn.execute("SELECT nopol FROM customers")}
+    customer_id = next_id(conn, 'customers')
     customers = []
-    
-    for i in range(num_customers):
-        nopol = generate_nopol()
-        nama = generate_nama()
-        no_telp = generate_phone()
-        jenis_kendaraan = random.choice(JENIS_KENDARAAN)
-        
+    while len(customers) < count:
+        nopol = generate_nopol(rng)
+        if nopol in used_nopol:
+            continue
+        used_nopol.add(nopol)
+        jenis_kendaraan = rng.choices(JENIS_KENDARAAN, weights=[75, 25])[0]
         if jenis_kendaraan == "Mobil":
-            merk = random.choice(MERK_MOBIL)
-            ukuran = random.choice(UKURAN_MOBIL)
+            merk = rng.choice(MERK_MOBIL)
+            ukuran = rng.choice(UKURAN_MOBIL)
         else:
-            merk = random.choice(MERK_MOTOR)
+            merk = rng.choice(MERK_MOTOR)
             ukuran = "Kecil"
-        
-        # Tanggal registrasi dalam 6 bulan terakhir
-        days_ago = random.randint(1, 180)
-        created_at = datetime.now(WIB) - timedelta(days=days_ago)
-        
-        try:
-            c.execute("""
-                INSERT INTO customers (nopol, nama_customer, no_telp, jenis_kendaraan, merk_kendaraan, ukuran_mobil, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (nopol, nama, no_telp, jenis_kendaraan, merk, ukuran, format_datetime(created_at)))
-            
-            customers.append({
-                'nopol': nopol,
-                'nama': nama,
-                'no_telp': no_telp,
-                'jenis_kendaraan': jenis_kendaraan,
-                'merk': merk,
-                'ukuran': ukuran,
-                'created_at': created_at
-            })
-        except sqlite3.IntegrityError:
-            # Nopol duplikat, skip
-            continue
-    
-    conn.commit()
-    print(f"✓ {len(customers)} pelanggan berhasil ditambahkan")
+        created_at = datetime.combine(start_date - timedelta(days=rng.randint(1, 180)),
+                                      datetime.min.time()) + timedelta(minutes=rng.randint(480, 1200))
+        customer = {
+            'id': customer_id, 'nopol': nopol, 'nama': generate_nama(rng), 'no_telp': generate_phone(rng),
+            'jenis_kendaraan': jenis_kendaraan, 'merk': merk, 'ukuran': ukuran
+        }
+        inserter.add('customers', (customer_id, nopol, customer['nama'], customer['no_telp'],
+                                   jenis_kendaraan, merk, ukuran, format_datetime(created_at)))
+        customers.append(customer)
+        customer_id += 1
     return customers
 
-def populate_employees(conn, num_employees=8):
-    """Populate employees table dengan data dummy"""
-    print(f"Membuat {num_employees} karyawan dummy...")
-    c = conn.cursor()
-    
-    roles = ["Washer", "QC Inspector", "Kasir", "Supervisor"]
-    gaji_ranges = {
-        "Washer": (3000000, 4000000),
-        "QC Inspector": (3500000, 4500000),
-        "Kasir": (3500000, 4500000),
-        "Supervisor": (5000000, 6000000)
-    }
-    
-    shifts = ["Pagi", "Malam"]
-    shift_times = {
-        "Pagi": ("08:00", "17:00"),
-        "Malam": ("17:00", "08:00")
-    }
-    
+
+def _generate_employees(rng, conn, inserter, count, shift_settings, start_date):
+    """Buat karyawan aktif, return list dict karyawan"""
+    employee_id = next_id(conn, 'employees')
     employees = []
-    now = datetime.now(WIB)
-    
-    for i in range(num_employees):
-        nama = generate_nama()
-        role = random.choice(roles)
-        gaji_min, gaji_max = gaji_ranges[role]
-        gaji = random.randint(gaji_min // 100000, gaji_max // 100000) * 100000
-        shift = random.choice(shifts)
-        jam_masuk, jam_pulang = shift_times[shift]
-        no_telp = generate_phone()
-        
-        created_at = now - timedelta(days=random.randint(30, 365))
-        
-        c.execute("""
-            INSERT INTO employees (nama, role_karyawan, gaji_tetap, shift, jam_masuk_default, 
-                                   jam_pulang_default, status, no_telp, created_at, created_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (nama, role, gaji, shift, jam_masuk, jam_pulang, "Aktif", no_telp, 
-              format_datetime(created_at), "admin"))
-        
-        employee_id = c.lastrowid
-        employees.append({
-            'id': employee_id,
-            'nama': nama,
-            'role': role,
-            'gaji': gaji,
-            'shift': shift,
-            'jam_masuk': jam_masuk,
-            'jam_pulang': jam_pulang,
-            'created_at': created_at
-        })
-    
-    conn.commit()
-    print(f"✓ {len(employees)} karyawan berhasil ditambahkan")
+    for _ in range(count):
+        role = rng.choices(ROLES, weights=ROLE_WEIGHTS)[0]
+        gaji_min, gaji_max = GAJI_RANGES[role]
+        gaji = rng.randint(gaji_min // 100000, gaji_max // 100000) * 100000
+        shift = rng.choice(sorted(shift_settings))
+        jam_masuk, jam_pulang, _ = shift_settings[shift]
+        created_at = datetime.combine(start_date - timedelta(days=rng.randint(30, 365)), datetime.min.time())
+        employee = {'id': employee_id, 'nama': generate_nama(rng), 'role': role, 'gaji': gaji,
+                    'shift': shift, 'jam_masuk': jam_masuk, 'jam_pulang': jam_pulang}
+        inserter.add('employees', (employee_id, employee['nama'], role, gaji, shift, jam_masuk, jam_pulang,
+                                   "Aktif", generate_phone(rng), format_datetime(created_at), "admin"))
+        employees.append(employee)
+        employee_id += 1
     return employees
 
-def populate_attendance(conn, employees, days=60):
-    """Populate attendance table dengan data presensi dummy"""
-    print(f"Membuat data presensi {days} hari terakhir...")
-    c = conn.cursor()
-    
-    attendance_records = []
-    now = datetime.now(WIB)
-    
-    for employee in employees:
-        # Generate attendance untuk 60 hari terakhir
-        for day in range(days):
-            tanggal = now - timedelta(days=day)
-            
-            # 90% hadir, 5% izin, 5% alpha
-            rand = random.random()
+
+def _shift_clock(rng, base, min_offset, max_offset):
+    """Jam presensi = jam default shift + variasi menit, format HH:MM"""
+    hour, minute = map(int, base.split(':'))
+    total = (hour * 60 + minute + rng.randint(min_offset, max_offset)) % (24 * 60)
+    return f"{total // 60:02d}:{total % 60:02d}"
+
+
+def _generate_days(rng, conn, inserter, customers, employees, dates, scale, prices, code_salt):
+    """Transaksi harian berurutan per tanggal: cuci, kasir, review, coffee, presensi, audit
+
+    Return {customer_key: [nopol, no_telp, nama, poin, tanggal review terakhir]} untuk customer_points.
+    """
+    paket_cucian, coffee_menu, ukuran_multiplier = prices
+    wash_id = next_id(conn, 'wash_transactions')
+    kasir_id = next_id(conn, 'kasir_transactions')
+    coffee_id = next_id(conn, 'coffee_sales')
+    sale_item_id = next_id(conn, 'sale_items')
+    review_id = next_id(conn, 'customer_reviews')
+    ledger_id = next_id(conn, 'points_ledger')
+    # Saldo poin yang sudah ada, untuk balance_after di ledger
+    balances = dict(conn.execute("SELECT customer_key, total_points FROM customer_points WHERE customer_key IS NOT NULL"))
+    attendance_id = next_id(conn, 'attendance')
+    audit_id = next_id(conn, 'audit_trail')
+    end_date = dates[-1]
+    paket_names = list(paket_cucian)
+    points = {}
+
+    for day in dates:
+        tanggal = format_date(day)
+        tanggal_iso = day.isoformat()
+        is_today = day == end_date
+
+        # Transaksi cuci + pembayaran kasir, urut jam masuk
+        washes = sorted(random_seconds(rng) for _ in range(daily_count(rng, WASH_PER_DAY * scale, day)))
+        for masuk in washes:
+            customer = rng.choice(customers)
+            paket = rng.choice(paket_names)
+            harga = int(paket_cucian[paket] * ukuran_multiplier.get(customer['ukuran'], 1.0))
+            waktu_masuk = format_clock(masuk)
+            waktu_selesai = format_clock(masuk + rng.randint(45 * 60, 180 * 60))
+
+            in_progress = is_today and rng.random() < IN_PROGRESS_TODAY_RATE
+            inserter.add('wash_transactions', (
+                wash_id, customer['nopol'], customer['nama'], tanggal, tanggal_iso, waktu_masuk,
+                '' if in_progress else waktu_selesai, paket, harga, customer['jenis_kendaraan'],
+                customer['merk'], customer['ukuran'],
+                json.dumps(rng.sample(CHECKLIST_DATANG, rng.randint(4, len(CHECKLIST_DATANG)))),
+                json.dumps([] if in_progress else rng.sample(CHECKLIST_SELESAI, rng.randint(4, len(CHECKLIST_SELESAI)))),
+                "OK", "", "Dalam Proses" if in_progress else "Selesai", "supervisor"
+            ))
+
+            if not in_progress:
+                if rng.random() < KASIR_COFFEE_RATE:
+                    items, harga_coffee = coffee_order(rng, coffee_menu, 2)
+                else:
+                    items, harga_coffee = [], 0
+                status_bayar = "Belum Lunas" if is_today and rng.random() < UNPAID_TODAY_RATE else "Lunas"
+                secret_code = secret_code_for(kasir_id, code_salt)
+                inserter.add('kasir_transactions', (
+                    kasir_id, customer['nopol'], customer['nama'], customer['no_telp'], tanggal, tanggal_iso,
+                    waktu_selesai, wash_id, paket, harga, json.dumps(items) if items else None, harga_coffee,
+                    harga + harga_coffee, status_bayar, rng.choice(METODE_BAYAR), secret_code, "kasir", ""
+                ))
+                for item in items:
+                    inserter.add('sale_items', (sale_item_id, None, kasir_id, item['name'], item['qty'], item['price']))
+                    sale_item_id += 1
+
+                if status_bayar == "Lunas" and rng.random() < REVIEW_RATE:
+                    rating = rng.choices([3, 4, 5], weights=[10, 40, 50])[0]
+                    reward_points = rating * 10
+                    review_date = min(day + timedelta(days=rng.randint(0, 2)), end_date)
+                    review_text = rng.choice(REVIEW_TEXTS)
+                    review_time = format_clock(random_seconds(rng))
+                    inserter.add('customer_reviews', (
+                        review_id, secret_code, kasir_id, "kasir", customer['nopol'], customer['no_telp'],
+                        customer['nama'], rating, review_text, format_date(review_date), review_time, reward_points
+                    ))
+                    key = points_customer_key(customer['nopol'], customer['no_telp'])
+                    entry = points.setdefault(key, [customer['nopol'], customer['no_telp'], customer['nama'], 0, review_date])
+                    entry[3] += reward_points
+                    entry[4] = max(entry[4], review_date)
+                    inserter.add('points_ledger', (
+                        ledger_id, key, customer['nopol'], customer['no_telp'], customer['nama'], 'earn',
+                        reward_points, balances.get(key, 0) + entry[3], 'review', secret_code,
+                        f"Review transaksi {secret_code}", f"{format_date(review_date)} {review_time}", 'customer'
+                    ))
+                    ledger_id += 1
+                    review_id += 1
+                kasir_id += 1
+            wash_id += 1
+
+        # Pembelian coffee/snack tanpa cuci lewat menu Kasir
+        for _ in range(daily_count(rng, COFFEE_ONLY_KASIR_PER_DAY * scale, day)):
+            customer = rng.choice(customers)
+            items, harga_coffee = coffee_order(rng, coffee_menu, 3)
+            inserter.add('kasir_transactions', (
+                kasir_id, customer['nopol'], customer['nama'], customer['no_telp'], tanggal, tanggal_iso,
+                format_clock(random_seconds(rng)), None, None, 0, json.dumps(items), harga_coffee, harga_coffee,
+                "Lunas", rng.choice(METODE_BAYAR), secret_code_for(kasir_id, code_salt), "kasir", ""
+            ))
+            for item in items:
+                inserter.add('sale_items', (sale_item_id, None, kasir_id, item['name'], item['qty'], item['price']))
+                sale_item_id += 1
+            kasir_id += 1
+
+        # Penjualan coffee/snack standalone (30% dengan nama pembeli)
+        for waktu in sorted(random_seconds(rng) for _ in range(daily_count(rng, COFFEE_PER_DAY * scale, day))):
+            items, total = coffee_order(rng, coffee_menu, 3)
+            if rng.random() < 0.3:
+                nama_customer, no_telp = generate_nama(rng), generate_phone(rng)
+            else:
+                nama_customer = no_telp = None
+            inserter.add('coffee_sales', (coffee_id, json.dumps(items), total, tanggal, tanggal_iso,
+                                          format_clock(waktu), nama_customer, no_telp, "kasir"))
+            for item in items:
+                inserter.add('sale_items', (sale_item_id, coffee_id, None, item['name'], item['qty'], item['price']))
+                sale_item_id += 1
+            coffee_id += 1
+
+        # Presensi: 90% hadir, 5% izin, 5% alpha
+        for employee in employees:
+            rand = rng.random()
             if rand < 0.90:
-                status = "Hadir"
-                
-                # Jam masuk dengan sedikit variasi
-                jam_masuk_base = datetime.strptime(employee['jam_masuk'], "%H:%M")
-                variasi_menit = random.randint(-15, 30)
-                jam_masuk = (datetime.combine(tanggal.date(), jam_masuk_base.time()) + 
-                            timedelta(minutes=variasi_menit))
-                
-                # Jam pulang dengan sedikit variasi
-                jam_pulang_base = datetime.strptime(employee['jam_pulang'], "%H:%M")
-                variasi_menit = random.randint(-30, 15)
-                jam_pulang = (datetime.combine(tanggal.date(), jam_pulang_base.time()) + 
-                             timedelta(minutes=variasi_menit))
-                
-                c.execute("""
-                    INSERT INTO attendance (employee_id, tanggal, jam_masuk, jam_pulang, 
-                                           shift, status, catatan, created_by)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (employee['id'], format_date(tanggal), format_time(jam_masuk), 
-                      format_time(jam_pulang), employee['shift'], status, "", "system"))
-                
-                attendance_records.append({
-                    'employee_id': employee['id'],
-                    'tanggal': tanggal,
-                    'status': status
-                })
+                row = (_shift_clock(rng, employee['jam_masuk'], -15, 30),
+                       _shift_clock(rng, employee['jam_pulang'], -30, 15), "Hadir", "")
             elif rand < 0.95:
-                status = "Izin"
-                c.execute("""
-                    INSERT INTO attendance (employee_id, tanggal, jam_masuk, jam_pulang,
-                                           shift, status, catatan, created_by)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (employee['id'], format_date(tanggal), "", "", 
-                      employee['shift'], status, "Izin keluarga", "system"))
-                
-                attendance_records.append({
-                    'employee_id': employee['id'],
-                    'tanggal': tanggal,
-                    'status': status
-                })
+                row = ("", "", "Izin", "Izin keluarga")
             else:
-                status = "Alpha"
-                c.execute("""
-                    INSERT INTO attendance (employee_id, tanggal, jam_masuk, jam_pulang,
-                                           shift, status, catatan, created_by)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (employee['id'], format_date(tanggal), "", "", 
-                      employee['shift'], status, "", "system"))
-                
-                attendance_records.append({
-                    'employee_id': employee['id'],
-                    'tanggal': tanggal,
-                    'status': status
-                })
-    
-    conn.commit()
-    print(f"✓ {len(attendance_records)} record presensi berhasil ditambahkan")
-    return attendance_records
-
-def populate_payroll(conn, employees, attendance_records):
-    """Populate payroll table dengan data gaji dummy"""
-    print("Membuat data gaji bulanan...")
-    c = conn.cursor()
-    
-    # Load shift settings untuk persentase
-    c.execute("SELECT shift_name, persentase_gaji FROM shift_settings")
-    shift_percentages = dict(c.fetchall())
-    
-    payroll_records = []
-    now = datetime.now(WIB)
-    
-    # Generate payroll untuk 3 bulan terakhir
-    for month_offset in range(3):
-        # Tentukan periode
-        if month_offset == 0:
-            # Bulan ini (tanggal 1 sampai hari ini)
-            periode_akhir = now
-            periode_awal = datetime(now.year, now.month, 1, tzinfo=WIB)
-        else:
-            # Bulan sebelumnya (full month)
-            target_month = now.month - month_offset
-            target_year = now.year
-            if target_month <= 0:
-                target_month += 12
-                target_year -= 1
-            
-            periode_awal = datetime(target_year, target_month, 1, tzinfo=WIB)
-            
-            # Akhir bulan
-            if target_month == 12:
-                next_month = 1
-                next_year = target_year + 1
-            else:
-                next_month = target_month + 1
-                next_year = target_year
-            periode_akhir = datetime(next_year, next_month, 1, tzinfo=WIB) - timedelta(days=1)
-        
-        for employee in employees:
-            # Hitung hari kerja dari attendance
-            hari_kerja = sum(1 for att in attendance_records 
-                           if att['employee_id'] == employee['id'] 
-                           and att['status'] == 'Hadir'
-                           and periode_awal <= att['tanggal'] <= periode_akhir)
-            
-            # Hitung gaji berdasarkan shift
-            shift = employee['shift']
-            persentase = shift_percentages.get(shift, 100.0) / 100.0
-            
-            # Total gaji = gaji tetap * persentase * (hari kerja / hari dalam periode)
-            total_hari_periode = (periode_akhir - periode_awal).days + 1
-            gaji_harian = employee['gaji'] * persentase / total_hari_periode
-            total_gaji = int(gaji_harian * hari_kerja)
-            
-            # Bonus random (0-500k)
-            bonus = random.randint(0, 5) * 100000
-            
-            # Potongan random (0-200k)
-            potongan = random.randint(0, 2) * 100000
-            
-            gaji_bersih = total_gaji + bonus - potongan
-            
-            # Status: Lunas untuk bulan lalu, Pending untuk bulan ini
-            if month_offset == 0:
-                status = "Pending"
-                tanggal_bayar = None
+                row = ("", "", "Alpha", "")
+            inserter.add('attendance', (attendance_id, employee['id'], tanggal, tanggal_iso, row[0], row[1],
+                                        employee['shift'], row[2], row[3], "system"))
+            attendance_id += 1
+
+        # Aktivitas user di audit trail
+        for seconds in sorted(random_seconds(rng, 7, 21) for _ in range(daily_count(rng, AUDIT_PER_DAY * scale, day))):
+            user, action, detail = rng.choice(AUDIT_ACTIONS)
+            timestamp = datetime.combine(day, datetime.min.time()) + timedelta(seconds=seconds)
+            inserter.add('audit_trail', (audit_id, format_datetime(timestamp), timestamp.isoformat(sep=' '),
+                                         user, action, detail.format(nopol=rng.choice(customers)['nopol'])))
+            audit_id += 1
+
+    return points
+
+
+def _generate_payroll(rng, conn, inserter, employees, dates, shift_settings):
+    """Slip gaji mingguan per karyawan, return (id payroll pertama, jumlah minggu, tanggal awal minggu pertama)"""
+    end_date = dates[-1]
+    num_weeks = max(1, len(dates) // 7)
+    first_week_start = end_date - timedelta(days=num_weeks * 7 - 1)
+    payroll_id = first_payroll_id = next_id(conn, 'payroll')
+
+    for employee in employees:
+        shift_pct = shift_settings.get(employee['shift'], (None, None, 35.0))[2] / 100
+        for week in range(num_weeks):
+            week_start = first_week_start + timedelta(days=week * 7)
+            week_end = week_start + timedelta(days=6)
+            hari_kerja = rng.randint(5, 6)
+            if employee['role'] in ['Kasir', 'Supervisor']:
+                # Gaji tetap per minggu
+                total_gaji = employee['gaji']
             else:
-                status = "Lunas"
-                # Tanggal bayar: tanggal 5 bulan berikutnya
-                if periode_akhir.month == 12:
-                    tanggal_bayar = datetime(periode_akhir.year + 1, 1, 5, tzinfo=WIB)
+                # Worker - persentase shift dari pendapatan harian
+                total_gaji = int(rng.randint(500000, 1500000) * shift_pct * hari_kerja)
+            bonus = rng.randint(0, 4) * 50000
+            potongan = rng.randint(0, 2) * 50000
+            tanggal_bayar = week_end + timedelta(days=2)
+            lunas = tanggal_bayar <= end_date
+            inserter.add('payroll', (
+                payroll_id, employee['id'], format_date(week_start), format_date(week_end), hari_kerja,
+                total_gaji, bonus, potongan, total_gaji + bonus - potongan, "Lunas" if lunas else "Pending",
+                format_date(tanggal_bayar) if lunas else None,
+                f"Periode {format_date(week_start)} - {format_date(week_end)}",
+                format_datetime(datetime.combine(week_end, datetime.min.time())), "admin"
+            ))
+            payroll_id += 1
+
+    return first_payroll_id, num_weeks, first_week_start
+
+
+def _generate_kas_bon(rng, conn, inserter, employees, dates, payroll_index):
+    """Kas bon karyawan + cicilan pembayaran; cicilan potong gaji di-link ke slip gaji minggu yang sama"""
+    first_payroll_id, num_weeks, first_week_start = payroll_index
+    start_date, end_date = dates[0], dates[-1]
+    kas_bon_id = next_id(conn, 'kas_bon')
+    pembayaran_id = next_id(conn, 'pembayaran_kas_bon')
+    # Rata-rata 0.6 kas bon per karyawan per 60 hari
+    per_employee = 0.6 * len(dates) / 60
+
+    for emp_index, employee in enumerate(employees):
+        for _ in range(random_count(rng, per_employee)):
+            tanggal_kasbon = start_date + timedelta(days=rng.randint(0, len(dates) - 1))
+            jumlah = rng.randint(4, 20) * 50000
+            sisa = jumlah
+            pembayaran = []
+            num_cicilan = rng.randint(2, 5)
+            for cicilan_idx in range(num_cicilan):
+                tanggal_bayar = tanggal_kasbon + timedelta(days=rng.randint(7, 14) * (cicilan_idx + 1))
+                # Hanya cicilan yang sudah jatuh tempo sampai tanggal akhir data
+                if tanggal_bayar > end_date:
+                    break
+                if cicilan_idx == num_cicilan - 1:
+                    # Cicilan terakhir: bayar sisa
+                    jumlah_bayar = sisa
                 else:
-                    tanggal_bayar = datetime(periode_akhir.year, periode_akhir.month + 1, 5, tzinfo=WIB)
-            
-            c.execute("""
-                INSERT INTO payroll (employee_id, periode_awal, periode_akhir, total_hari_kerja,
-                                    total_gaji, bonus, potongan, gaji_bersih, status, 
-                                    tanggal_bayar, catatan, created_at, created_by)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (employee['id'], format_date(periode_awal), format_date(periode_akhir), 
-                  hari_kerja, total_gaji, bonus, potongan, gaji_bersih, status,
-                  format_date(tanggal_bayar) if tanggal_bayar else None,
-                  f"Shift {shift} - {persentase*100:.0f}% dari gaji tetap",
-                  format_datetime(now), "admin"))
-            
-            payroll_records.append({
-                'employee_id': employee['id'],
-                'periode': f"{format_date(periode_awal)} - {format_date(periode_akhir)}",
-                'gaji_bersih': gaji_bersih
-            })
-    
-    conn.commit()
-    print(f"✓ {len(payroll_records)} record gaji berhasil ditambahkan")
-    return payroll_records
-
-def populate_wash_transactions(conn, customers, num_transactions=200):
-    """Populate wash_transactions table dengan data transaksi cuci dummy"""
-    print(f"Membuat {num_transactions} transaksi cuci dummy...")
-    c = conn.cursor()
-    
-    transactions = []
-    now = datetime.now(WIB)
-    
-    # Load ukuran multiplier
-    c.execute("SELECT setting_value FROM settings WHERE setting_key = 'ukuran_multiplier'")
-    result = c.fetchone()
-    if result:
-        ukuran_multiplier = json.loads(result[0])
-    else:
-        ukuran_multiplier = {
-            "Kecil": 1.0,
-            "Sedang": 1.2,
-            "Besar": 1.5,
-            "Extra Besar": 2.0
-        }
-    
-    for i in range(num_transactions):
-        customer = random.choice(customers)
-        
-        # Tanggal transaksi dalam 90 hari terakhir
-        days_ago = random.randint(0, 90)
-        tanggal = now - timedelta(days=days_ago)
-        
-        # Waktu masuk (jam 8 pagi - 8 malam)
-        jam_masuk = random.randint(8, 20)
-        menit_masuk = random.randint(0, 59)
-        waktu_masuk = f"{jam_masuk:02d}:{menit_masuk:02d}"
-        
-        # Waktu selesai (1-3 jam setelah masuk)
-        durasi_jam = random.randint(1, 3)
-        waktu_selesai_dt = datetime.combine(tanggal.date(), 
-                                           datetime.strptime(waktu_masuk, "%H:%M").time()) + \
-                           timedelta(hours=durasi_jam, minutes=random.randint(0, 59))
-        waktu_selesai = format_time(waktu_selesai_dt)
-        
-        # Pilih paket
-        paket = random.choice(list(PAKET_CUCI.keys()))
-        harga_base = PAKET_CUCI[paket]
-        
-        # Hitung harga dengan multiplier ukuran
-        multiplier = ukuran_multiplier.get(customer['ukuran'], 1.0)
-        harga = int(harga_base * multiplier)
-        
-        # Checklist
-        checklist_datang_items = random.sample(CHECKLIST_DATANG, random.randint(4, 6))
-        checklist_selesai_items = random.sample(CHECKLIST_SELESAI, random.randint(4, 6))
-        
-        # Status (95% Selesai, 5% Dalam Proses untuk transaksi hari ini)
-        if days_ago == 0 and random.random() < 0.05:
-            status = "Dalam Proses"
-            waktu_selesai = None
-            checklist_selesai_items = []
-        else:
-            status = "Selesai"
-        
-        c.execute("""
-            INSERT INTO wash_transactions (nopol, nama_customer, tanggal, waktu_masuk, waktu_selesai,
-                                          paket_cuci, harga, jenis_kendaraan, merk_kendaraan, ukuran_mobil,
-                                          checklist_datang, checklist_selesai, qc_barang, catatan, 
-                                          status, created_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (customer['nopol'], customer['nama'], format_date(tanggal), waktu_masuk, waktu_selesai,
-              paket, harga, customer['jenis_kendaraan'], customer['merk'], customer['ukuran'],
-              json.dumps(checklist_datang_items), json.dumps(checklist_selesai_items),
-              "OK", "", status, "admin"))
-        
-        trans_id = c.lastrowid
-        transactions.append({
-            'id': trans_id,
-            'nopol': customer['nopol'],
-            'nama': customer['nama'],
-            'no_telp': customer['no_telp'],
-            'tanggal': tanggal,
-            'waktu_masuk': waktu_masuk,
-            'paket': paket,
-            'harga': harga,
-            'status': status
-        })
-    
-    conn.commit()
-    print(f"✓ {len(transactions)} transaksi cuci berhasil ditambahkan")
-    return transactions
-
-def populate_coffee_sales(conn, num_sales=150):
-    """Populate coffee_sales table dengan data penjualan kopi/snack dummy"""
-    print(f"Membuat {num_sales} transaksi coffee/snack dummy...")
-    c = conn.cursor()
-    
-    sales = []
-    now = datetime.now(WIB)
-    
-    for i in range(num_sales):
-        # Tanggal dalam 90 hari terakhir
-        days_ago = random.randint(0, 90)
-        tanggal = now - timedelta(days=days_ago)
-        
-        # Waktu (jam 8 pagi - 8 malam)
-        jam = random.randint(8, 20)
-        menit = random.randint(0, 59)
-        waktu = f"{jam:02d}:{menit:02d}"
-        
-        # Pilih 1-3 item
-        num_items = random.randint(1, 3)
-        items = []
-        total = 0
-        
-        for _ in range(num_items):
-            item_name = random.choice(list(COFFEE_MENU.keys()))
-            qty = random.randint(1, 2)
-            price = COFFEE_MENU[item_name]
-            subtotal = price * qty
-            total += subtotal
-            
-            items.append({
-                'nama': item_name,
-                'harga': price,
-                'qty': qty,
-                'subtotal': subtotal
-            })
-        
-        # 30% chance ada nama customer
-        if random.random() < 0.3:
-            nama_customer = generate_nama()
-            no_telp = generate_phone()
-        else:
-            nama_customer = None
-            no_telp = None
-        
-        c.execute("""
-            INSERT INTO coffee_sales (items, total, tanggal, waktu, nama_customer, no_telp, created_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (json.dumps(items), total, format_date(tanggal), waktu, 
-              nama_customer, no_telp, "kasir"))
-        
-        sales.append({
-            'tanggal': tanggal,
-            'total': total
-        })
-    
-    conn.commit()
-    print(f"✓ {len(sales)} transaksi coffee/snack berhasil ditambahkan")
-    return sales
-
-def populate_kasir_transactions(conn, wash_transactions, coffee_sales_count):
-    """Populate kasir_transactions table dengan data transaksi kasir dummy"""
-    print(f"Membuat transaksi kasir dari transaksi cuci...")
-    c = conn.cursor()
-    
-    kasir_trans = []
-    
-    # Untuk setiap wash transaction yang sudah selesai, buat kasir transaction
-    for wash_trans in wash_transactions:
-        if wash_trans['status'] == 'Selesai':
-            # 40% chance juga beli coffee/snack
-            has_coffee = random.random() < 0.4
-            
-            if has_coffee:
-                # Generate coffee items
-                num_items = random.randint(1, 2)
-                coffee_items = []
-                harga_coffee = 0
-                
-                for _ in range(num_items):
-                    item_name = random.choice(list(COFFEE_MENU.keys()))
-                    qty = random.randint(1, 2)
-                    price = COFFEE_MENU[item_name]
-                    subtotal = price * qty
-                    harga_coffee += subtotal
-                    
-                    coffee_items.append({
-                        'nama': item_name,
-                        'harga': price,
-                        'qty': qty,
-                        'subtotal': subtotal
-                    })
-            else:
-                coffee_items = []
-                harga_coffee = 0
-            
-            total_bayar = wash_trans['harga'] + harga_coffee
-            
-            # Generate secret code
-            secret_code = generate_secret_code()
-            
-            # Metode bayar
-            metode_bayar = random.choice(METODE_BAYAR)
-            
-            c.execute("""
-                INSERT INTO kasir_transactions (nopol, nama_customer, no_telp, tanggal, waktu,
-                                               wash_trans_id, paket_cuci, harga_cuci, 
-                                               coffee_items, harga_coffee, total_bayar, 
-                                               status_bayar, metode_bayar, secret_code, 
-                                               created_by, catatan)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (wash_trans['nopol'], wash_trans['nama'], wash_trans['no_telp'],
-                  format_date(wash_trans['tanggal']), wash_trans['waktu_masuk'],
-                  wash_trans['id'], wash_trans['paket'], wash_trans['harga'],
-                  json.dumps(coffee_items) if coffee_items else None, harga_coffee,
-                  total_bayar, "Lunas", metode_bayar, secret_code, "kasir", ""))
-            
-            kasir_id = c.lastrowid
-            kasir_trans.append({
-                'id': kasir_id,
-                'secret_code': secret_code,
-                'nopol': wash_trans['nopol'],
-                'no_telp': wash_trans['no_telp'],
-                'nama': wash_trans['nama'],
-                'tanggal': wash_trans['tanggal'],
-                'total_bayar': total_bayar
-            })
-    
-    conn.commit()
-    print(f"✓ {len(kasir_trans)} transaksi kasir berhasil ditambahkan")
-    return kasir_trans
-
-def populate_customer_reviews(conn, kasir_transactions):
-    """Populate customer_reviews table dengan data review dummy"""
-    print(f"Membuat review pelanggan...")
-    c = conn.cursor()
-    
-    reviews = []
-    
-    # 60% dari kasir transactions dapat review
-    trans_with_review = random.sample(kasir_transactions, 
-                                     int(len(kasir_transactions) * 0.6))
-    
-    for trans in trans_with_review:
-        # Rating 3-5 (mostly 4-5)
-        rating = random.choices([3, 4, 5], weights=[10, 40, 50])[0]
-        
-        # Review text
-        review_text = random.choice(REVIEW_TEXTS)
-        
-        # Reward points (10-50 based on rating)
-        reward_points = rating * 10
-        
-        # Review date: 0-3 hari setelah transaksi
-        review_date = trans['tanggal'] + timedelta(days=random.randint(0, 3))
-        review_time = f"{random.randint(8, 20):02d}:{random.randint(0, 59):02d}"
-        
-        c.execute("""
-            INSERT INTO customer_reviews (secret_code, trans_id, trans_type, nopol, no_telp,
-                                         nama_customer, rating, review_text, review_date, 
-                                         review_time, reward_points)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (trans['secret_code'], trans['id'], "kasir", trans['nopol'], trans['no_telp'],
-              trans['nama'], rating, review_text, format_date(review_date), 
-              review_time, reward_points))
-        
-        reviews.append({
-            'trans_id': trans['id'],
-            'rating': rating,
-            'points': reward_points
-        })
-        
-        # Update customer_points
-        c.execute("""
-            INSERT INTO customer_points (nopol, no_telp, nama_customer, total_points, last_updated)
-            VALUES (?, ?, ?, ?, ?)
-            ON CONFLICT(nopol, no_telp) DO UPDATE SET 
-                total_points = total_points + ?,
-                last_updated = ?
-        """, (trans['nopol'], trans['no_telp'], trans['nama'], reward_points,
-              format_datetime(review_date), reward_points, format_datetime(review_date)))
-    
-    conn.commit()
-    print(f"✓ {len(reviews)} review pelanggan berhasil ditambahkan")
-    return reviews
-
-def populate_audit_trail(conn):
-    """Populate audit_trail dengan beberapa entry dummy"""
-    print("Membuat audit trail...")
-    c = conn.cursor()
-    
-    now = datetime.now(WIB)
-    
-    audit_entries = [
-        (now - timedelta(days=30), "admin", "Login", "Admin login ke sistem"),
-        (now - timedelta(days=30), "admin", "Create Employee", "Menambahkan karyawan baru"),
-        (now - timedelta(days=25), "supervisor", "Login", "Supervisor login ke sistem"),
-        (now - timedelta(days=20), "kasir", "Login", "Kasir login ke sistem"),
-        (now - timedelta(days=15), "admin", "Update Settings", "Mengubah pengaturan paket cuci"),
-        (now - timedelta(days=10), "admin", "Create Payroll", "Membuat slip gaji bulanan"),
-        (now - timedelta(days=5), "supervisor", "Approve Payroll", "Menyetujui pembayaran gaji"),
-        (now - timedelta(days=1), "admin", "Login", "Admin login ke sistem"),
-    ]
-    
-    for timestamp, user, action, detail in audit_entries:
-        c.execute("""
-            INSERT INTO audit_trail (timestamp, user, action, detail)
-            VALUES (?, ?, ?, ?)
-        """, (format_datetime(timestamp), user, action, detail))
-    
-    conn.commit()
-    print(f"✓ {len(audit_entries)} audit trail berhasil ditambahkan")
-
-def generate_summary_report(customers, employees, wash_transactions, 
-                          coffee_sales, kasir_transactions, payroll_records, reviews):
-    """Generate ringkasan data yang telah dibuat"""
-    print("\n" + "="*60)
-    print("RINGKASAN DATA DUMMY YANG TELAH DIBUAT")
-    print("="*60)
-    
-    print(f"\n📊 PELANGGAN:")
-    print(f"   Total Pelanggan: {len(customers)}")
-    mobil_count = sum(1 for c in customers if c['jenis_kendaraan'] == 'Mobil')
-    motor_count = len(customers) - mobil_count
-    print(f"   - Mobil: {mobil_count}")
-    print(f"   - Motor: {motor_count}")
-    
-    print(f"\n👥 KARYAWAN:")
-    print(f"   Total Karyawan: {len(employees)}")
-    for role in ["Washer", "QC Inspector", "Kasir", "Supervisor"]:
-        count = sum(1 for e in employees if e['role'] == role)
-        if count > 0:
-            print(f"   - {role}: {count}")
-    
-    print(f"\n🚗 TRANSAKSI CUCI MOBIL:")
-    print(f"   Total Transaksi: {len(wash_transactions)}")
-    selesai = sum(1 for t in wash_transactions if t['status'] == 'Selesai')
-    proses = len(wash_transactions) - selesai
-    print(f"   - Selesai: {selesai}")
-    print(f"   - Dalam Proses: {proses}")
-    total_pendapatan_cuci = sum(t['harga'] for t in wash_transactions if t['status'] == 'Selesai')
-    print(f"   Total Pendapatan: Rp {total_pendapatan_cuci:,}")
-    
-    print(f"\n☕ PENJUALAN COFFEE/SNACK:")
-    print(f"   Total Transaksi: {len(coffee_sales)}")
-    total_pendapatan_coffee = sum(s['total'] for s in coffee_sales)
-    print(f"   Total Pendapatan: Rp {total_pendapatan_coffee:,}")
-    
-    print(f"\n💰 TRANSAKSI KASIR:")
-    print(f"   Total Transaksi: {len(kasir_transactions)}")
-    total_pendapatan_kasir = sum(t['total_bayar'] for t in kasir_transactions)
-    print(f"   Total Pendapatan: Rp {total_pendapatan_kasir:,}")
-    
-    print(f"\n💵 GAJI KARYAWAN:")
-    print(f"   Total Record Gaji: {len(payroll_records)}")
-    total_gaji_dibayar = sum(p['gaji_bersih'] for p in payroll_records)
-    print(f"   Total Gaji Dibayarkan: Rp {total_gaji_dibayar:,}")
-    
-    print(f"\n⭐ REVIEW PELANGGAN:")
-    print(f"   Total Review: {len(reviews)}")
-    if reviews:
-        avg_rating = sum(r['rating'] for r in reviews) / len(reviews)
-        print(f"   Rating Rata-rata: {avg_rating:.2f} / 5.0")
-        total_points_given = sum(r['points'] for r in reviews)
-        print(f"   Total Poin Reward Diberikan: {total_points_given}")
-    
-    print(f"\n📈 RINGKASAN KEUANGAN:")
-    total_pendapatan = total_pendapatan_kasir + total_pendapatan_coffee
-    total_pengeluaran = total_gaji_dibayar
-    laba_bersih = total_pendapatan - total_pengeluaran
-    print(f"   Total Pendapatan: Rp {total_pendapatan:,}")
-    print(f"   Total Pengeluaran (Gaji): Rp {total_pengeluaran:,}")
-    print(f"   Laba Bersih: Rp {laba_bersih:,}")
-    
-    print("\n" + "="*60)
-    print("✓ SEMUA DATA DUMMY BERHASIL DIBUAT!")
-    print("="*60 + "\n")
+                    min_bayar = min(50000, sisa)
+                    jumlah_bayar = rng.randint(min_bayar, max(min_bayar, int(sisa * 0.5)))
+                    jumlah_bayar = max(10000, (jumlah_bayar // 10000) * 10000)
+                metode = rng.choices(["Potong Gaji", "Tunai", "Transfer"], weights=[70, 20, 10])[0]
+                payroll_id = None
+                if metode == "Potong Gaji":
+                    # Slip gaji dibayar 2 hari setelah minggunya berakhir
+                    week = (tanggal_bayar - timedelta(days=2) - first_week_start).days // 7
+                    if 0 <= week < num_weeks:
+                        payroll_id = first_payroll_id + emp_index * num_weeks + week
+                pembayaran.append((pembayaran_id, kas_bon_id, payroll_id, format_date(tanggal_bayar), jumlah_bayar,
+                                   metode, f"Cicilan ke-{cicilan_idx + 1}",
+                                   format_datetime(datetime.combine(tanggal_bayar, datetime.min.time())), "admin"))
+                pembayaran_id += 1
+                sisa -= jumlah_bayar
+                if sisa <= 0:
+                    break
+
+            inserter.add('kas_bon', (kas_bon_id, employee['id'], format_date(tanggal_kasbon), jumlah,
+                                     rng.choice(KETERANGAN_KASBON), "Lunas" if sisa <= 0 else "Belum Lunas",
+                                     max(sisa, 0), format_datetime(datetime.combine(tanggal_kasbon, datetime.min.time())),
+                                     "admin"))
+            for row in pembayaran:
+                inserter.add('pembayaran_kas_bon', row)
+            kas_bon_id += 1
+
+
+def _save_customer_points(conn, points):
+    """Tambahkan poin review ke saldo customer_points (UPSERT per customer_key, event-nya sudah di points_ledger)"""
+    conn.executemany("""
+        INSERT INTO customer_points (customer_key, nopol, no_telp, nama_customer, total_points, last_updated)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(customer_key) DO UPDATE SET
+            total_points = total_points + excluded.total_points,
+            last_updated = excluded.last_updated
+    """, [(key, nopol, no_telp, nama, total, format_datetime(datetime.combine(last, datetime.min.time())))
+          for key, (nopol, no_telp, nama, total, last) in points.items()])
+    return len(points)
+
+
+def generate_dataset(conn, scale=1.0, days=DEFAULT_DAYS, seed=None, end_date=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE, rebuild_derived=None, log=None):
+    """Generate seluruh data dummy dalam satu transaksi, return jumlah baris per tabel
+
+    Database harus sudah punya skema terbaru (app.init_db). Jika `rebuild_derived` diberikan,
+    trigger dimatikan selama bulk load lalu `rebuild_derived(conn)` membangun ulang data turunan
+    (index FTS, rollup pendapatan); tanpa itu trigger tetap aktif per baris.
+    """
+    rng = random.Random(seed)
+    end_date = end_date or datetime.now(WIB).date()
+    dates = [end_date - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+    prices = (
+        load_setting(conn, 'paket_cucian', PAKET_CUCI),
+        load_setting(conn, 'coffee_menu', COFFEE_MENU),
+        load_setting(conn, 'ukuran_multiplier', UKURAN_MULTIPLIER),
+    )
+    shift_settings = load_shift_settings(conn)
+    inserter = ChunkedInserter(conn, chunk_size)
+
+    def step(message):
+        if log:
+            log(message)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        triggers = []
+        if rebuild_derived:
+            triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+            for name, _ in triggers:
+                conn.execute(f"DROP TRIGGER {name}")
+
+        step("Membuat pelanggan & karyawan...")
+        customers = _generate_customers(rng, conn, inserter, max(1, round(BASE_CUSTOMERS * scale)), dates[0])
+        employees = _generate_employees(rng, conn, inserter, max(1, round(BASE_EMPLOYEES * scale)),
+                                        shift_settings, dates[0])
+        inserter.flush()
+
+        step(f"Membuat transaksi harian {format_date(dates[0])} - {format_date(end_date)}...")
+        points = _generate_days(rng, conn, inserter, customers, employees, dates, scale, prices,
+                                rng.getrandbits(40))
+        step("Membuat slip gaji & kas bon...")
+        payroll_index = _generate_payroll(rng, conn, inserter, employees, dates, shift_settings)
+        _generate_kas_bon(rng, conn, inserter, employees, dates, payroll_index)
+        inserter.flush()
+        counts = dict(inserter.counts)
+        counts['customer_points'] = _save_customer_points(conn, points)
+
+        for _, sql in triggers:
+            conn.execute(sql)
+        if rebuild_derived:
+            step("Membangun ulang index FTS & rollup pendapatan...")
+            rebuild_derived(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return counts
+
+
+def template_path(template_dir, scale, days, seed, end_date):
+    """Nama file template untuk kombinasi parameter generator"""
+    return os.path.join(template_dir, f"car_wash_s{scale:g}_d{days}_seed{seed}_{end_date:%Y%m%d}.db")
+
+
+def remove_database(path):
+    """Hapus file database beserta file WAL/SHM"""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def copy_database(source, target):
+    """Salin database dengan SQLite backup API"""
+    remove_database(target)
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
 
-def main():
-    """Main function untuk populate semua data dummy"""
-    print("\n🚀 MEMULAI POPULATE DATA DUMMY...")
-    print("="*60)
-    
-    # Connect to database
-    conn = sqlite3.connect(DB_NAME)
-    
+
+def build_database(path, scale, days, seed, end_date, chunk_size, log=print):
+    """Siapkan skema lewat app.init_db lalu isi database dengan generator (mode bulk)"""
+    import app
+
+    app.DB_NAME = path
+    app.init_db()
+    app.close_all_connections()
+
+    conn = sqlite3.connect(path)
     try:
-        # 1. Populate Customers
-        customers = populate_customers(conn, num_customers=50)
-        
-        # 2. Populate Employees
-        employees = populate_employees(conn, num_employees=8)
-        
-        # 3. Populate Attendance (60 hari terakhir)
-        attendance_records = populate_attendance(conn, employees, days=60)
-        
-        # 4. Populate Payroll (3 bulan terakhir)
-        payroll_records = populate_payroll(conn, employees, attendance_records)
-        
-        # 5. Populate Wash Transactions
-        wash_transactions = populate_wash_transactions(conn, customers, num_transactions=200)
-        
-        # 6. Populate Coffee Sales
-        coffee_sales = populate_coffee_sales(conn, num_sales=150)
-        
-        # 7. Populate Kasir Transactions
-        kasir_transactions = populate_kasir_transactions(conn, wash_transactions, len(coffee_sales))
-        
-        # 8. Populate Customer Reviews
-        reviews = populate_customer_reviews(conn, kasir_transactions)
-        
-        # 9. Populate Audit Trail
-        populate_audit_trail(conn)
-        
-        # 10. Generate Summary Report
-        generate_summary_report(customers, employees, wash_transactions, 
-                               coffee_sales, kasir_transactions, payroll_records, reviews)
-        
-    except Exception as e:
-        print(f"\n❌ ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-65536")
+        return generate_dataset(conn, scale=scale, days=days, seed=seed, end_date=end_date,
+                                chunk_size=chunk_size, rebuild_derived=app.rebuild_derived_data, log=log)
     finally:
         conn.close()
 
+
+def ensure_template(template_dir, scale, days, seed, end_date, chunk_size=DEFAULT_CHUNK_SIZE, log=print):
+    """Return path template untuk parameter ini, generate (lalu VACUUM) jika belum ada
+
+    Return (path, counts); counts None jika template sudah ada sebelumnya.
+    """
+    os.makedirs(template_dir, exist_ok=True)
+    template = template_path(template_dir, scale, days, seed, end_date)
+    if os.path.exists(template):
+        return template, None
+
+    tmp_template = template + ".tmp"
+    remove_database(tmp_template)
+    try:
+        counts = build_database(tmp_template, scale, days, seed, end_date, chunk_size, log=log)
+        conn = sqlite3.connect(tmp_template)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.execute("VACUUM")
+        conn.close()
+        os.replace(tmp_template, template)
+    finally:
+        remove_database(tmp_template)
+    return template, counts
+
+
+def parse_date(value):
+    """Parse tanggal dari argumen CLI (yyyy-mm-dd atau dd-mm-yyyy)"""
+    for fmt in ('%Y-%m-%d', '%d-%m-%Y'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"Format tanggal tidak valid: {value}")
+
+
+def print_summary(counts, elapsed):
+    """Tampilkan jumlah baris per tabel dan kecepatan generate"""
+    total = sum(counts.values())
+    print("\n" + "=" * 60)
+    print("RINGKASAN DATA DUMMY")
+    print("=" * 60)
+    for table, count in counts.items():
+        print(f"   {table:<22} {count:>12,}")
+    print(f"   {'TOTAL':<22} {total:>12,}")
+    print(f"\n⏱️  {elapsed:.1f} detik ({total / max(elapsed, 1e-9):,.0f} baris/detik)")
+
+
+def main():
+    """Main function untuk populate data dummy dari command line"""
+    parser = argparse.ArgumentParser(description="Generate data dummy (seeded & scalable) untuk database car wash")
+    parser.add_argument("--db", default=DB_NAME, help=f"Path database tujuan (default: {DB_NAME})")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Faktor skala volume data; 1 = data demo (~3 cuci/hari, 50 pelanggan, 8 karyawan)")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help=f"Jumlah hari riwayat (default: {DEFAULT_DAYS})")
+    parser.add_argument("--seed", type=int, help="Seed random; seed + parameter yang sama menghasilkan data yang sama")
+    parser.add_argument("--end-date", type=parse_date, help="Tanggal terakhir data (default: hari ini WIB)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Jumlah baris per executemany (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--fresh", action="store_true", help="Hapus database tujuan dulu sebelum generate")
+    parser.add_argument("--template-dir",
+                        help="Simpan/pakai ulang file template per kombinasi parameter (butuh --seed); "
+                             "database tujuan diganti dengan salinan template")
+    args = parser.parse_args()
+
+    if args.scale <= 0 or args.days < 1 or args.chunk_size < 1:
+        parser.error("--scale harus > 0, --days dan --chunk-size minimal 1")
+    if args.template_dir and args.seed is None:
+        parser.error("--template-dir butuh --seed agar template bisa dipakai ulang")
+    end_date = args.end_date or datetime.now(WIB).date()
+
+    print("\n🚀 MEMULAI POPULATE DATA DUMMY...")
+    print(f"   scale={args.scale:g} days={args.days} seed={args.seed} end_date={format_date(end_date)}")
+    started = time.perf_counter()
+
+    if args.template_dir:
+        template, counts = ensure_template(args.template_dir, args.scale, args.days, args.seed, end_date,
+                                           args.chunk_size)
+        if counts is None:
+            print(f"♻️  Memakai template {template}")
+        else:
+            print(f"📦 Template baru {template}")
+            print_summary(counts, time.perf_counter() - started)
+        copy_database(template, args.db)
+        print(f"\n✓ {args.db} disalin dari template ({time.perf_counter() - started:.1f} detik)")
+        return 0
+
+    if args.fresh:
+        remove_database(args.db)
+    counts = build_database(args.db, args.scale, args.days, args.seed, end_date, args.chunk_size)
+    print_summary(counts, time.perf_counter() - started)
+    print("\n✓ SEMUA DATA DUMMY BERHASIL DIBUAT!")
+    return 0
+
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())